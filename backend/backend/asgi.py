@@ -3,6 +3,11 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The real-time notification stream (/api/notifications/notifications/stream/)
+keeps connections open and only works when served through this module, e.g.
+with ``uvicorn backend.asgi:application``; the WSGI application answers it
+with 501.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -229,6 +229,68 @@ CORS_ALLOW_METHODS = [
 # Allow CORS preflight requests to be cached
 CORS_PREFLIGHT_MAX_AGE = 86400  # 24 hours
 
+# Let browsers read ETag so they can send If-None-Match on cached endpoints
+CORS_EXPOSE_HEADERS = ['ETag']
+
+# Cache configuration
+# Defaults to per-process memory. In multi-worker deployments point CACHE_BACKEND at a shared
+# backend (e.g. 'django.core.cache.backends.db.DatabaseCache' or redis) so invalidation is global.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'be-u-default'),
+    }
+}
+
+# Seconds a cached discovery (public-profiles list) page is kept
+DISCOVERY_CACHE_TIMEOUT = int(os.environ.get('DISCOVERY_CACHE_TIMEOUT', 300))
+
+# Recommendation ranking weights (see users/ranking.py for defaults and signal definitions).
+# Keys: distance, rating, reviews, favorites, availability. Evaluate changes offline with
+# `python manage.py evaluate_recommendations --weights '{...}'` before deploying them.
+RECOMMENDATION_WEIGHTS = {}
+
+# Google Maps proxy (users/google_maps_client.py): pooled session plus in-process LRU/TTL cache.
+# GOOGLE_MAPS_BASE_URL can point at a local stub server for testing.
+GOOGLE_MAPS_BASE_URL = os.environ.get('GOOGLE_MAPS_BASE_URL', 'https://maps.googleapis.com')
+GOOGLE_MAPS_TIMEOUT = float(os.environ.get('GOOGLE_MAPS_TIMEOUT', 10))
+GOOGLE_MAPS_CACHE_SIZE = int(os.environ.get('GOOGLE_MAPS_CACHE_SIZE', 2048))
+GOOGLE_MAPS_CACHE_TTL = int(os.environ.get('GOOGLE_MAPS_CACHE_TTL', 24 * 60 * 60))
+
+# Expo push delivery (notifications/push.py). EXPO_PUSH_BASE_URL can point at a local fake server.
+EXPO_PUSH_BASE_URL = os.environ.get('EXPO_PUSH_BASE_URL', 'https://exp.host')
+EXPO_ACCESS_TOKEN = os.environ.get('EXPO_ACCESS_TOKEN') or None
+EXPO_PUSH_TIMEOUT = float(os.environ.get('EXPO_PUSH_TIMEOUT', 10))
+EXPO_PUSH_MAX_RETRIES = int(os.environ.get('EXPO_PUSH_MAX_RETRIES', 3))
+# Upper bound in seconds on any retry delay, including a server-sent Retry-After
+EXPO_PUSH_MAX_BACKOFF = float(os.environ.get('EXPO_PUSH_MAX_BACKOFF', 30))
+# Reminders stuck in SENDING this long (a dispatcher died mid-batch) are marked failed (notifications/reminders.py)
+REMINDER_SENDING_TIMEOUT = int(os.environ.get('REMINDER_SENDING_TIMEOUT', 600))
+
+# Real-time notification stream (notifications/realtime.py, served through backend/asgi.py).
+# Unset: notifications.realtime.PostgresBroker on PostgreSQL, InProcessBroker on any other database.
+# InProcessBroker only reaches clients of the process that published: notifications created by
+# other web workers, cron commands or the reminder scheduler never reach the stream. Only set it
+# explicitly for a single-process deployment.
+NOTIFICATIONS_REALTIME_BROKER = os.environ.get('NOTIFICATIONS_REALTIME_BROKER') or None
+NOTIFICATIONS_STREAM_KEEPALIVE = int(os.environ.get('NOTIFICATIONS_STREAM_KEEPALIVE', 15))
+# Cached per-user notification stats (notifications/summary.py); writes invalidate them immediately
+NOTIFICATION_SUMMARY_CACHE_TIMEOUT = int(os.environ.get('NOTIFICATION_SUMMARY_CACHE_TIMEOUT', 3600))
+# Rows per INSERT when creating notifications in bulk (notifications/fanout.py)
+NOTIFICATION_BULK_BATCH_SIZE = int(os.environ.get('NOTIFICATION_BULK_BATCH_SIZE', 1000))
+# Read notifications older than this are deleted by the purge_notifications command
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+
+# Post feed timelines (posts/timeline.py). Each timeline keeps the newest POST_TIMELINE_LENGTH posts
+# (older pages are read from the Post table);
+# authors with at least POST_TIMELINE_PULL_THRESHOLD favorites are merged in at read time instead.
+POST_TIMELINE_ENABLED = os.environ.get('POST_TIMELINE_ENABLED', 'True') == 'True'
+POST_TIMELINE_LENGTH = int(os.environ.get('POST_TIMELINE_LENGTH', 1000))
+POST_TIMELINE_PULL_THRESHOLD = int(os.environ['POST_TIMELINE_PULL_THRESHOLD']) if os.environ.get('POST_TIMELINE_PULL_THRESHOLD') else None
+
+# Cached poll results (posts/polls.py); votes invalidate them immediately
+POLL_RESULTS_CACHE_TIMEOUT = int(os.environ.get('POLL_RESULTS_CACHE_TIMEOUT', 300))
+
 # JWT Settings
 from datetime import timedelta
 
@@ -287,6 +349,16 @@ AWS_S3_FILE_OVERWRITE = False
 AWS_QUERYSTRING_AUTH = True
 AWS_QUERYSTRING_EXPIRE = 3600  # URL expiration time in seconds (1 hour)
 
+# Direct-to-S3 uploads for post media (posts/direct_uploads.py)
+DIRECT_UPLOAD_URL_EXPIRE = int(os.environ.get('DIRECT_UPLOAD_URL_EXPIRE', 3600))
+DIRECT_UPLOAD_MAX_BYTES = int(os.environ.get('DIRECT_UPLOAD_MAX_BYTES', 500 * 1024 * 1024))
+
+# Resized WebP copies of uploaded images (users.image_derivatives)
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1080)
+IMAGE_DERIVATIVE_QUALITY = int(os.environ.get('IMAGE_DERIVATIVE_QUALITY', 80))
+IMAGE_DERIVATIVE_WORKERS = int(os.environ.get('IMAGE_DERIVATIVE_WORKERS', 2))
+IMAGE_DERIVATIVES_ASYNC = os.environ.get('IMAGE_DERIVATIVES_ASYNC', 'True') == 'True'
+
 # Choose storage backend based on USE_S3
 if USE_S3:
     # Use S3 for media files in production
@@ -334,3 +406,7 @@ EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@be-u.ai')
+# Outbox retries (notifications/outbox.py): delays double from EMAIL_OUTBOX_RETRY_DELAY seconds,
+# emails are dead-lettered after EMAIL_OUTBOX_MAX_ATTEMPTS failures
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', 5))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.environ.get('EMAIL_OUTBOX_RETRY_DELAY', 60))
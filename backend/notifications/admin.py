@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
-from .models import Notification, NotificationTemplate
+from .models import Notification, NotificationTemplate, OutboundEmail
 
 
 @admin.register(Notification)
@@ -88,4 +88,26 @@ class NotificationTemplateAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         """Optimize queries"""
-        return super().get_queryset(request)
\ No newline at end of file
+        return super().get_queryset(request)
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'recipients', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('subject', 'to')
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+    date_hierarchy = 'created_at'
+    actions = ['requeue']
+
+    def recipients(self, obj):
+        return ', '.join(obj.to)
+
+    def requeue(self, request, queryset):
+        """Retry dead-lettered (or failed) emails on the next worker run"""
+        updated = queryset.exclude(status=OutboundEmail.Status.SENT).update(
+            status=OutboundEmail.Status.PENDING,
+            attempts=0,
+            next_attempt_at=timezone.now(),
+        )
+        self.message_user(request, f'{updated} emails queued again.')
+    requeue.short_description = "Queue selected emails again"
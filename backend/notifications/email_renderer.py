@@ -0,0 +1,105 @@
+"""
+Reservation email rendering.
+
+Templates come from Django's loader, whose cached loader (on by default with
+APP_DIRS and no explicit loaders) compiles each one once per process. Contexts come from a
+reservation snapshot: a plain dict built once per reservation (client, service
+and provider loaded with select_related/prefetch_related), shared by every
+email about that reservation. load_snapshots() builds snapshots for many
+reservations with a fixed number of queries, and render_batch() renders one
+kind of email for all of them.
+"""
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.template import loader
+from django.utils.html import strip_tags
+
+from reservations.models import Reservation
+
+# kind -> (template, subject format, snapshot field holding the default recipient)
+EMAILS = {
+    "confirmed_client": (
+        "emails/reservation_confirmed_client.html", "Confirmación de Reserva - {service_name}", "client_email",
+    ),
+    "confirmed_provider": (
+        "emails/reservation_confirmed_provider.html", "Nueva Reserva Confirmada - {service_name}", "provider_email",
+    ),
+    "cancelled": ("emails/reservation_cancelled_update.html", "Reserva cancelada - {service_name}", None),
+    "updated": ("emails/reservation_updated_update.html", "Reserva modificada - {service_name}", None),
+}
+
+@dataclass
+class RenderedEmail:
+    subject: str
+    text: str
+    html: str
+
+
+def reservation_queryset():
+    return Reservation.objects.select_related("client__user", "service").prefetch_related("provider__user")
+
+
+def _user_name(user, fallback=""):
+    return f"{user.first_name} {user.last_name}".strip() or user.username or fallback
+
+
+def _provider_name(provider):
+    if provider is None or not hasattr(provider, "name"):
+        return "N/A"
+    if hasattr(provider, "last_name"):
+        return f"{provider.name} {provider.last_name}".strip()
+    return provider.name
+
+
+def _end_time(reservation):
+    start = datetime.combine(reservation.date, reservation.time)
+    return (start + (reservation.duration or timedelta(hours=1))).time().strftime("%H:%M")
+
+
+def snapshot(reservation):
+    """Everything the reservation emails need, as a plain dict."""
+    provider = reservation.provider
+    client = reservation.client
+    return {
+        "reservation_id": reservation.id,
+        "reservation_code": reservation.code,
+        "service_name": reservation.service.name,
+        "date": reservation.date.strftime("%d/%m/%Y"),
+        "time": reservation.time.strftime("%H:%M"),
+        "end_time": _end_time(reservation),
+        "notes": reservation.notes or "",
+        "cancellation_reason": reservation.cancellation_reason or "",
+        "client_name": _user_name(client.user, "Cliente"),
+        "client_email": client.user.email,
+        "client_phone": client.phone or "No disponible",
+        "provider_name": _provider_name(provider),
+        "provider_email": provider.user.email if provider is not None else None,
+    }
+
+
+def load_snapshots(reservation_ids):
+    """{reservation_id: snapshot} for many reservations."""
+    return {reservation.id: snapshot(reservation) for reservation in reservation_queryset().filter(id__in=reservation_ids)}
+
+
+def render(kind, data, **extra):
+    """Render one email of `kind` ("confirmed_client", "cancelled", ...) from a snapshot."""
+    template_name, subject, _ = EMAILS[kind]
+    context = {**data, "client_email": data["client_email"] or "No disponible", **extra}
+    html = loader.get_template(template_name).render(context)
+    return RenderedEmail(subject=subject.format(**data), text=strip_tags(html), html=html)
+
+
+def render_batch(kind, reservation_ids, **extra):
+    """
+    Render `kind` for many reservations. Returns [(recipient, RenderedEmail)]
+    addressed to the kind's default recipient; reservations without one are skipped.
+    """
+    recipient_field = EMAILS[kind][2]
+    rendered = []
+    for data in load_snapshots(reservation_ids).values():
+        recipient = data.get(recipient_field) if recipient_field else None
+        if recipient:
+            rendered.append((recipient, render(kind, data, **extra)))
+    return rendered
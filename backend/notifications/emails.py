@@ -1,179 +1,82 @@
 """
-Email utilities for sending reservation confirmation emails
+Email utilities for sending reservation confirmation emails.
+Emails are rendered by notifications.email_renderer and queued in the outbox
+(see notifications.outbox), which the send_queued_emails worker delivers.
 """
 import logging
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
 from django.conf import settings
-from django.utils.html import strip_tags
+
+from . import email_renderer
+from .outbox import enqueue, enqueue_many
 
 logger = logging.getLogger(__name__)
 
 
-def send_reservation_confirmation_to_client(reservation):
+def _from_email():
+    return getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@be-u.ai')
+
+
+def _queue(recipient, email):
+    enqueue(
+        subject=email.subject,
+        message=email.text,
+        from_email=_from_email(),
+        recipient_list=[recipient],
+        html_message=email.html,
+    )
+
+
+def send_reservation_confirmation_to_client(reservation, snapshot=None):
     """
     Send confirmation email to client when reservation is created/confirmed.
-    
+
     Args:
         reservation: Reservation model instance
-        
+        snapshot: email_renderer.snapshot(reservation), when the caller already built it
+
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if the email was queued, False otherwise
     """
     try:
-        client = reservation.client
-        client_email = client.user.email
-        
+        snapshot = snapshot or email_renderer.snapshot(reservation)
+        client_email = snapshot['client_email']
+
         if not client_email:
             logger.warning(f"Cannot send email to client: no email address for reservation {reservation.code}")
             return False
-        
-        # Get provider name
-        provider = reservation.provider
-        provider_name = "N/A"
-        if provider:
-            if hasattr(provider, 'name'):
-                if hasattr(provider, 'last_name'):
-                    provider_name = f"{provider.name} {provider.last_name}"
-                else:
-                    provider_name = provider.name
-        
-        # Calculate end time
-        from datetime import datetime, timedelta
-        start_datetime = datetime.combine(reservation.date, reservation.time)
-        if reservation.duration:
-            end_datetime = start_datetime + reservation.duration
-            end_time = end_datetime.time().strftime('%H:%M')
-        else:
-            end_time = (start_datetime + timedelta(hours=1)).time().strftime('%H:%M')
-        
-        # Prepare context for template
-        context = {
-            'reservation': reservation,
-            'client_name': f"{client.user.first_name} {client.user.last_name}".strip() or client.user.username,
-            'provider_name': provider_name,
-            'service_name': reservation.service.name,
-            'date': reservation.date.strftime('%d/%m/%Y'),
-            'time': reservation.time.strftime('%H:%M'),
-            'end_time': end_time,
-            'reservation_code': reservation.code,
-            'notes': reservation.notes or '',
-        }
-        
-        # Render HTML email
-        html_message = render_to_string('emails/reservation_confirmed_client.html', context)
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        subject = f'Confirmación de Reserva - {reservation.service.name}'
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@be-u.ai')
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=from_email,
-                recipient_list=[client_email],
-                html_message=html_message,
-                fail_silently=True,  # Don't raise exception if email fails, just log it
-            )
-        except Exception as email_error:
-            logger.error(f"Email sending exception for client {client_email}: {email_error}")
-            return False
-        
-        logger.info(f"✅ Confirmation email sent to client {client_email} for reservation {reservation.code}")
+
+        _queue(client_email, email_renderer.render('confirmed_client', snapshot))
+        logger.info(f"✅ Confirmation email queued for client {client_email} for reservation {reservation.code}")
         return True
-        
+
     except Exception as e:
         logger.error(f"❌ Failed to send confirmation email to client for reservation {reservation.code}: {e}", exc_info=True)
         return False
 
 
-def send_reservation_notification_to_provider(reservation):
+def send_reservation_notification_to_provider(reservation, snapshot=None):
     """
     Send notification email to provider when a new reservation is created/confirmed.
-    
+
     Args:
         reservation: Reservation model instance
-        
+        snapshot: email_renderer.snapshot(reservation), when the caller already built it
+
     Returns:
-        bool: True if email sent successfully, False otherwise
+        bool: True if the email was queued, False otherwise
     """
     try:
-        provider = reservation.provider
-        if not provider:
-            logger.warning(f"Cannot send email to provider: no provider found for reservation {reservation.code}")
-            return False
-        
-        provider_user = provider.user
-        provider_email = provider_user.email
-        
+        snapshot = snapshot or email_renderer.snapshot(reservation)
+        provider_email = snapshot['provider_email']
+
         if not provider_email:
-            logger.warning(f"Cannot send email to provider: no email address for reservation {reservation.code}")
+            logger.warning(f"Cannot send email to provider: no provider email for reservation {reservation.code}")
             return False
-        
-        # Get client name
-        client = reservation.client
-        client_name = f"{client.user.first_name} {client.user.last_name}".strip() or client.user.username or "Cliente"
-        client_email = client.user.email or "No disponible"
-        client_phone = getattr(client, 'phone', None) or "No disponible"
-        
-        # Get provider name
-        provider_name = "N/A"
-        if hasattr(provider, 'name'):
-            if hasattr(provider, 'last_name'):
-                provider_name = f"{provider.name} {provider.last_name}"
-            else:
-                provider_name = provider.name
-        
-        # Calculate end time
-        from datetime import datetime, timedelta
-        start_datetime = datetime.combine(reservation.date, reservation.time)
-        if reservation.duration:
-            end_datetime = start_datetime + reservation.duration
-            end_time = end_datetime.time().strftime('%H:%M')
-        else:
-            end_time = (start_datetime + timedelta(hours=1)).time().strftime('%H:%M')
-        
-        # Prepare context for template
-        context = {
-            'reservation': reservation,
-            'provider_name': provider_name,
-            'client_name': client_name,
-            'client_email': client_email,
-            'client_phone': client_phone,
-            'service_name': reservation.service.name,
-            'date': reservation.date.strftime('%d/%m/%Y'),
-            'time': reservation.time.strftime('%H:%M'),
-            'end_time': end_time,
-            'reservation_code': reservation.code,
-            'notes': reservation.notes or '',
-        }
-        
-        # Render HTML email
-        html_message = render_to_string('emails/reservation_confirmed_provider.html', context)
-        plain_message = strip_tags(html_message)
-        
-        # Send email
-        subject = f'Nueva Reserva Confirmada - {reservation.service.name}'
-        from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@be-u.ai')
-        
-        try:
-            send_mail(
-                subject=subject,
-                message=plain_message,
-                from_email=from_email,
-                recipient_list=[provider_email],
-                html_message=html_message,
-                fail_silently=True,  # Don't raise exception if email fails, just log it
-            )
-        except Exception as email_error:
-            logger.error(f"Email sending exception for provider {provider_email}: {email_error}")
-            return False
-        
-        logger.info(f"✅ Notification email sent to provider {provider_email} for reservation {reservation.code}")
+
+        _queue(provider_email, email_renderer.render('confirmed_provider', snapshot))
+        logger.info(f"✅ Notification email queued for provider {provider_email} for reservation {reservation.code}")
         return True
-        
+
     except Exception as e:
         logger.error(f"❌ Failed to send notification email to provider for reservation {reservation.code}: {e}", exc_info=True)
         return False
@@ -185,6 +88,7 @@ def send_reservation_change_email(
     recipient_name: str,
     actor_name: str,
     change_type: str,
+    snapshot=None,
 ):
     """
     Send reservation change/cancellation email to a specific recipient.
@@ -198,61 +102,16 @@ def send_reservation_change_email(
             )
             return False
 
-        provider = reservation.provider
-        provider_name = "N/A"
-        if provider and hasattr(provider, "name"):
-            if hasattr(provider, "last_name"):
-                provider_name = f"{provider.name} {provider.last_name}".strip()
-            else:
-                provider_name = provider.name
-
-        client = reservation.client
-        client_name = (
-            f"{client.user.first_name} {client.user.last_name}".strip()
-            or client.user.username
-            or "Cliente"
-        )
-
-        template_name = (
-            "emails/reservation_cancelled_update.html"
-            if change_type == "cancelled"
-            else "emails/reservation_updated_update.html"
-        )
-        subject = (
-            f"Reserva cancelada - {reservation.service.name}"
-            if change_type == "cancelled"
-            else f"Reserva modificada - {reservation.service.name}"
-        )
-
-        context = {
-            "reservation": reservation,
-            "recipient_name": recipient_name or "Usuario",
-            "actor_name": actor_name or "Nabbi",
-            "change_type": change_type,
-            "provider_name": provider_name,
-            "client_name": client_name,
-            "service_name": reservation.service.name,
-            "date": reservation.date.strftime("%d/%m/%Y"),
-            "time": reservation.time.strftime("%H:%M"),
-            "reservation_code": reservation.code,
-            "notes": reservation.notes or "",
-            "cancellation_reason": reservation.cancellation_reason or "",
-        }
-
-        html_message = render_to_string(template_name, context)
-        plain_message = strip_tags(html_message)
-        from_email = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@be-u.ai")
-
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=from_email,
-            recipient_list=[recipient_email],
-            html_message=html_message,
-            fail_silently=True,
+        email = email_renderer.render(
+            "cancelled" if change_type == "cancelled" else "updated",
+            snapshot or email_renderer.snapshot(reservation),
+            recipient_name=recipient_name or "Usuario",
+            actor_name=actor_name or "Nabbi",
+            change_type=change_type,
         )
+        _queue(recipient_email, email)
         logger.info(
-            f"✅ Reservation {change_type} email sent to {recipient_email} for reservation {reservation.code}"
+            f"✅ Reservation {change_type} email queued for {recipient_email} for reservation {reservation.code}"
         )
         return True
     except Exception as e:
@@ -261,3 +120,16 @@ def send_reservation_change_email(
             exc_info=True,
         )
         return False
+
+
+def queue_reservation_emails(kind, reservation_ids):
+    """
+    Render and queue one kind of email ("confirmed_client" or "confirmed_provider")
+    for many reservations at once. Returns the number of emails queued.
+    """
+    from_email = _from_email()
+    messages = [
+        (email.subject, email.text, [recipient], from_email, email.html)
+        for recipient, email in email_renderer.render_batch(kind, reservation_ids)
+    ]
+    return len(enqueue_many(messages))
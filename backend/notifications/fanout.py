@@ -0,0 +1,87 @@
+"""
+Bulk notification creation.
+
+create_notifications() inserts many notifications with chunked bulk_create
+(NOTIFICATION_BULK_BATCH_SIZE rows per INSERT) instead of one create() per
+recipient. bulk_create does not send post_save, so it announces the new rows
+to the real-time stream (one publish_many call after commit, i.e. a single
+NOTIFY statement with the PostgresBroker) and invalidates the recipients'
+cached summaries itself. With push=True it also sends the matching push notifications once the
+transaction commits: one token query and one send_push_batch call for all of
+them. fan_out() is the broadcast case, the same notification for many users.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Notification
+from .push import send_push_batch, tokens_by_user
+from .realtime import publish_notifications
+from .summary import invalidate as invalidate_summary
+
+logger = logging.getLogger(__name__)
+
+
+def _batch_size():
+    return getattr(settings, 'NOTIFICATION_BULK_BATCH_SIZE', 1000)
+
+
+def build_notification(user, type, title, message, content_object=None, metadata=None):
+    """Unsaved Notification for create_notifications(); `user` is a User or a user id."""
+    return Notification(
+        user_id=getattr(user, 'pk', user),
+        type=type,
+        title=title,
+        message=message,
+        content_object=content_object,
+        metadata=metadata or {},
+    )
+
+
+def _send_pushes(notifications):
+    tokens = tokens_by_user({notification.user_id for notification in notifications})
+    pushes = [
+        (
+            index,
+            tokens[notification.user_id],
+            notification.title,
+            notification.message,
+            {**notification.metadata, 'notification_id': notification.id, 'type': notification.type},
+        )
+        for index, notification in enumerate(notifications)
+        if tokens.get(notification.user_id)
+    ]
+    if not pushes:
+        return
+    try:
+        send_push_batch(pushes)
+    except Exception as exc:
+        logger.error(f"Failed sending {len(pushes)} push notifications: {exc}", exc_info=True)
+
+
+def create_notifications(notifications, push=False, batch_size=None):
+    """
+    Save unsaved Notification instances (see build_notification) in chunks.
+    Instances without a user are skipped. Returns the saved notifications.
+    """
+    notifications = [notification for notification in notifications if notification.user_id]
+    if not notifications:
+        return []
+    # bulk_create runs all chunks in one transaction
+    created = Notification.objects.bulk_create(notifications, batch_size=batch_size or _batch_size())
+    publish_notifications(created)
+    invalidate_summary({notification.user_id for notification in created})
+    if push:
+        transaction.on_commit(lambda: _send_pushes(created))
+    logger.info(f"Created {len(created)} notifications")
+    return created
+
+
+def fan_out(users, type, title, message, content_object=None, metadata=None, push=False, batch_size=None):
+    """Create the same notification for every user in `users` (User instances or ids)."""
+    return create_notifications(
+        [build_notification(user, type, title, message, content_object, metadata) for user in users],
+        push=push,
+        batch_size=batch_size,
+    )
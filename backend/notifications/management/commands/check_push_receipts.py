@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from notifications.push import check_receipts
+
+
+class Command(BaseCommand):
+    help = "Fetch Expo push receipts and deactivate tokens of devices that are no longer registered"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=15,
+            help="Only check tickets at least this many minutes old (Expo needs time to deliver)",
+        )
+
+    def handle(self, *args, **options):
+        checked, deactivated = check_receipts(min_age=timedelta(minutes=options["min_age"]))
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {checked} push receipts, deactivated {deactivated} tokens."
+        ))
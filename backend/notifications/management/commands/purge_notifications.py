@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from notifications.retention import expired_notifications, purge_read_notifications, retention_days
+
+
+class Command(BaseCommand):
+    help = "Delete read notifications older than the retention period, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            help="Delete read notifications older than this many days (default: NOTIFICATION_RETENTION_DAYS)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Notifications deleted per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the notifications that would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options["days"] if options["days"] is not None else retention_days())
+        if options["dry_run"]:
+            count = expired_notifications(older_than).count()
+            self.stdout.write(f"{count} notifications would be deleted.")
+            return
+        deleted = purge_read_notifications(older_than, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} read notifications."))
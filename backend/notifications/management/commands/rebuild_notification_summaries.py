@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from notifications.summary import rebuild
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = "Recompute the cached per-user notification summaries served by the stats endpoint"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="Only rebuild this user's summary (repeatable)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Users recomputed per query",
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options["users"] or User.objects.order_by("id").values_list("id", flat=True).iterator()
+        batch_size = options["batch_size"]
+        rebuilt = 0
+        batch = []
+        for user_id in user_ids:
+            batch.append(user_id)
+            if len(batch) >= batch_size:
+                rebuilt += rebuild(batch)
+                batch = []
+        if batch:
+            rebuilt += rebuild(batch)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} notification summaries."))
@@ -0,0 +1,59 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from notifications.scheduler import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the reservation reminder scheduler: dispatches reminders when they are due "
+        "instead of waiting for cron to call send_reservation_reminders"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=30,
+            help="Maximum seconds between database refreshes",
+        )
+        parser.add_argument(
+            "--horizon",
+            type=int,
+            default=3600,
+            help="Only reminders due within this many seconds are kept in memory",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Reminders claimed (and pushed) per transaction",
+        )
+        parser.add_argument(
+            "--health-file",
+            help="JSON status file rewritten on every tick (removed on shutdown), for liveness checks",
+        )
+        parser.add_argument(
+            "--no-listen",
+            action="store_true",
+            help="Do not use PostgreSQL LISTEN/NOTIFY, only poll",
+        )
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(
+            poll_interval=options["poll_interval"],
+            horizon=options["horizon"],
+            batch_size=options["batch_size"],
+            health_file=options["health_file"],
+            use_listen=not options["no_listen"],
+        )
+        # Finish the current dispatch, then exit
+        signal.signal(signal.SIGTERM, scheduler.stop)
+        signal.signal(signal.SIGINT, scheduler.stop)
+
+        self.stdout.write("Reminder scheduler running (Ctrl+C or SIGTERM to stop)")
+        scheduler.run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Reminder scheduler stopped ({scheduler.sent} sent, {scheduler.failed} failed)"
+        ))
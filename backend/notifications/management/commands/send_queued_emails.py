@@ -0,0 +1,41 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import purge_sent, send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send emails waiting in the outbox, reusing one mail server connection per batch"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Emails claimed (and sent over one connection) per transaction",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep running, checking the outbox every INTERVAL seconds",
+        )
+        parser.add_argument(
+            "--purge-days",
+            type=int,
+            default=7,
+            help="Delete sent emails older than this many days",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued_emails(batch_size=options["batch_size"])
+            purged = purge_sent(timedelta(days=options["purge_days"]))
+            if sent or failed or purged or not options["interval"]:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {sent} emails ({failed} failed), purged {purged} old emails"
+                ))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
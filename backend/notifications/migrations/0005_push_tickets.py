@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_rename_notificatio_user_id_2f85f2_idx_notificatio_user_id_1b1678_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_id', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('token', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tickets', to='notifications.pushdevicetoken')),
+            ],
+        ),
+    ]
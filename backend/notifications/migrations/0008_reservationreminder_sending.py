@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_notification_user_created_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reservationreminder',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=12),
+        ),
+    ]
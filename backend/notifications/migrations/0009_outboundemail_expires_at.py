@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_reservationreminder_sending'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboundemail',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='outboundemail',
+            name='sensitive',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -48,6 +48,8 @@ class Notification(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['user', 'type']),
             models.Index(fields=['created_at']),
+            # Per-user list, newest first
+            models.Index(fields=['user', '-created_at']),
         ]
     
     def __str__(self):
@@ -128,6 +130,17 @@ class PushDeviceToken(models.Model):
         return f"{self.user.email} - {self.platform} ({'active' if self.is_active else 'inactive'})"
 
 
+class PushTicket(models.Model):
+    """Expo push ticket whose receipt has not been checked yet (see notifications.push.check_receipts)"""
+
+    ticket_id = models.CharField(max_length=64, unique=True)
+    token = models.ForeignKey(PushDeviceToken, on_delete=models.CASCADE, related_name="tickets")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.ticket_id} ({self.token_id})"
+
+
 class ReservationReminder(models.Model):
     """Scheduled reminder for a reservation"""
 
@@ -139,6 +152,7 @@ class ReservationReminder(models.Model):
 
     class Status(models.TextChoices):
         PENDING = "pending", "Pending"
+        SENDING = "sending", "Sending"
         SENT = "sent", "Sent"
         FAILED = "failed", "Failed"
         CANCELLED = "cancelled", "Cancelled"
@@ -160,4 +174,36 @@ class ReservationReminder(models.Model):
         unique_together = ('reservation', 'user', 'reminder_type')
 
     def __str__(self):
-        return f"{self.reservation.code} - {self.user.email} - {self.reminder_type}"
\ No newline at end of file
+        return f"{self.reservation.code} - {self.user.email} - {self.reminder_type}"
+
+class OutboundEmail(models.Model):
+    """Email waiting in the outbox for the send_queued_emails worker (see notifications.outbox)"""
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        DEAD = "dead", "Dead"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True, null=True)
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True)
+    # Dead-lettered instead of sent once this passes (e.g. login codes)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    # Body is cleared once the email is sent or dead-lettered
+    sensitive = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.to)} ({self.status})"
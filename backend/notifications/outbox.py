@@ -0,0 +1,168 @@
+"""
+Email outbox.
+
+Request handlers and signals call enqueue() instead of send_mail(), which only
+inserts an OutboundEmail row. The send_queued_emails worker claims due rows in
+batches (SELECT ... FOR UPDATE SKIP LOCKED, so several workers can run) and
+sends each batch over a single backend connection. Failed messages are retried
+with exponential backoff and dead-lettered after EMAIL_OUTBOX_MAX_ATTEMPTS.
+Emails with an expires_at (login codes) are dead-lettered instead of sent once
+it passes, and sensitive emails have their body cleared once they are sent or
+dead-lettered, so the outbox does not keep usable codes around.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+
+def _max_attempts():
+    return getattr(settings, "EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, "EMAIL_OUTBOX_RETRY_DELAY", 60)
+    return timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def enqueue(subject, message, recipient_list, from_email=None, html_message=None, expires_at=None, sensitive=False):
+    """
+    Queue an email (same arguments as send_mail); returns the OutboundEmail row.
+    It is not sent after `expires_at`; `sensitive` clears its body once it is sent or dead-lettered.
+    """
+    return OutboundEmail.objects.create(
+        subject=subject[:255],
+        body=message,
+        html_body=html_message,
+        from_email=from_email or getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@be-u.ai"),
+        to=list(recipient_list),
+        expires_at=expires_at,
+        sensitive=sensitive,
+    )
+
+
+def enqueue_many(messages):
+    """Queue many emails with one INSERT; `messages` are send_mass_mail-style
+    (subject, message, recipient_list, from_email, html_message) tuples."""
+    default_from = getattr(settings, "DEFAULT_FROM_EMAIL", "noreply@be-u.ai")
+    return OutboundEmail.objects.bulk_create([
+        OutboundEmail(
+            subject=subject[:255],
+            body=message,
+            html_body=html_message,
+            from_email=from_email or default_from,
+            to=list(recipient_list),
+        )
+        for subject, message, recipient_list, from_email, html_message in messages
+    ])
+
+
+def to_message(email, connection=None):
+    message = EmailMultiAlternatives(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=email.to,
+        connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, "text/html")
+    return message
+
+
+def send_batch(batch_size=50, now=None):
+    """
+    Claim and send one batch of due emails over one connection.
+    Returns (sent, failed); (0, 0) when nothing is due or every due row is claimed by another worker.
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING, next_attempt_at__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by("next_attempt_at", "id")[:batch_size]
+        )
+        if not emails:
+            return 0, 0
+
+        expired = [email for email in emails if email.expires_at and email.expires_at <= timezone.now()]
+        for email in expired:
+            email.status = OutboundEmail.Status.DEAD
+            email.last_error = "Expired before it could be sent"
+            logger.warning(f"Email {email.id} to {email.to} expired before it could be sent")
+        emails = [email for email in emails if email not in expired]
+        if not emails:
+            _finish(expired)
+            return 0, len(expired)
+
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as exc:
+            # Server unreachable: leave the batch untouched for the next run
+            logger.error(f"Could not open email connection: {exc}")
+            return 0, 0
+
+        sent = failed = 0
+        try:
+            for email in emails:
+                email.attempts += 1
+                try:
+                    connection.send_messages([to_message(email, connection)])
+                except Exception as exc:
+                    failed += 1
+                    email.last_error = str(exc)
+                    if email.attempts >= _max_attempts():
+                        email.status = OutboundEmail.Status.DEAD
+                        logger.error(f"Giving up on email {email.id} to {email.to}: {exc}")
+                    else:
+                        email.next_attempt_at = timezone.now() + _retry_delay(email.attempts)
+                        logger.warning(f"Email {email.id} failed (attempt {email.attempts}), will retry: {exc}")
+                    continue
+                sent += 1
+                email.status = OutboundEmail.Status.SENT
+                email.sent_at = timezone.now()
+                email.last_error = None
+        finally:
+            connection.close()
+        _finish(expired + emails)
+    return sent, failed + len(expired)
+
+
+def _finish(emails):
+    """Save the outcome of a batch and clear the body of sensitive emails that are done."""
+    OutboundEmail.objects.bulk_update(emails, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"])
+    done = [
+        email.id for email in emails
+        if email.sensitive and email.status in (OutboundEmail.Status.SENT, OutboundEmail.Status.DEAD)
+    ]
+    if done:
+        OutboundEmail.objects.filter(id__in=done).update(body="", html_body=None)
+
+
+def send_queued_emails(batch_size=50):
+    """Send every due email; returns (sent, failed)."""
+    now = timezone.now()
+    sent_total = failed_total = 0
+    while True:
+        sent, failed = send_batch(batch_size, now)
+        sent_total += sent
+        failed_total += failed
+        if sent + failed < batch_size:
+            break
+    return sent_total, failed_total
+
+
+def purge_sent(older_than=timedelta(days=7)):
+    """Delete sent emails older than `older_than`; dead-lettered ones are kept for inspection."""
+    deleted, _ = OutboundEmail.objects.filter(
+        status=OutboundEmail.Status.SENT, sent_at__lt=timezone.now() - older_than
+    ).delete()
+    return deleted
@@ -1,61 +1,250 @@
+"""
+Expo push delivery.
+
+All requests go through one ExpoPushClient: a pooled requests.Session, bodies
+gzip-compressed, at most 100 messages per send request (1000 ids per receipt
+request) and exponential-backoff retries on 429/5xx and connection errors
+(honouring Retry-After, capped at EXPO_PUSH_MAX_BACKOFF seconds). The base URL is configurable (EXPO_PUSH_BASE_URL) so
+the client can be pointed at a local fake server.
+
+Expo only reports most delivery failures in push receipts, some minutes after
+the send. Accepted tickets are stored as PushTicket rows, and check_receipts()
+(run by the check_push_receipts command) fetches their receipts and
+bulk-deactivates tokens that Expo reports as DeviceNotRegistered.
+"""
+import gzip
+import json
 import logging
-from typing import List, Dict, Any
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import List, Dict, Any, Hashable, Iterable, Tuple
 
 import requests
+from django.conf import settings
 from django.utils import timezone
+from requests.adapters import HTTPAdapter
 
-from .models import PushDeviceToken
+from .models import PushDeviceToken, PushTicket
 
 logger = logging.getLogger(__name__)
 
-EXPO_PUSH_URL = "https://exp.host/--/api/v2/push/send"
+DEFAULT_BASE_URL = "https://exp.host"
+SEND_PATH = "/--/api/v2/push/send"
+RECEIPTS_PATH = "/--/api/v2/push/getReceipts"
+
+# Expo request limits
+EXPO_MAX_MESSAGES = 100
+EXPO_MAX_RECEIPT_IDS = 1000
+# Expo drops receipts after a day
+RECEIPT_RETENTION = timedelta(hours=24)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+GZIP_MIN_BYTES = 1024
+
+
+class ExpoPushClient:
+    def __init__(self, base_url=None, timeout=None, max_retries=None, backoff=None, max_backoff=None,
+                 access_token=None, pool_size=None, sleep=time.sleep):
+        self.base_url = (base_url or getattr(settings, "EXPO_PUSH_BASE_URL", DEFAULT_BASE_URL)).rstrip("/")
+        self.timeout = timeout or getattr(settings, "EXPO_PUSH_TIMEOUT", 10)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, "EXPO_PUSH_MAX_RETRIES", 3)
+        self.backoff = backoff if backoff is not None else getattr(settings, "EXPO_PUSH_BACKOFF", 0.5)
+        self.max_backoff = max_backoff if max_backoff is not None else getattr(settings, "EXPO_PUSH_MAX_BACKOFF", 30)
+        self.access_token = access_token or getattr(settings, "EXPO_ACCESS_TOKEN", None)
+        self.sleep = sleep
+        pool_size = pool_size or getattr(settings, "EXPO_PUSH_POOL_SIZE", 4)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _delay(self, attempt, response):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                # Never let the server park a worker (and whatever it holds) for long
+                return min(max(float(retry_after), 0), self.max_backoff)
+            except ValueError:
+                pass
+        return min(self.backoff * (2 ** attempt) + random.uniform(0, self.backoff), self.max_backoff)
+
+    def post(self, path, payload):
+        """POST JSON to Expo, retrying throttling and server errors; returns the decoded response."""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        if len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+        if self.access_token:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+
+        for attempt in range(self.max_retries + 1):
+            response = None
+            try:
+                response = self.session.post(f"{self.base_url}{path}", data=body, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response.json()
+                error = requests.HTTPError(f"Expo returned {response.status_code}", response=response)
+            if attempt == self.max_retries:
+                raise error
+            delay = self._delay(attempt, response)
+            logger.warning(f"Expo request failed ({error}), retrying in {delay:.1f}s")
+            self.sleep(delay)
+
+    def send(self, messages):
+        """
+        Send messages in chunks of EXPO_MAX_MESSAGES. Returns one ticket per
+        message, in order; messages of a chunk that failed get None.
+        """
+        tickets = []
+        for start in range(0, len(messages), EXPO_MAX_MESSAGES):
+            chunk = messages[start:start + EXPO_MAX_MESSAGES]
+            try:
+                data = self.post(SEND_PATH, chunk).get("data", [])
+            except Exception as exc:
+                logger.error(f"Failed to send push notifications: {exc}", exc_info=True)
+                data = []
+            tickets.extend(data[:len(chunk)] + [None] * (len(chunk) - len(data)))
+        return tickets
+
+    def get_receipts(self, ticket_ids):
+        """{ticket_id: receipt} for the receipts Expo has ready."""
+        receipts = {}
+        for start in range(0, len(ticket_ids), EXPO_MAX_RECEIPT_IDS):
+            chunk = ticket_ids[start:start + EXPO_MAX_RECEIPT_IDS]
+            receipts.update(self.post(RECEIPTS_PATH, {"ids": chunk}).get("data", {}))
+        return receipts
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> ExpoPushClient:
+    """Process-wide client (shared connection pool)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ExpoPushClient()
+    return _client
 
 
 def _is_expo_token(token: str) -> bool:
     return token.startswith("ExponentPushToken") or token.startswith("ExpoPushToken")
 
 
+def _is_unregistered(result) -> bool:
+    return result.get("status") == "error" and result.get("details", {}).get("error") == "DeviceNotRegistered"
+
+
+def deactivate_tokens(token_ids: Iterable[int]) -> int:
+    token_ids = list(token_ids)
+    if not token_ids:
+        return 0
+    return PushDeviceToken.objects.filter(id__in=token_ids).update(is_active=False, updated_at=timezone.now())
+
+
+def tokens_by_user(user_ids) -> Dict[int, List[PushDeviceToken]]:
+    """Active device tokens of `user_ids`, with one query."""
+    tokens = defaultdict(list)
+    for token in PushDeviceToken.objects.filter(user_id__in=user_ids, is_active=True):
+        tokens[token.user_id].append(token)
+    return tokens
+
+
+def send_push_batch(
+    notifications: List[Tuple[Hashable, List[PushDeviceToken], str, str, Dict[str, Any] | None]],
+) -> Dict[Hashable, bool]:
+    """
+    Send many notifications in as few Expo requests as possible.
+
+    `notifications` is a list of (key, tokens, title, body, data). Returns
+    {key: sent}, where sent is True when Expo accepted at least one of that
+    notification's messages. Invalid and unregistered tokens are deactivated and
+    accepted tickets are kept for check_receipts().
+    """
+    results = {key: False for key, *_ in notifications}
+    messages = []
+    dead_tokens = []
+    for key, tokens, title, body, data in notifications:
+        for token_obj in tokens:
+            if not _is_expo_token(token_obj.token):
+                logger.warning(f"Invalid Expo push token for user {token_obj.user_id}: {token_obj.token}")
+                dead_tokens.append(token_obj.id)
+                continue
+            messages.append((key, token_obj, {
+                "to": token_obj.token,
+                "title": title,
+                "body": body,
+                "data": data or {},
+                "sound": "default",
+            }))
+
+    tickets = get_client().send([payload for _, _, payload in messages]) if messages else []
+    pending = []
+    for (key, token_obj, _), ticket in zip(messages, tickets):
+        if ticket is None:
+            continue
+        if ticket.get("status") == "error":
+            if _is_unregistered(ticket):
+                dead_tokens.append(token_obj.id)
+                logger.info(f"Deactivating push token for user {token_obj.user_id}")
+            continue
+        results[key] = True
+        if ticket.get("id"):
+            pending.append(PushTicket(ticket_id=ticket["id"], token=token_obj))
+
+    deactivate_tokens(dead_tokens)
+    PushTicket.objects.bulk_create(pending, ignore_conflicts=True)
+    return results
+
+
 def send_push_notifications(tokens: List[PushDeviceToken], title: str, body: str, data: Dict[str, Any] | None = None) -> bool:
     """Send push notifications to a list of device tokens via Expo"""
     if not tokens:
         return False
+    return send_push_batch([(None, tokens, title, body, data)])[None]
 
-    payload = []
-    for token_obj in tokens:
-        if not _is_expo_token(token_obj.token):
-            logger.warning(f"Invalid Expo push token for user {token_obj.user_id}: {token_obj.token}")
-            token_obj.is_active = False
-            token_obj.save(update_fields=['is_active', 'updated_at'])
-            continue
-        payload.append({
-            "to": token_obj.token,
-            "title": title,
-            "body": body,
-            "data": data or {},
-            "sound": "default",
-        })
-
-    if not payload:
-        return False
-
-    try:
-        response = requests.post(EXPO_PUSH_URL, json=payload, timeout=10)
-        response.raise_for_status()
-        result = response.json()
-        data = result.get("data", [])
 
-        # Handle invalid tokens
-        for idx, item in enumerate(data):
-            if item.get("status") != "error":
-                continue
-            details = item.get("details", {})
-            if details.get("error") == "DeviceNotRegistered":
-                token_obj = tokens[idx]
-                token_obj.is_active = False
-                token_obj.save(update_fields=['is_active', 'updated_at'])
-                logger.info(f"Deactivated push token for user {token_obj.user_id}")
-
-        return True
-    except Exception as exc:
-        logger.error(f"Failed to send push notifications: {exc}", exc_info=True)
-        return False
+def check_receipts(min_age=timedelta(minutes=15), batch_size=EXPO_MAX_RECEIPT_IDS):
+    """
+    Fetch receipts for tickets older than `min_age`, deactivate tokens Expo
+    reports as DeviceNotRegistered and forget tickets that have a receipt (or
+    are too old to get one). Returns (receipts_checked, tokens_deactivated).
+    """
+    now = timezone.now()
+    client = get_client()
+    checked = deactivated = 0
+    last_id = 0
+    while True:
+        batch = list(
+            PushTicket.objects.filter(id__gt=last_id, created_at__lte=now - min_age)
+            .order_by("id")
+            .values_list("id", "ticket_id", "token_id", "created_at")[:batch_size]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+        receipts = client.get_receipts([ticket_id for _, ticket_id, _, _ in batch])
+        dead_tokens = {
+            token_id for _, ticket_id, token_id, _ in batch
+            if _is_unregistered(receipts.get(ticket_id) or {})
+        }
+        done = [
+            pk for pk, ticket_id, _, created_at in batch
+            if ticket_id in receipts or created_at <= now - RECEIPT_RETENTION
+        ]
+        deactivated += deactivate_tokens(dead_tokens)
+        PushTicket.objects.filter(id__in=done).delete()
+        checked += len(receipts)
+        if len(batch) < batch_size:
+            break
+    return checked, deactivated
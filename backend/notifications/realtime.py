@@ -0,0 +1,288 @@
+"""
+Real-time notification events (see the notification_stream view).
+
+Connected clients subscribe to a per-user channel and receive two kinds of
+events: "notification" when a notification is created for them and "unread"
+with the change in their unread count when notifications are read, unread or
+deleted. Events are published once the surrounding transaction commits.
+
+The pub/sub backend is chosen with NOTIFICATIONS_REALTIME_BROKER; when it is
+not set, PostgresBroker is used on PostgreSQL and InProcessBroker otherwise:
+
+- InProcessBroker fans events out to subscribers of the same process. It is
+  what the tests use; events published by any other process (other ASGI
+  workers, management commands, the reminder scheduler) are never delivered.
+- PostgresBroker publishes with pg_notify and runs one LISTEN thread per
+  process that hands received events to that process's subscribers, so every
+  ASGI worker sees events published by any web or worker process. Events are
+  packed into JSON lists that fit a NOTIFY payload, and every event published
+  by a transaction goes out in a single pg_notify statement.
+"""
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'notification_events'
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+class Subscription:
+    """One connected client: a bounded queue owned by the event loop serving it."""
+
+    def __init__(self, broker, user_id, max_queue=100):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queue)
+        self.overflowed = False
+
+    def put(self, event):
+        """Called from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop already closed: the client is gone
+            self.close()
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow client: drop events and ask it to reload instead
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """Next event, or None after `timeout` seconds without one."""
+        if self.overflowed and self.queue.empty():
+            self.overflowed = False
+            return {'event': 'resync', 'data': {}}
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Must be called from the event loop that will consume the subscription."""
+        subscription = Subscription(self, user_id, getattr(settings, 'NOTIFICATIONS_STREAM_QUEUE_SIZE', 100))
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._subscribers.get(user_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def deliver(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def publish(self, user_id, event):
+        self.publish_many([(user_id, event)])
+
+    def publish_many(self, events):
+        """events: [(user_id, event)]"""
+        for user_id, event in events:
+            self.deliver(user_id, event)
+
+
+class PostgresBroker(InProcessBroker):
+    """Events travel through NOTIFY so that every process delivers them to its own subscribers."""
+
+    def __init__(self, alias='default', reconnect_delay=5):
+        super().__init__()
+        self.alias = alias
+        self.reconnect_delay = reconnect_delay
+        self._listener = None
+        self._stop = threading.Event()
+
+    def subscribe(self, user_id):
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def publish_many(self, events):
+        """Pack the events into as few NOTIFY payloads as fit and send them all with one statement."""
+        payloads = list(self._payloads(events))
+        if payloads:
+            self._notify(payloads)
+
+    def _payloads(self, events):
+        """JSON lists of messages, each list under MAX_PAYLOAD_BYTES."""
+        chunk, size = [], 2
+        for user_id, event in events:
+            message = json.dumps({'user': user_id, **event}, cls=DjangoJSONEncoder)
+            if len(message.encode()) > MAX_PAYLOAD_BYTES - 2:
+                # Too large for NOTIFY: send the ids only, the client fetches the rest
+                data = {key: event['data'][key] for key in ('id', 'type', 'unread_delta') if key in event['data']}
+                message = json.dumps({'user': user_id, 'event': event['event'], 'data': {**data, 'truncated': True}})
+            length = len(message.encode()) + 1
+            if chunk and size + length > MAX_PAYLOAD_BYTES:
+                yield f"[{','.join(chunk)}]"
+                chunk, size = [], 2
+            chunk.append(message)
+            size += length
+        if chunk:
+            yield f"[{','.join(chunk)}]"
+
+    def _notify(self, payloads):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, payload) FROM unnest(%s::text[]) AS payload', [NOTIFY_CHANNEL, payloads]
+            )
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='notification-events', daemon=True)
+                self._listener.start()
+
+    def _connect(self):
+        # A dedicated connection outside Django's per-thread handling, so nothing closes it under us
+        db = connections[self.alias]
+        raw = db.get_new_connection(db.get_connection_params())
+        raw.autocommit = True
+        with raw.cursor() as cursor:
+            cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+        return raw
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                raw = self._connect()
+            except Exception as exc:
+                logger.warning('Could not LISTEN on %s: %s', NOTIFY_CHANNEL, exc)
+                self._stop.wait(self.reconnect_delay)
+                continue
+            try:
+                while not self._stop.is_set():
+                    ready, _, _ = select.select([raw], [], [], 5.0)
+                    if not ready:
+                        continue
+                    raw.poll()
+                    while raw.notifies:
+                        self._dispatch(raw.notifies.pop(0).payload)
+            except Exception as exc:
+                logger.warning('LISTEN connection on %s lost, reconnecting: %s', NOTIFY_CHANNEL, exc)
+                time.sleep(1)
+            finally:
+                try:
+                    raw.close()
+                except Exception:
+                    pass
+
+    def _dispatch(self, payload):
+        """Deliver one NOTIFY payload: a message or a list of messages."""
+        try:
+            messages = json.loads(payload)
+        except ValueError:
+            logger.warning('Ignoring malformed notification event: %r', payload)
+            return
+        for message in messages if isinstance(messages, list) else [messages]:
+            try:
+                user_id = message.pop('user')
+            except (KeyError, AttributeError, TypeError):
+                logger.warning('Ignoring malformed notification event: %r', message)
+                continue
+            self.deliver(user_id, message)
+
+    def stop(self):
+        self._stop.set()
+
+
+def default_broker_path():
+    """PostgresBroker when the default database is PostgreSQL, so events cross processes."""
+    if connections['default'].vendor == 'postgresql':
+        return 'notifications.realtime.PostgresBroker'
+    return 'notifications.realtime.InProcessBroker'
+
+
+def get_broker():
+    """Process-wide broker configured by NOTIFICATIONS_REALTIME_BROKER (see default_broker_path)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, 'NOTIFICATIONS_REALTIME_BROKER', None) or default_broker_path()
+                _broker = import_string(path)()
+    return _broker
+
+
+def notification_event(notification):
+    return {
+        'event': 'notification',
+        'data': {
+            'id': notification.id,
+            'type': notification.type,
+            'title': notification.title,
+            'message': notification.message,
+            'status': notification.status,
+            'metadata': notification.metadata or {},
+            'created_at': notification.created_at.isoformat() if notification.created_at else None,
+            'unread_delta': 1 if notification.status == notification.NotificationStatus.UNREAD else 0,
+        },
+    }
+
+
+def _publish_on_commit(events):
+    """events: [(user_id, event)], published after the current transaction commits."""
+    if not events:
+        return
+
+    def publish():
+        try:
+            get_broker().publish_many(events)
+        except Exception as exc:
+            logger.warning(f"Could not publish {len(events)} notification events: {exc}")
+
+    transaction.on_commit(publish)
+
+
+def publish_notifications(notifications):
+    """Announce newly created notifications to their users."""
+    _publish_on_commit([(notification.user_id, notification_event(notification)) for notification in notifications])
+
+
+def publish_unread_delta(user_id, delta):
+    """Announce that `user_id`'s unread count changed by `delta`."""
+    if delta:
+        _publish_on_commit([(user_id, {'event': 'unread', 'data': {'delta': delta}})])
+
+
+def format_event(event):
+    """Server-Sent Events wire format."""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], cls=DjangoJSONEncoder)}\n\n"
@@ -0,0 +1,151 @@
+"""
+Reservation reminder dispatch.
+
+Due reminders are claimed in batches with SELECT ... FOR UPDATE SKIP LOCKED, so
+several workers (cron runs, the scheduler daemon) can dispatch at the same time
+without sending a reminder twice. Claimed reminders are marked SENDING and the
+claim commits straight away; the pushes then go out through
+notifications.push.send_push_batch with no transaction or row locks held, and a
+second short transaction bulk-creates the in-app notifications and records the
+final statuses. Reminders left in SENDING by a worker that died mid-batch are
+marked FAILED after REMINDER_SENDING_TIMEOUT seconds rather than retried, since
+their pushes may already have gone out.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .fanout import build_notification, create_notifications
+from .models import Notification, ReservationReminder
+from .push import send_push_batch, tokens_by_user
+
+logger = logging.getLogger(__name__)
+
+REMINDER_TITLE = "Recordatorio de cita"
+
+
+def sending_timeout():
+    return getattr(settings, 'REMINDER_SENDING_TIMEOUT', 600)
+
+
+def due_reminders(now=None):
+    return ReservationReminder.objects.filter(
+        status=ReservationReminder.Status.PENDING,
+        send_at__lte=now or timezone.now(),
+    )
+
+
+def build_reminder(reminder):
+    """(title, message, metadata) of the push and in-app notification for a reminder"""
+    reservation = reminder.reservation
+    time_str = reservation.time.strftime("%H:%M")
+    date_str = reservation.date.strftime("%d/%m/%Y")
+    message = f"Tu cita es el {date_str} a las {time_str}."
+    metadata = {
+        "reservation_id": reservation.id,
+        "reservation_code": reservation.code,
+        "reminder_type": reminder.reminder_type,
+        "date": str(reservation.date),
+        "time": str(reservation.time),
+    }
+    return REMINDER_TITLE, message, metadata
+
+
+def claim_batch(now=None, batch_size=100):
+    """Lock up to `batch_size` due reminders, mark them SENDING and return them."""
+    with transaction.atomic():
+        reminders = list(
+            due_reminders(now)
+            .select_related("reservation")
+            .select_for_update(skip_locked=True, of=("self",))
+            .order_by("send_at", "id")[:batch_size]
+        )
+        if reminders:
+            updated_at = timezone.now()
+            for reminder in reminders:
+                reminder.status = ReservationReminder.Status.SENDING
+                reminder.updated_at = updated_at
+            ReservationReminder.objects.bulk_update(reminders, ["status", "updated_at"])
+    return reminders
+
+
+def fail_stale_sending(now=None):
+    """Mark reminders stuck in SENDING for longer than sending_timeout() as FAILED; returns how many."""
+    now = now or timezone.now()
+    return ReservationReminder.objects.filter(
+        status=ReservationReminder.Status.SENDING,
+        updated_at__lt=now - timedelta(seconds=sending_timeout()),
+    ).update(status=ReservationReminder.Status.FAILED, last_error="Interrupted while sending", updated_at=now)
+
+
+def dispatch_batch(now=None, batch_size=100):
+    """
+    Claim and send one batch of due reminders.
+    Returns (sent, failed); (0, 0) when nothing was due or every due row is locked by another worker.
+    """
+    reminders = claim_batch(now or timezone.now(), batch_size)
+    if not reminders:
+        return 0, 0
+
+    tokens = tokens_by_user({reminder.user_id for reminder in reminders})
+    contents = {}
+    pushes = []
+    for reminder in reminders:
+        try:
+            contents[reminder.id] = build_reminder(reminder)
+        except Exception as exc:
+            logger.error(f"Failed building reminder {reminder.id}: {exc}", exc_info=True)
+            reminder.last_error = str(exc)
+            continue
+        title, message, metadata = contents[reminder.id]
+        pushes.append((reminder.id, tokens.get(reminder.user_id, []), title, message, metadata))
+
+    # Outside any transaction: slow Expo requests must not hold the claimed rows' locks
+    sent = send_push_batch(pushes)
+
+    with transaction.atomic():
+        create_notifications([
+            build_notification(
+                reminder.user_id,
+                Notification.NotificationType.RESERVATION,
+                title=contents[reminder.id][0],
+                message=contents[reminder.id][1],
+                metadata=contents[reminder.id][2],
+            )
+            for reminder in reminders
+            if reminder.id in contents
+        ])
+
+        updated_at = timezone.now()
+        for reminder in reminders:
+            if sent.get(reminder.id):
+                reminder.status = ReservationReminder.Status.SENT
+                reminder.last_error = None
+            else:
+                reminder.status = ReservationReminder.Status.FAILED
+                if reminder.id in contents:
+                    reminder.last_error = "Push send failed"
+            reminder.updated_at = updated_at
+        ReservationReminder.objects.bulk_update(reminders, ["status", "last_error", "updated_at"])
+
+    sent_count = sum(1 for reminder in reminders if reminder.status == ReservationReminder.Status.SENT)
+    return sent_count, len(reminders) - sent_count
+
+
+def dispatch_due_reminders(now=None, batch_size=100):
+    """Send every reminder due at `now` in batches; returns (sent, failed)."""
+    now = now or timezone.now()
+    stale = fail_stale_sending(now)
+    if stale:
+        logger.warning(f"Marked {stale} reminders interrupted while sending as failed")
+    sent_total = failed_total = 0
+    while True:
+        sent, failed = dispatch_batch(now, batch_size)
+        sent_total += sent
+        failed_total += failed
+        if sent + failed < batch_size:
+            break
+    return sent_total, failed_total
@@ -0,0 +1,49 @@
+"""
+Notification retention.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are deleted by the
+purge_notifications command, in chunks of ids so that no single DELETE holds
+locks on a large part of the table. Unread notifications are always kept.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .summary import invalidate as invalidate_summary
+
+
+def retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+
+
+def expired_notifications(older_than=None, now=None):
+    older_than = older_than if older_than is not None else timedelta(days=retention_days())
+    return Notification.objects.filter(
+        status=Notification.NotificationStatus.READ,
+        created_at__lt=(now or timezone.now()) - older_than,
+    )
+
+
+def purge_batch(older_than=None, batch_size=1000, now=None):
+    """Delete up to `batch_size` expired notifications; returns how many were deleted."""
+    with transaction.atomic():
+        rows = list(expired_notifications(older_than, now).order_by('id').values_list('id', 'user_id')[:batch_size])
+        if not rows:
+            return 0
+        Notification.objects.filter(id__in=[pk for pk, _ in rows]).delete()
+        invalidate_summary({user_id for _, user_id in rows})
+    return len(rows)
+
+
+def purge_read_notifications(older_than=None, batch_size=1000):
+    """Delete every expired notification in batches; returns the total deleted."""
+    now = timezone.now()
+    total = 0
+    while True:
+        deleted = purge_batch(older_than, batch_size, now)
+        total += deleted
+        if deleted < batch_size:
+            return total
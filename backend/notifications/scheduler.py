@@ -0,0 +1,215 @@
+"""
+Long-running reminder scheduler (see the run_reminder_scheduler command).
+
+Instead of waiting for cron to run send_reservation_reminders, the scheduler
+keeps the send_at of upcoming pending reminders in a min-heap, sleeps until the
+earliest one and dispatches it on time through notifications.reminders.
+
+The heap covers reminders due within `horizon` seconds. It is refreshed
+incrementally from rows whose updated_at moved since the last refresh, fully
+reloaded every horizon / 2, and on PostgreSQL the wait is cut short by a NOTIFY
+sent whenever a reminder is saved (see notifications.signals). Entries for
+reminders that were cancelled or moved are harmless: dispatching always
+re-reads what is due from the database.
+"""
+import heapq
+import json
+import logging
+import os
+import select
+import threading
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .models import ReservationReminder
+from .reminders import dispatch_due_reminders
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = 'reservation_reminders'
+# Rows committed slightly after a refresh can carry an earlier updated_at
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class ReminderHeap:
+    """Min-heap of (send_at, reminder_id) with lazy removal of outdated entries."""
+
+    def __init__(self):
+        self._heap = []
+        self._send_at = {}
+
+    def __len__(self):
+        return len(self._send_at)
+
+    def set(self, reminder_id, send_at):
+        if self._send_at.get(reminder_id) == send_at:
+            return
+        self._send_at[reminder_id] = send_at
+        heapq.heappush(self._heap, (send_at, reminder_id))
+
+    def discard(self, reminder_id):
+        self._send_at.pop(reminder_id, None)
+
+    def clear(self):
+        self._heap = []
+        self._send_at = {}
+
+    def _prune(self):
+        while self._heap and self._send_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def next_deadline(self):
+        self._prune()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """Remove and return the ids of entries due at `now`."""
+        due = []
+        while True:
+            self._prune()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, reminder_id = heapq.heappop(self._heap)
+            del self._send_at[reminder_id]
+            due.append(reminder_id)
+
+
+class _Waiter:
+    """Sleeps until a timeout, a stop request or (on PostgreSQL) a NOTIFY on NOTIFY_CHANNEL."""
+
+    def __init__(self, stop_event, use_listen=True):
+        self.stop_event = stop_event
+        self.use_listen = use_listen and connection.vendor == 'postgresql'
+        self._listening_on = None
+
+    def _listen(self):
+        connection.ensure_connection()
+        raw = connection.connection
+        if raw is not self._listening_on:
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {NOTIFY_CHANNEL}')
+            self._listening_on = raw
+        return raw
+
+    def wait(self, timeout):
+        """Returns True when woken up by a notification."""
+        if not self.use_listen:
+            self.stop_event.wait(timeout)
+            return False
+        try:
+            raw = self._listen()
+            # Wake up at least once a second to notice stop requests
+            ready, _, _ = select.select([raw], [], [], min(timeout, 1.0))
+            if not ready:
+                return False
+            raw.poll()
+            notified = bool(raw.notifies)
+            raw.notifies.clear()
+            return notified
+        except Exception as exc:
+            logger.warning('LISTEN on %s failed, falling back to polling: %s', NOTIFY_CHANNEL, exc)
+            self._listening_on = None
+            self.stop_event.wait(timeout)
+            return False
+
+
+class ReminderScheduler:
+    def __init__(self, poll_interval=30, horizon=3600, batch_size=100, health_file=None, use_listen=True):
+        self.poll_interval = poll_interval
+        self.horizon = timedelta(seconds=horizon)
+        self.batch_size = batch_size
+        self.health_file = health_file
+        self.heap = ReminderHeap()
+        self.stop_event = threading.Event()
+        self.waiter = _Waiter(self.stop_event, use_listen=use_listen)
+        self._watermark = None
+        self._next_full_refresh = None
+        self.sent = 0
+        self.failed = 0
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+    def full_refresh(self, now):
+        self.heap.clear()
+        reminders = ReservationReminder.objects.filter(
+            status=ReservationReminder.Status.PENDING,
+            send_at__lte=now + self.horizon,
+        ).values_list('id', 'send_at')
+        for reminder_id, send_at in reminders.iterator():
+            self.heap.set(reminder_id, send_at)
+        self._watermark = now
+        self._next_full_refresh = now + self.horizon / 2
+
+    def refresh(self, now):
+        """Apply reminders created, moved or cancelled since the last refresh."""
+        if self._watermark is None or now >= self._next_full_refresh:
+            self.full_refresh(now)
+            return
+        changed = ReservationReminder.objects.filter(
+            updated_at__gte=self._watermark - REFRESH_OVERLAP,
+        ).values_list('id', 'send_at', 'status')
+        for reminder_id, send_at, status in changed.iterator():
+            if status == ReservationReminder.Status.PENDING and send_at <= now + self.horizon:
+                self.heap.set(reminder_id, send_at)
+            else:
+                self.heap.discard(reminder_id)
+        self._watermark = now
+
+    def tick(self, now=None):
+        """
+        Refresh the heap, dispatch whatever is due and return the number of
+        seconds to wait before the next tick.
+        """
+        now = now or timezone.now()
+        self.refresh(now)
+        if self.heap.pop_due(now):
+            sent, failed = dispatch_due_reminders(now, batch_size=self.batch_size)
+            self.sent += sent
+            self.failed += failed
+            if sent or failed:
+                logger.info('Dispatched %s reminders (%s failed)', sent, failed)
+        next_deadline = self.heap.next_deadline()
+        self.write_health(now, next_deadline)
+        wait = self.poll_interval
+        if next_deadline is not None:
+            wait = min(wait, (next_deadline - now).total_seconds())
+        return max(wait, 0)
+
+    def write_health(self, now, next_deadline):
+        if not self.health_file:
+            return
+        status = {
+            'pid': os.getpid(),
+            'last_tick': now.isoformat(),
+            'next_deadline': next_deadline.isoformat() if next_deadline else None,
+            'scheduled': len(self.heap),
+            'sent': self.sent,
+            'failed': self.failed,
+        }
+        tmp_path = f'{self.health_file}.tmp'
+        with open(tmp_path, 'w') as health:
+            json.dump(status, health)
+        os.replace(tmp_path, self.health_file)
+
+    def run(self):
+        logger.info('Reminder scheduler started (poll every %ss)', self.poll_interval)
+        while not self.stop_event.is_set():
+            try:
+                wait = self.tick()
+            except Exception as exc:
+                logger.error('Reminder scheduler tick failed: %s', exc, exc_info=True)
+                close_old_connections()
+                wait = self.poll_interval
+            remaining = wait
+            # A notification means reminders changed: tick again right away
+            while remaining > 0 and not self.stop_event.is_set():
+                started = timezone.now()
+                if self.waiter.wait(remaining):
+                    break
+                remaining -= (timezone.now() - started).total_seconds()
+        if self.health_file and os.path.exists(self.health_file):
+            os.remove(self.health_file)
+        logger.info('Reminder scheduler stopped')
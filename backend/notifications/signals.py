@@ -1,34 +1,31 @@
+from django.db import connection, transaction
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 import logging
 
+from .fanout import build_notification, create_notifications, fan_out
 from .models import Notification, NotificationTemplate, ReservationReminder
 from reservations.models import Reservation
 from reviews.models import Review
 
 logger = logging.getLogger(__name__)
 
-# Store previous reservation fields to detect changes
-_previous_reservation_cache = {}
-
 
 @receiver(pre_save, sender=Reservation)
-def store_previous_status(sender, instance, **kwargs):
-    """Store previous status/date/time before save to detect changes"""
-    if instance.pk:
-        try:
-            old_instance = Reservation.objects.get(pk=instance.pk)
-            _previous_reservation_cache[instance.pk] = {
-                'status': old_instance.status,
-                'date': old_instance.date,
-                'time': old_instance.time,
-            }
-        except Reservation.DoesNotExist:
-            _previous_reservation_cache[instance.pk] = None
-    else:
-        _previous_reservation_cache[instance.pk] = None
+def load_previous_values(sender, instance, **kwargs):
+    """
+    Previous status/date/time come from the snapshot Reservation takes when it
+    is loaded or saved. Only instances built by hand (or with those fields
+    deferred) need to read them from the database.
+    """
+    if instance.pk is None:
+        return
+    missing = [name for name in Reservation.TRACKED_FIELDS if name not in instance.loaded_values()]
+    if missing:
+        previous = Reservation.objects.filter(pk=instance.pk).values(*missing).first() or {}
+        instance._loaded_values = {**instance.loaded_values(), **previous}
 
 
 def _get_reservation_datetime(instance):
@@ -84,7 +81,18 @@ def get_provider_user_from_reservation(instance):
     """
     Safely get the provider user from a reservation instance.
     Returns (provider_user, provider_name) tuple.
+    Reuses the user given to Reservation.set_provider_user() when the provider has not changed since.
     """
+    resolved = getattr(instance, '_provider_user', None)
+    if resolved and resolved[:2] == (instance.provider_content_type_id, instance.provider_object_id):
+        provider_user, provider_name = resolved[2:]
+        if Reservation.provider.is_cached(instance) and instance.provider is not None:
+            provider_name = _provider_display_name(instance.provider)
+        elif provider_name is None:
+            provider_name = _provider_name_from_profile(instance)
+            instance.set_provider_user(provider_user, provider_name)
+        return provider_user, provider_name
+
     try:
         # Try accessing via GenericForeignKey first
         provider = instance.provider
@@ -114,14 +122,8 @@ def get_provider_user_from_reservation(instance):
         
         if provider:
             provider_user = provider.user
-            # Get provider name
-            if hasattr(provider, 'name'):
-                if hasattr(provider, 'last_name'):
-                    provider_name = f"{provider.name} {provider.last_name}"
-                else:
-                    provider_name = provider.name
-            else:
-                provider_name = "N/A"
+            provider_name = _provider_display_name(provider)
+            instance.set_provider_user(provider_user, provider_name)
             
             logger.info(f"Provider found: {provider_name} (User ID: {provider_user.id})")
             return provider_user, provider_name
@@ -134,6 +136,25 @@ def get_provider_user_from_reservation(instance):
         return None, "N/A"
 
 
+def _provider_display_name(provider):
+    """Provider profile name"""
+    if provider is not None and hasattr(provider, 'name'):
+        if hasattr(provider, 'last_name'):
+            return f"{provider.name} {provider.last_name}"
+        return provider.name
+    return "N/A"
+
+
+def _provider_name_from_profile(instance):
+    """Display name of the reservation's provider profile, reading only its name columns"""
+    model = ContentType.objects.get_for_id(instance.provider_content_type_id).model_class()
+    columns = [name for name in ('name', 'last_name') if model and any(f.name == name for f in model._meta.concrete_fields)]
+    if 'name' not in columns:
+        return "N/A"
+    row = model.objects.filter(pk=instance.provider_object_id).values_list(*columns).first()
+    return " ".join(map(str, row)) if row else "N/A"
+
+
 def get_client_name_from_reservation(instance):
     """Get formatted client name from reservation"""
     try:
@@ -146,20 +167,18 @@ def get_client_name_from_reservation(instance):
         return "Cliente"
 
 
-def create_provider_notification_for_new_reservation(instance, provider_user, provider_name):
-    """Create notification for provider when new reservation is created"""
+def build_provider_notification_for_new_reservation(instance, provider_user, provider_name):
+    """Unsaved notification for the provider of a new reservation (None if it cannot be built)"""
     if not provider_user:
         logger.error(f"Cannot create provider notification: provider_user is None for reservation {instance.code}")
-        return False
+        return None
     
     try:
         service_name = instance.service.name
         client_name = get_client_name_from_reservation(instance)
         
-        logger.info(f"Creating provider notification for user {provider_user.id} ({provider_user.email}) - Reservation: {instance.code}")
-        
         is_confirmed = instance.status == Reservation.Status.CONFIRMED
-        notification = _create_notification(
+        return build_notification(
             user=provider_user,
             type=Notification.NotificationType.RESERVATION,
             title="Nueva reserva confirmada" if is_confirmed else "Nueva solicitud de reserva",
@@ -183,28 +202,18 @@ def create_provider_notification_for_new_reservation(instance, provider_user, pr
                 'action_required': False if is_confirmed else True,
             }
         )
-        
-        if notification:
-            logger.info(f"Provider notification created successfully: ID {notification.id}")
-            return True
-        else:
-            logger.error(f"Failed to create provider notification - _create_notification returned None")
-            return False
-            
     except Exception as e:
         logger.error(f"Error creating provider notification for reservation {instance.code}: {e}", exc_info=True)
-        return False
+        return None
 
 
-def create_client_notification_for_new_reservation(instance, provider_name):
-    """Create notification for client when their reservation request is sent"""
+def build_client_notification_for_new_reservation(instance, provider_name):
+    """Unsaved notification for the client of a new reservation (None if it cannot be built)"""
     try:
         service_name = instance.service.name
         
-        logger.info(f"Creating client notification for reservation {instance.code}")
-        
         is_confirmed = instance.status == Reservation.Status.CONFIRMED
-        notification = _create_notification(
+        return build_notification(
             user=instance.client.user,
             type=Notification.NotificationType.RESERVATION,
             title="Reserva confirmada" if is_confirmed else "Solicitud de reserva enviada",
@@ -225,17 +234,9 @@ def create_client_notification_for_new_reservation(instance, provider_name):
                 'status': instance.status,
             }
         )
-        
-        if notification:
-            logger.info(f"Client notification created successfully: ID {notification.id}")
-            return True
-        else:
-            logger.error(f"Failed to create client notification - _create_notification returned None")
-            return False
-            
     except Exception as e:
         logger.error(f"Error creating client notification for reservation {instance.code}: {e}", exc_info=True)
-        return False
+        return None
 
 
 # ======================
@@ -254,18 +255,29 @@ def create_reservation_notification(sender, instance, created, **kwargs):
         # Get provider user
         provider_user, provider_name = get_provider_user_from_reservation(instance)
         
-        # Create provider notification
-        provider_notif_created = create_provider_notification_for_new_reservation(instance, provider_user, provider_name)
-        
-        # Create client notification
-        client_notif_created = create_client_notification_for_new_reservation(instance, provider_name)
+        # Create provider and client notifications with one INSERT
+        provider_notification = build_provider_notification_for_new_reservation(instance, provider_user, provider_name)
+        client_notification = build_client_notification_for_new_reservation(instance, provider_name)
+        try:
+            # Savepoint: a failed INSERT must not abort the transaction saving the reservation
+            with transaction.atomic():
+                create_notifications([n for n in (provider_notification, client_notification) if n is not None])
+        except Exception as e:
+            logger.error(f"Error creating notifications for reservation {instance.code}: {e}", exc_info=True)
+            provider_notification = client_notification = None
+        provider_notif_created = provider_notification is not None
+        client_notif_created = client_notification is not None
 
         # Send confirmation email to provider
         # Note: Google Calendar doesn't send email to the organizer (professional), only to attendees
         # So we need to send a custom email to the professional
+        email_snapshot = None
         try:
+            from .email_renderer import snapshot
             from .emails import send_reservation_notification_to_provider
-            email_sent_to_provider = send_reservation_notification_to_provider(instance)
+            # Built once, shared by the provider and client emails
+            email_snapshot = snapshot(instance)
+            email_sent_to_provider = send_reservation_notification_to_provider(instance, email_snapshot)
             if email_sent_to_provider:
                 logger.info(f"✅ Confirmation email sent to provider for reservation {instance.code}")
             else:
@@ -278,7 +290,7 @@ def create_reservation_notification(sender, instance, created, **kwargs):
         if instance.status == Reservation.Status.CONFIRMED:
             try:
                 from .emails import send_reservation_confirmation_to_client
-                email_sent_to_client = send_reservation_confirmation_to_client(instance)
+                email_sent_to_client = send_reservation_confirmation_to_client(instance, email_snapshot)
                 if email_sent_to_client:
                     logger.info(f"✅ Confirmation email sent to client for reservation {instance.code}")
                 else:
@@ -333,7 +345,7 @@ def create_reservation_notification(sender, instance, created, **kwargs):
     
     else:
         # Reservation updated - check status/date/time changes
-        previous_data = _previous_reservation_cache.get(instance.pk) or {}
+        previous_data = instance.loaded_values()
         previous_status = previous_data.get('status')
         previous_date = previous_data.get('date')
         previous_time = previous_data.get('time')
@@ -468,6 +480,38 @@ def create_review_notification(sender, instance, created, **kwargs):
         )
 
 
+@receiver(post_save, sender=ReservationReminder)
+def wake_reminder_scheduler(sender, instance, **kwargs):
+    """Wake up run_reminder_scheduler (LISTENing on PostgreSQL) once the reminder is committed"""
+    if connection.vendor != 'postgresql' or instance.status != ReservationReminder.Status.PENDING:
+        return
+    from .scheduler import NOTIFY_CHANNEL
+
+    def notify():
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [NOTIFY_CHANNEL, str(instance.pk)])
+        except Exception as e:
+            logger.warning(f"Could not notify reminder scheduler: {e}")
+
+    transaction.on_commit(notify)
+
+
+@receiver(post_save, sender=Notification)
+def invalidate_notification_summary(sender, instance, **kwargs):
+    """Counts in the cached stats summary changed (see notifications.summary)"""
+    from .summary import invalidate
+    invalidate([instance.user_id])
+
+
+@receiver(post_save, sender=Notification)
+def publish_new_notification(sender, instance, created, **kwargs):
+    """Stream new notifications to the user's open connections (see notifications.realtime)"""
+    if created:
+        from .realtime import publish_notifications
+        publish_notifications([instance])
+
+
 # ======================
 # NOTIFICATION CREATION
 # ======================
@@ -512,17 +556,6 @@ def create_system_notification(user, title, message, metadata=None):
     )
 
 
-def create_bulk_notification(users, type, title, message, metadata=None):
-    """Create notifications for multiple users"""
-    notifications = []
-    for user in users:
-        notification = _create_notification(
-            user=user,
-            type=type,
-            title=title,
-            message=message,
-            metadata=metadata
-        )
-        if notification:
-            notifications.append(notification)
-    return notifications
+def create_bulk_notification(users, type, title, message, metadata=None, push=False):
+    """Create notifications for multiple users with chunked bulk inserts (see notifications.fanout)"""
+    return fan_out(users, type=type, title=title, message=message, metadata=metadata, push=push)
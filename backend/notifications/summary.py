@@ -0,0 +1,114 @@
+"""
+Per-user notification summary (the stats endpoint).
+
+The summary (total, unread, counts by type and by status) is computed with a
+single grouped query and cached per user. Every code path that creates,
+changes or deletes notifications calls invalidate() for the affected users,
+so the next read recomputes it; the rebuild_notification_summaries command
+recomputes cached summaries in bulk in case they drift.
+
+Like users.discovery_cache, cached summaries are tagged with a per-user
+generation, and invalidate() moves the user to a new one instead of deleting
+the summary. A summary computed before an invalidation is stored under the
+generation read before the query, so it is ignored even if it is written
+after the invalidation. Generations are random tokens, so a generation key
+that expires or is evicted also invalidates the summary.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Notification
+
+CACHE_KEY_PREFIX = 'notification_summary:'
+GENERATION_KEY_PREFIX = 'notification_summary_generation:'
+
+
+def _timeout():
+    return getattr(settings, 'NOTIFICATION_SUMMARY_CACHE_TIMEOUT', 3600)
+
+
+def cache_key(user_id):
+    return f'{CACHE_KEY_PREFIX}{user_id}'
+
+
+def generation_key(user_id):
+    return f'{GENERATION_KEY_PREFIX}{user_id}'
+
+
+def _new_generations(user_ids):
+    generations = {user_id: uuid.uuid4().hex for user_id in user_ids}
+    cache.set_many({generation_key(user_id): value for user_id, value in generations.items()}, timeout=_timeout())
+    return generations
+
+
+def _generations(user_ids):
+    """{user_id: current generation}, starting a new one for users without any."""
+    found = cache.get_many([generation_key(user_id) for user_id in user_ids])
+    generations = {user_id: found.get(generation_key(user_id)) for user_id in user_ids}
+    missing = [user_id for user_id, generation in generations.items() if generation is None]
+    if missing:
+        generations.update(_new_generations(missing))
+    return generations
+
+
+def _empty():
+    return {'total_count': 0, 'unread_count': 0, 'by_type': {}, 'by_status': {}}
+
+
+def compute_summaries(user_ids):
+    """{user_id: summary} for `user_ids`, with one query."""
+    summaries = {user_id: _empty() for user_id in user_ids}
+    rows = (
+        Notification.objects.filter(user_id__in=summaries)
+        .order_by()
+        .values_list('user_id', 'type', 'status')
+        .annotate(count=Count('id'))
+    )
+    for user_id, type, status, count in rows:
+        summary = summaries[user_id]
+        summary['total_count'] += count
+        if status == Notification.NotificationStatus.UNREAD:
+            summary['unread_count'] += count
+        summary['by_type'][type] = summary['by_type'].get(type, 0) + count
+        summary['by_status'][status] = summary['by_status'].get(status, 0) + count
+    return summaries
+
+
+def get_summary(user_id):
+    """Cached summary for one user; no queries when it is cached."""
+    key, gen_key = cache_key(user_id), generation_key(user_id)
+    cached = cache.get_many([key, gen_key])
+    generation = cached.get(gen_key)
+    entry = cached.get(key)
+    if generation is not None and entry and entry.get('generation') == generation:
+        return entry['summary']
+    if generation is None:
+        generation = _new_generations([user_id])[user_id]
+    summary = compute_summaries([user_id])[user_id]
+    cache.set(key, {'generation': generation, 'summary': summary}, timeout=_timeout())
+    return summary
+
+
+def rebuild(user_ids):
+    """Recompute and store the summaries of `user_ids`; returns how many were stored."""
+    generations = _generations(user_ids)
+    summaries = compute_summaries(user_ids)
+    cache.set_many(
+        {
+            cache_key(user_id): {'generation': generations[user_id], 'summary': summary}
+            for user_id, summary in summaries.items()
+        },
+        timeout=_timeout(),
+    )
+    return len(summaries)
+
+
+def invalidate(user_ids):
+    """Move `user_ids` to a new summary generation once the current transaction commits."""
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _new_generations(user_ids))
@@ -1,3 +1,803 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import IntegrityError, connection, connections
+from django.template import loader
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from reservations.models import Reservation
+from services.models import ServicesCategory, ServicesType
+from users.models import ClientProfile, ProfessionalProfile, User
+
+from . import email_renderer, emails, outbox, push, realtime, retention, summary
+from .fanout import fan_out
+from .models import Notification, OutboundEmail, PushDeviceToken, PushTicket, ReservationReminder
+from .reminders import dispatch_due_reminders
+from .scheduler import ReminderHeap, ReminderScheduler
+from .signals import get_provider_user_from_reservation
+
+
+class FakeExpoServer:
+    """
+    Local stand-in for the Expo push API. Tokens containing 'Gone' get a
+    DeviceNotRegistered error ticket; tokens containing 'Stale' get an ok ticket
+    whose receipt reports DeviceNotRegistered. Statuses queued in `fail_with`
+    are returned (one per request), with `retry_after` as their Retry-After
+    header, before any successful response.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.receipt_requests = []
+        self.fail_with = []
+        self.retry_after = '0'
+        self.encodings = []
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, payload, headers=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                owner.encodings.append(self.headers.get('Content-Encoding'))
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                if owner.fail_with:
+                    return self._reply(owner.fail_with.pop(0), {'errors': []}, {'Retry-After': owner.retry_after})
+                payload = json.loads(body)
+                if self.path.endswith('/getReceipts'):
+                    owner.receipt_requests.append(payload['ids'])
+                    receipts = {
+                        ticket_id: {'status': 'error', 'details': {'error': 'DeviceNotRegistered'}}
+                        if 'Stale' in ticket_id else {'status': 'ok'}
+                        for ticket_id in payload['ids']
+                        if not ticket_id.startswith('pending')
+                    }
+                    return self._reply(200, {'data': receipts})
+                owner.requests.append(payload)
+                tickets = [
+                    {'status': 'error', 'details': {'error': 'DeviceNotRegistered'}}
+                    if 'Gone' in message['to'] else {'status': 'ok', 'id': f"ticket-{message['to']}"}
+                    for message in payload
+                ]
+                return self._reply(200, {'data': tickets})
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.requests.clear()
+        self.receipt_requests.clear()
+        self.fail_with.clear()
+        self.retry_after = '0'
+        self.encodings.clear()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeExpoTestCase(TestCase):
+    """Points the shared push client at a FakeExpoServer for the duration of each test."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.expo = FakeExpoServer()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.expo.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.expo.reset()
+        self.sleeps = []
+        push._client = push.ExpoPushClient(base_url=self.expo.url, max_retries=3, sleep=self.sleeps.append)
+        self.addCleanup(setattr, push, '_client', None)
+
+
+def create_reservation():
+    """A reservation between a client and a professional, without the reminders its signals schedule."""
+    client_user = User.objects.create_user(
+        email='client@example.com', username='client', password='pass', role=User.Role.CLIENT,
+    )
+    pro_user = User.objects.create_user(
+        email='pro@example.com', username='pro', password='pass', role=User.Role.PROFESSIONAL,
+    )
+    professional = ProfessionalProfile.objects.create(user=pro_user, name='Ana', last_name='Pro')
+    service = ServicesType.objects.create(
+        category=ServicesCategory.objects.create(name='Belleza'), name='Corte',
+    )
+    reservation = Reservation.objects.create(
+        client=ClientProfile.objects.create(user=client_user),
+        provider_content_type=ContentType.objects.get_for_model(ProfessionalProfile),
+        provider_object_id=professional.id,
+        service=service,
+        date=date(2030, 1, 15),
+        time=time(10, 30),
+    )
+    ReservationReminder.objects.all().delete()
+    Notification.objects.all().delete()
+    return reservation, [client_user, pro_user]
+
+
+class ReminderDispatchTests(FakeExpoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reservation, self.users = create_reservation()
+
+    def _remind(self, user, reminder_type, minutes_ago=1):
+        return ReservationReminder.objects.create(
+            reservation=self.reservation, user=user, reminder_type=reminder_type,
+            send_at=timezone.now() - timedelta(minutes=minutes_ago),
+        )
+
+    def test_batches_pushes_notifications_and_statuses(self):
+        client_user, pro_user = self.users
+        PushDeviceToken.objects.create(user=client_user, token='ExponentPushToken[client]')
+        gone = PushDeviceToken.objects.create(user=pro_user, token='ExponentPushToken[Gone]')
+        invalid = PushDeviceToken.objects.create(user=pro_user, token='not-an-expo-token')
+        due = [
+            self._remind(client_user, ReservationReminder.ReminderType.H24),
+            self._remind(client_user, ReservationReminder.ReminderType.H4),
+            self._remind(pro_user, ReservationReminder.ReminderType.H24),
+        ]
+        later = ReservationReminder.objects.create(
+            reservation=self.reservation, user=pro_user, reminder_type=ReservationReminder.ReminderType.M30,
+            send_at=timezone.now() + timedelta(hours=1),
+        )
+
+        with self.assertNumQueries(12):
+            # stale SENDING; claim: savepoint, select, mark SENDING, release; tokens, tickets,
+            # deactivate tokens; record: savepoint, notifications, reminders, release
+            sent, failed = dispatch_due_reminders(batch_size=10)
+
+        self.assertEqual((sent, failed), (2, 1))
+        self.assertEqual(len(self.expo.requests), 1)
+        self.assertEqual(len(self.expo.requests[0]), 3)
+        statuses = dict(ReservationReminder.objects.values_list('id', 'status'))
+        self.assertEqual(
+            [statuses[reminder.id] for reminder in due],
+            [ReservationReminder.Status.SENT, ReservationReminder.Status.SENT, ReservationReminder.Status.FAILED],
+        )
+        self.assertEqual(statuses[later.id], ReservationReminder.Status.PENDING)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertFalse(PushDeviceToken.objects.filter(id__in=[gone.id, invalid.id], is_active=True).exists())
+
+    def test_pushes_are_sent_after_the_claim_commits(self):
+        client_user = self.users[0]
+        PushDeviceToken.objects.create(user=client_user, token='ExponentPushToken[client]')
+        reminder = self._remind(client_user, ReservationReminder.ReminderType.H24)
+        seen = []
+        original = push.send_push_batch
+
+        def send_push_batch(pushes):
+            seen.append(ReservationReminder.objects.get(id=reminder.id).status)
+            return original(pushes)
+
+        with mock.patch('notifications.reminders.send_push_batch', send_push_batch):
+            self.assertEqual(dispatch_due_reminders(), (1, 0))
+        self.assertEqual(seen, [ReservationReminder.Status.SENDING])
+
+    def test_stale_sending_reminders_are_failed_not_resent(self):
+        client_user = self.users[0]
+        stuck = self._remind(client_user, ReservationReminder.ReminderType.H24)
+        ReservationReminder.objects.filter(id=stuck.id).update(
+            status=ReservationReminder.Status.SENDING, updated_at=timezone.now() - timedelta(hours=1),
+        )
+
+        self.assertEqual(dispatch_due_reminders(), (0, 0))
+        stuck.refresh_from_db()
+        self.assertEqual(stuck.status, ReservationReminder.Status.FAILED)
+        self.assertEqual(self.expo.requests, [])
+
+    def test_messages_are_chunked_per_expo_limit(self):
+        client_user = self.users[0]
+        for i in range(push.EXPO_MAX_MESSAGES + 5):
+            PushDeviceToken.objects.create(user=client_user, token=f'ExponentPushToken[{i}]')
+        self._remind(client_user, ReservationReminder.ReminderType.H24)
+
+        self.assertEqual(dispatch_due_reminders(), (1, 0))
+        self.assertEqual([len(messages) for messages in self.expo.requests], [push.EXPO_MAX_MESSAGES, 5])
+
+
+class ExpoPushClientTests(FakeExpoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(email='push@example.com', username='push', password='pass')
+
+    def test_retries_throttling_and_gzips_large_bodies(self):
+        tokens = [
+            PushDeviceToken.objects.create(user=self.user, token=f'ExponentPushToken[{i}]') for i in range(20)
+        ]
+        self.expo.fail_with = [429, 503]
+
+        self.assertTrue(push.send_push_notifications(tokens, 'Hola', 'x' * 100))
+
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual(self.expo.encodings, ['gzip'] * 3)
+        self.assertEqual(len(self.expo.requests), 1)
+        self.assertEqual(PushTicket.objects.count(), 20)
+
+    @override_settings(EXPO_PUSH_MAX_BACKOFF=5)
+    def test_caps_retry_after(self):
+        push._client = push.ExpoPushClient(base_url=self.expo.url, max_retries=3, sleep=self.sleeps.append)
+        token = PushDeviceToken.objects.create(user=self.user, token='ExponentPushToken[a]')
+        self.expo.fail_with = [503]
+        self.expo.retry_after = '3600'
+
+        self.assertTrue(push.send_push_notifications([token], 'Hola', 'Mundo'))
+        self.assertEqual(self.sleeps, [5])
+
+    def test_gives_up_after_max_retries(self):
+        token = PushDeviceToken.objects.create(user=self.user, token='ExponentPushToken[a]')
+        self.expo.fail_with = [500] * 4
+
+        self.assertFalse(push.send_push_notifications([token], 'Hola', 'Mundo'))
+        self.assertEqual(len(self.sleeps), 3)
+        self.assertFalse(PushTicket.objects.exists())
+
+    def test_receipts_deactivate_unregistered_devices(self):
+        fresh = PushDeviceToken.objects.create(user=self.user, token='ExponentPushToken[fresh]')
+        stale = PushDeviceToken.objects.create(user=self.user, token='ExponentPushToken[Stale]')
+        push.send_push_notifications([fresh, stale], 'Hola', 'Mundo')
+        waiting = PushTicket.objects.create(ticket_id='pending-1', token=fresh)
+
+        self.assertEqual(push.check_receipts(min_age=timedelta(0)), (2, 1))
+
+        self.assertEqual(len(self.expo.receipt_requests), 1)
+        self.assertEqual(list(PushDeviceToken.objects.filter(is_active=True)), [fresh])
+        # No receipt yet: kept for the next pass
+        self.assertEqual(list(PushTicket.objects.all()), [waiting])
+
+
+class ReminderSchedulerTests(TestCase):
+    def setUp(self):
+        self.reservation, self.users = create_reservation()
+        self.now = timezone.now()
+
+    def _remind(self, reminder_type, seconds):
+        return ReservationReminder.objects.create(
+            reservation=self.reservation, user=self.users[0], reminder_type=reminder_type,
+            send_at=self.now + timedelta(seconds=seconds),
+        )
+
+    def test_heap_drops_moved_entries(self):
+        heap = ReminderHeap()
+        heap.set(1, self.now + timedelta(seconds=10))
+        heap.set(2, self.now + timedelta(seconds=20))
+        heap.set(1, self.now + timedelta(seconds=30))
+        self.assertEqual(heap.next_deadline(), self.now + timedelta(seconds=20))
+        self.assertEqual(heap.pop_due(self.now + timedelta(seconds=25)), [2])
+        heap.discard(1)
+        self.assertIsNone(heap.next_deadline())
+
+    def test_sleeps_until_next_reminder_and_dispatches_it(self):
+        due = self._remind(ReservationReminder.ReminderType.H24, -5)
+        upcoming = self._remind(ReservationReminder.ReminderType.H4, 12)
+        self._remind(ReservationReminder.ReminderType.H12, 7200)  # beyond the horizon
+        scheduler = ReminderScheduler(poll_interval=30, horizon=3600, use_listen=False)
+
+        self.assertEqual(scheduler.tick(self.now), 12)
+        due.refresh_from_db()
+        self.assertNotEqual(due.status, ReservationReminder.Status.PENDING)
+        self.assertEqual(len(scheduler.heap), 1)
+
+        # Rescheduled reminders are picked up by the incremental refresh
+        upcoming.send_at = self.now + timedelta(seconds=3)
+        upcoming.save()
+        self.assertEqual(scheduler.tick(self.now + timedelta(seconds=1)), 2)
+        self.assertEqual(scheduler.tick(self.now + timedelta(seconds=3)), 30)
+        upcoming.refresh_from_db()
+        self.assertNotEqual(upcoming.status, ReservationReminder.Status.PENDING)
+
+    def test_health_file_and_stop(self):
+        health_file = os.path.join(tempfile.mkdtemp(), 'scheduler.json')
+        scheduler = ReminderScheduler(poll_interval=0.05, health_file=health_file, use_listen=False)
+        scheduler.tick(self.now)
+        with open(health_file) as health:
+            self.assertEqual(json.load(health)['scheduled'], 0)
+
+        # A stop request (SIGTERM) ends the loop and removes the health file
+        scheduler.stop()
+        scheduler.run()
+        self.assertFalse(os.path.exists(health_file))
+
+
+class FlakyEmailBackend(EmailBackend):
+    """locmem backend that rejects recipients containing 'bounce' and counts opened connections."""
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any('bounce' in recipient for recipient in message.to):
+                raise ConnectionError('550 mailbox unavailable')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='notifications.tests.FlakyEmailBackend',
+    EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+    EMAIL_OUTBOX_RETRY_DELAY=0,
+)
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        FlakyEmailBackend.opened = 0
+
+    def test_reservation_emails_are_queued_not_sent(self):
+        create_reservation()
+        self.assertTrue(OutboundEmail.objects.filter(status=OutboundEmail.Status.PENDING).exists())
+        self.assertEqual(mail.outbox, [])
+
+    def test_batch_shares_one_connection_and_dead_letters_failures(self):
+        OutboundEmail.objects.all().delete()
+        outbox.enqueue('Hola', 'texto', ['a@example.com'], html_message='<p>texto</p>')
+        outbox.enqueue('Hola', 'texto', ['b@example.com'])
+        bounced = outbox.enqueue('Hola', 'texto', ['bounce@example.com'])
+
+        self.assertEqual(outbox.send_queued_emails(batch_size=10), (2, 1))
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), (OutboundEmail.Status.PENDING, 1))
+
+        self.assertEqual(outbox.send_queued_emails(batch_size=10), (0, 1))
+        bounced.refresh_from_db()
+        self.assertEqual(bounced.status, OutboundEmail.Status.DEAD)
+        self.assertIn('550', bounced.last_error)
+        self.assertEqual(outbox.send_queued_emails(batch_size=10), (0, 0))
+
+    def test_expired_emails_are_dead_lettered_and_sensitive_bodies_cleared(self):
+        OutboundEmail.objects.all().delete()
+        code = outbox.enqueue(
+            'Código', 'Tu código es 123456', ['a@example.com'], html_message='<p>123456</p>',
+            expires_at=timezone.now() + timedelta(minutes=10), sensitive=True,
+        )
+        stale = outbox.enqueue(
+            'Código', 'Tu código es 654321', ['b@example.com'],
+            expires_at=timezone.now() - timedelta(minutes=1), sensitive=True,
+        )
+
+        self.assertEqual(outbox.send_queued_emails(batch_size=10), (1, 1))
+        self.assertEqual([message.to for message in mail.outbox], [['a@example.com']])
+        code.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((code.status, code.body, code.html_body), (OutboundEmail.Status.SENT, '', None))
+        self.assertEqual((stale.status, stale.body, stale.attempts), (OutboundEmail.Status.DEAD, '', 0))
+
+
+class EmailRendererTests(TestCase):
+    def setUp(self):
+        self.reservation, self.users = create_reservation()
+        OutboundEmail.objects.all().delete()
+
+    def _more_reservations(self, count):
+        return [
+            Reservation.objects.create(
+                client=self.reservation.client,
+                provider_content_type=self.reservation.provider_content_type,
+                provider_object_id=self.reservation.provider_object_id,
+                service=self.reservation.service,
+                date=date(2030, 2, day + 1),
+                time=time(9, 0),
+                duration=timedelta(minutes=45),
+            )
+            for day in range(count)
+        ]
+
+    def test_templates_are_compiled_once(self):
+        name = email_renderer.EMAILS['confirmed_client'][0]
+        # Django's cached loader hands back the same compiled template on every lookup
+        self.assertIs(loader.get_template(name).template, loader.get_template(name).template)
+
+    def test_snapshot_queries_do_not_grow_with_reservations(self):
+        ids = [self.reservation.id]
+        with self.assertNumQueries(3) as single:
+            email_renderer.load_snapshots(ids)
+        ids += [reservation.id for reservation in self._more_reservations(3)]
+        with self.assertNumQueries(len(single.captured_queries)):
+            snapshots = email_renderer.load_snapshots(ids)
+
+        data = snapshots[ids[-1]]
+        self.assertEqual(data['provider_name'], 'Ana Pro')
+        self.assertEqual(data['provider_email'], 'pro@example.com')
+        self.assertEqual((data['time'], data['end_time']), ('09:00', '09:45'))
+
+    def test_batch_queues_one_email_per_reservation(self):
+        ids = [reservation.id for reservation in self._more_reservations(2)]
+        self.assertEqual(emails.queue_reservation_emails('confirmed_provider', ids), 2)
+
+        queued = list(OutboundEmail.objects.all())
+        self.assertEqual({tuple(email.to) for email in queued}, {('pro@example.com',)})
+        self.assertEqual(queued[0].subject, 'Nueva Reserva Confirmada - Corte')
+        self.assertIn('Ana Pro', queued[0].html_body)
+        self.assertNotIn('<', queued[0].body)
+
+
+class NotificationStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.broker = realtime.InProcessBroker()
+        realtime._broker = self.broker
+        self.user = User.objects.create_user(username='streamer', email='streamer@example.com', password='x')
+        self.addCleanup(setattr, realtime, '_broker', None)
+
+    def _notify(self, title='Hola'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                user=self.user, type=Notification.NotificationType.SYSTEM, title=title, message='...'
+            )
+
+    def test_default_broker_follows_the_database_engine(self):
+        self.assertEqual(realtime.default_broker_path(), 'notifications.realtime.InProcessBroker')
+        with mock.patch.object(type(connections['default']), 'vendor', 'postgresql'):
+            self.assertEqual(realtime.default_broker_path(), 'notifications.realtime.PostgresBroker')
+
+    def test_postgres_broker_packs_events_into_few_notify_payloads(self):
+        broker = realtime.PostgresBroker()
+        events = [
+            (user_id, {'event': 'notification', 'data': {'id': user_id, 'title': 'Aviso', 'message': 'x' * 200}})
+            for user_id in range(100)
+        ]
+        events.append((7, {'event': 'notification', 'data': {'id': 1000, 'type': 'sistema', 'message': 'y' * 9000}}))
+        sent = []
+        with mock.patch.object(broker, '_notify', side_effect=sent.append):
+            broker.publish_many(events)
+
+        self.assertEqual(len(sent), 1)
+        payloads = sent[0]
+        self.assertLess(len(payloads), 10)
+        self.assertTrue(all(len(payload.encode()) <= realtime.MAX_PAYLOAD_BYTES for payload in payloads))
+        delivered = []
+        with mock.patch.object(broker, 'deliver', side_effect=lambda user_id, event: delivered.append(user_id)):
+            for payload in payloads:
+                broker._dispatch(payload)
+            # Single-message payloads are still understood
+            broker._dispatch(json.dumps({'user': 3, 'event': 'unread', 'data': {'delta': -1}}))
+        self.assertEqual(delivered, [user_id for user_id, _ in events] + [3])
+
+    def test_broker_delivers_to_the_users_subscribers_only(self):
+        async def scenario():
+            mine = self.broker.subscribe(1)
+            other = self.broker.subscribe(2)
+            publisher = threading.Thread(target=self.broker.publish, args=(1, {'event': 'unread', 'data': {'delta': -1}}))
+            publisher.start()
+            publisher.join()
+            return await mine.get(1), await other.get(0.01)
+
+        received, missed = asyncio.run(scenario())
+        self.assertEqual(received, {'event': 'unread', 'data': {'delta': -1}})
+        self.assertIsNone(missed)
+
+    def test_slow_subscriber_is_asked_to_resync(self):
+        async def scenario():
+            subscription = self.broker.subscribe(1)
+            subscription.queue = asyncio.Queue(1)
+            for delta in (1, 2, 3):
+                self.broker.publish(1, {'event': 'unread', 'data': {'delta': delta}})
+            await asyncio.sleep(0)
+            return [await subscription.get(0.01) for _ in range(3)]
+
+        first, second, third = asyncio.run(scenario())
+        self.assertEqual(first['data'], {'delta': 1})
+        self.assertEqual(second['event'], 'resync')
+        self.assertIsNone(third)
+
+    async def test_stream_sends_new_notifications_and_unread_changes(self):
+        await sync_to_async(self._notify)('Old')
+        token = str(AccessToken.for_user(self.user))
+        response = await self.async_client.get(f'/api/notifications/notifications/stream/?token={token}')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+        self.assertEqual(await anext(stream), b'event: hello\ndata: {"unread_count": 1}\n\n')
+
+        notification = await sync_to_async(self._notify)('New')
+        event = (await anext(stream)).decode()
+        self.assertTrue(event.startswith('event: notification\n'))
+        data = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual((data['id'], data['title'], data['unread_delta']), (notification.id, 'New', 1))
+
+        def read_all():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.force_login(self.user)
+                self.client.post('/api/notifications/notifications/mark_all_read/')
+
+        await sync_to_async(read_all)()
+        self.assertEqual(await anext(stream), b'event: unread\ndata: {"delta": -2}\n\n')
+
+        # A client disconnect cancels the task streaming the response
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    async def test_stream_rejects_missing_or_invalid_tokens(self):
+        response = await self.async_client.get('/api/notifications/notifications/stream/?token=nope')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.broker.subscriber_count(), 0)
+
+    def test_stream_needs_asgi(self):
+        self.client.force_login(self.user)
+        response = self.client.get('/api/notifications/notifications/stream/')
+        self.assertEqual(response.status_code, 501)
+
+
+class NotificationSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='counted', email='counted@example.com', password='x')
+        self.client.force_login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for type in (Notification.NotificationType.SYSTEM, Notification.NotificationType.SYSTEM,
+                         Notification.NotificationType.REVIEW):
+                Notification.objects.create(user=self.user, type=type, title='t', message='m')
+
+    def _stats(self):
+        return self.client.get('/api/notifications/notifications/stats/').json()
+
+    def test_stats_is_one_query_then_cached(self):
+        self.client.get('/api/notifications/notifications/')  # session/user lookups
+        with self.assertNumQueries(3):  # session, user, summary
+            stats = self._stats()
+        self.assertEqual(stats, {
+            'total_count': 3,
+            'unread_count': 3,
+            'by_type': {'sistema': 2, 'reseña': 1},
+            'by_status': {'unread': 3},
+        })
+        with self.assertNumQueries(2):
+            self.assertEqual(self._stats(), stats)
+
+    def test_changes_invalidate_the_summary(self):
+        self._stats()
+        notification = Notification.objects.filter(user=self.user).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/notifications/{notification.id}/mark_read/')
+        self.assertEqual(self._stats()['by_status'], {'read': 1, 'unread': 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/notifications/mark_all_read/')
+        self.assertEqual(self._stats()['unread_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/notifications/bulk_action/', {
+                'notification_ids': [notification.id], 'action': 'delete',
+            }, content_type='application/json')
+        self.assertEqual(self._stats()['total_count'], 2)
+
+    def test_rebuild_command_fixes_drift(self):
+        generation = summary._generations([self.user.id])[self.user.id]
+        cache.set(summary.cache_key(self.user.id), {'generation': generation, 'summary': summary._empty()})
+        self.assertEqual(summary.get_summary(self.user.id)['total_count'], 0)
+        call_command('rebuild_notification_summaries', stdout=open(os.devnull, 'w'))
+        self.assertEqual(summary.get_summary(self.user.id)['total_count'], 3)
+
+    def test_summary_computed_before_an_invalidation_is_not_served(self):
+        compute = summary.compute_summaries
+
+        def compute_then_invalidate(user_ids):
+            # A notification commits between the query and the cache write
+            computed = compute(user_ids)
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(
+                    user=self.user, type=Notification.NotificationType.SYSTEM, title='t', message='m',
+                )
+            return computed
+
+        with mock.patch('notifications.summary.compute_summaries', compute_then_invalidate):
+            self.assertEqual(summary.get_summary(self.user.id)['total_count'], 3)
+        self.assertEqual(summary.get_summary(self.user.id)['total_count'], 4)
+
+
+class FanOutTests(FakeExpoTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.users = [
+            User.objects.create_user(username=f'fan{i}', email=f'fan{i}@example.com', password='x')
+            for i in range(5)
+        ]
+        for user in self.users[:3]:
+            PushDeviceToken.objects.create(user=user, token=f'ExponentPushToken[fan{user.id}]')
+
+    def test_fan_out_inserts_in_chunks_and_pushes_in_one_batch(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            # 5 rows in 3 chunked INSERTs
+            with self.assertNumQueries(3):
+                created = fan_out(
+                    self.users, Notification.NotificationType.SYSTEM, 'Aviso', 'Mantenimiento',
+                    metadata={'kind': 'maintenance'}, push=True, batch_size=2,
+                )
+        self.assertEqual(len(created), 5)
+        self.assertEqual(Notification.objects.filter(title='Aviso').count(), 5)
+        self.assertEqual(len(self.expo.requests), 1)
+        sent = self.expo.requests[0]
+        self.assertEqual(len(sent), 3)
+        self.assertEqual(sent[0]['data']['kind'], 'maintenance')
+        self.assertIn(sent[0]['data']['notification_id'], {notification.id for notification in created})
+
+    def test_fan_out_announces_through_one_notify_statement(self):
+        broker = realtime.PostgresBroker()
+        realtime._broker = broker
+        self.addCleanup(setattr, realtime, '_broker', None)
+
+        def notify(payloads):
+            # pg_notify is PostgreSQL-only: run one stand-in statement per _notify call
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT %s', [len(payloads)])
+
+        users = self.users + [
+            User.objects.create_user(username=f'many{i}', email=f'many{i}@example.com', password='x')
+            for i in range(45)
+        ]
+        with mock.patch.object(broker, '_notify', side_effect=notify):
+            for recipients in (users[:5], users):
+                with CaptureQueriesContext(connection) as queries:
+                    with self.captureOnCommitCallbacks(execute=True):
+                        fan_out(recipients, Notification.NotificationType.SYSTEM, 'Aviso', '...', batch_size=25)
+                inserts = sum(1 for query in queries if query['sql'].startswith('INSERT'))
+                self.assertEqual(inserts, -(-len(recipients) // 25))
+                # The INSERTs plus a single NOTIFY, however many recipients
+                self.assertEqual(len(queries), inserts + 1)
+
+    def test_fan_out_updates_summaries_and_skips_missing_users(self):
+        summary.get_summary(self.users[0].id)
+        with self.captureOnCommitCallbacks(execute=True):
+            created = fan_out([self.users[0], None], Notification.NotificationType.SYSTEM, 'Hola', '...')
+        self.assertEqual(len(created), 1)
+        self.assertEqual(summary.get_summary(self.users[0].id)['unread_count'], 1)
+        self.assertEqual(self.expo.requests, [])
+
+    def test_new_reservation_notifies_both_parties(self):
+        reservation, (client_user, pro_user) = create_reservation()
+        second = Reservation.objects.create(
+            client=reservation.client,
+            provider_content_type=reservation.provider_content_type,
+            provider_object_id=reservation.provider_object_id,
+            service=reservation.service,
+            date=reservation.date,
+            time=time(12, 0),
+        )
+        self.assertEqual(
+            sorted(Notification.objects.filter(object_id=second.pk).values_list('user_id', flat=True)),
+            sorted([client_user.id, pro_user.id]),
+        )
+
+    def test_failed_notification_insert_does_not_break_the_reservation_save(self):
+        reservation, _ = create_reservation()
+        with mock.patch('django.db.models.query.QuerySet._batched_insert', side_effect=IntegrityError('boom')):
+            second = Reservation.objects.create(
+                client=reservation.client,
+                provider_content_type=reservation.provider_content_type,
+                provider_object_id=reservation.provider_object_id,
+                service=reservation.service,
+                date=reservation.date,
+                time=time(12, 0),
+            )
+        self.assertTrue(Reservation.objects.filter(pk=second.pk).exists())
+        self.assertFalse(Notification.objects.filter(object_id=second.pk).exists())
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='keeper', email='keeper@example.com', password='x')
+        old = timezone.now() - timedelta(days=120)
+        for index, status in enumerate(['read', 'read', 'read', 'unread']):
+            notification = Notification.objects.create(
+                user=self.user, type=Notification.NotificationType.SYSTEM, title=f'old {index}', message='...',
+                status=status,
+            )
+            Notification.objects.filter(pk=notification.pk).update(created_at=old)
+        self.recent = Notification.objects.create(
+            user=self.user, type=Notification.NotificationType.SYSTEM, title='recent', message='...', status='read',
+        )
+
+    def test_purges_old_read_notifications_in_batches(self):
+        summary.get_summary(self.user.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(retention.purge_read_notifications(timedelta(days=90), batch_size=2), 3)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('title', flat=True)), ['old 3', 'recent'],
+        )
+        self.assertEqual(summary.get_summary(self.user.id)['total_count'], 2)
+
+    def test_command_dry_run_deletes_nothing(self):
+        out = StringIO()
+        call_command('purge_notifications', '--days', '90', '--dry-run', stdout=out)
+        self.assertIn('3 notifications would be deleted', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 5)
+
+
+class ReservationSignalSnapshotTests(TestCase):
+    def setUp(self):
+        reservation, (self.client_user, self.pro_user) = create_reservation()
+        self.reservation_id = reservation.id
+
+    def _titles(self):
+        return list(Notification.objects.filter(user=self.client_user).values_list('title', flat=True))
+
+    def _reservation_reads(self, queries):
+        return [q['sql'] for q in queries if q['sql'].startswith('SELECT') and 'FROM "reservations_reservation"' in q['sql']]
+
+    def test_status_change_compares_against_the_loaded_snapshot(self):
+        reservation = Reservation.objects.get(pk=self.reservation_id)
+        reservation.status = Reservation.Status.CONFIRMED
+        reservation.set_provider_user(self.pro_user)
+        with CaptureQueriesContext(connection) as queries:
+            reservation.save(update_fields=['status', 'updated_at'])
+        self.assertEqual(self._reservation_reads(queries.captured_queries), [])
+        self.assertEqual(self._titles(), ['Reserva confirmada'])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_provider_user_from_reservation(reservation), (self.pro_user, 'Ana Pro'))
+        self.assertEqual(ReservationReminder.objects.filter(user=self.pro_user).count(), 4)
+
+        # The saved status is the new baseline: saving again is not another transition
+        reservation.notes = 'Llego 5 minutos antes'
+        reservation.save()
+        self.assertEqual(self._titles(), ['Reserva confirmada'])
+
+    def test_provider_name_is_the_profile_name_however_the_user_was_resolved(self):
+        fresh = Reservation.objects.get(pk=self.reservation_id)
+        self.assertEqual(get_provider_user_from_reservation(fresh), (self.pro_user, 'Ana Pro'))
+
+        given = Reservation.objects.get(pk=self.reservation_id)
+        given.set_provider_user(self.pro_user)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_provider_user_from_reservation(given), (self.pro_user, 'Ana Pro'))
+
+        named = Reservation.objects.get(pk=self.reservation_id)
+        named.set_provider_user(self.pro_user, 'Ana Pro')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_provider_user_from_reservation(named), (self.pro_user, 'Ana Pro'))
+
+    def test_instances_not_loaded_from_the_database_read_previous_values(self):
+        Reservation.objects.filter(pk=self.reservation_id).update(status=Reservation.Status.CONFIRMED)
+        reservation = Reservation.objects.get(pk=self.reservation_id)
+        detached = Reservation(**{
+            field.attname: getattr(reservation, field.attname) for field in Reservation._meta.concrete_fields
+        })
+        detached.status = Reservation.Status.CANCELLED
+        with CaptureQueriesContext(connection) as queries:
+            detached.save()
+        self.assertEqual(len(self._reservation_reads(queries.captured_queries)), 1)
+        self.assertEqual(self._titles(), ['Reserva cancelada'])
@@ -9,6 +9,7 @@ router.register(r'push-tokens', views.PushDeviceTokenViewSet, basename='push-tok
 router.register(r'reminders', views.ReservationReminderViewSet, basename='reservation-reminder')
 
 urlpatterns = [
+    path('notifications/stream/', views.notification_stream, name='notification-stream'),
     path('', include(router.urls)),
 ]
 
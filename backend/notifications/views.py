@@ -1,4 +1,11 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
@@ -17,6 +24,8 @@ from .serializers import (
     PushDeviceTokenSerializer,
     ReservationReminderSerializer
 )
+from .realtime import format_event, get_broker, publish_unread_delta
+from .summary import get_summary, invalidate as invalidate_summary
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
@@ -41,36 +50,18 @@ class NotificationViewSet(viewsets.ModelViewSet):
         """Set user to current user when creating notification"""
         serializer.save(user=self.request.user)
     
+    def perform_destroy(self, instance):
+        was_unread = instance.status == Notification.NotificationStatus.UNREAD
+        instance.delete()
+        invalidate_summary([instance.user_id])
+        if was_unread:
+            publish_unread_delta(instance.user_id, -1)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Get notification statistics for current user"""
-        user = request.user
-        
-        # Get basic counts
-        total_count = Notification.objects.filter(user=user).count()
-        unread_count = Notification.objects.filter(
-            user=user, 
-            status=Notification.NotificationStatus.UNREAD
-        ).count()
-        
-        # Get counts by type
-        by_type = Notification.objects.filter(user=user).values('type').annotate(
-            count=Count('id')
-        ).order_by('type')
-        by_type_dict = {item['type']: item['count'] for item in by_type}
-        
-        # Get counts by status
-        by_status = Notification.objects.filter(user=user).values('status').annotate(
-            count=Count('id')
-        ).order_by('status')
-        by_status_dict = {item['status']: item['count'] for item in by_status}
-        
-        stats_data = {
-            'total_count': total_count,
-            'unread_count': unread_count,
-            'by_type': by_type_dict,
-            'by_status': by_status_dict
-        }
+        # Cached per user and invalidated on every change (see notifications.summary)
+        stats_data = get_summary(request.user.id)
         
         serializer = NotificationStatsSerializer(stats_data)
         return Response(serializer.data)
@@ -86,6 +77,8 @@ class NotificationViewSet(viewsets.ModelViewSet):
             status=Notification.NotificationStatus.READ,
             read_at=timezone.now()
         )
+        invalidate_summary([user.id])
+        publish_unread_delta(user.id, -updated_count)
         
         return Response({
             'message': f'Marked {updated_count} notifications as read',
@@ -95,7 +88,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def bulk_action(self, request):
         """Perform bulk actions on notifications"""
-        serializer = NotificationBulkUpdateSerializer(data=request.data)
+        serializer = NotificationBulkUpdateSerializer(data=request.data, context={'request': request})
         serializer.is_valid(raise_exception=True)
         
         notification_ids = serializer.validated_data['notification_ids']
@@ -113,6 +106,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 status=Notification.NotificationStatus.READ,
                 read_at=timezone.now()
             )
+            unread_delta = -updated_count
             message = f'Marked {updated_count} notifications as read'
             
         elif action == 'mark_unread':
@@ -122,13 +116,22 @@ class NotificationViewSet(viewsets.ModelViewSet):
                 status=Notification.NotificationStatus.UNREAD,
                 read_at=None
             )
+            unread_delta = updated_count
             message = f'Marked {updated_count} notifications as unread'
             
         elif action == 'delete':
-            updated_count = notifications.count()
+            counts = notifications.aggregate(
+                total=Count('id'),
+                unread=Count('id', filter=Q(status=Notification.NotificationStatus.UNREAD)),
+            )
+            updated_count = counts['total']
+            unread_delta = -counts['unread']
             notifications.delete()
             message = f'Deleted {updated_count} notifications'
         
+        invalidate_summary([request.user.id])
+        publish_unread_delta(request.user.id, unread_delta)
+        
         return Response({
             'message': message,
             'updated_count': updated_count
@@ -140,6 +143,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         notification = self.get_object()
         if notification.status == Notification.NotificationStatus.UNREAD:
             notification.mark_as_read()
+            publish_unread_delta(request.user.id, -1)
             return Response({'message': 'Notification marked as read'})
         return Response({'message': 'Notification already read'})
     
@@ -149,6 +153,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
         notification = self.get_object()
         if notification.status == Notification.NotificationStatus.READ:
             notification.mark_as_unread()
+            publish_unread_delta(request.user.id, 1)
             return Response({'message': 'Notification marked as unread'})
         return Response({'message': 'Notification already unread'})
     
@@ -242,4 +247,64 @@ class ReservationReminderViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        return ReservationReminder.objects.filter(user=self.request.user)
\ No newline at end of file
+        return ReservationReminder.objects.filter(user=self.request.user)
+
+def _stream_user(request):
+    """
+    User for the event stream: a JWT from the Authorization header or the
+    `token` query parameter (EventSource cannot send headers), else the session.
+    """
+    auth = JWTAuthentication()
+    try:
+        token = request.GET.get('token')
+        if token:
+            return auth.get_user(auth.get_validated_token(token))
+        result = auth.authenticate(request)
+        if result is not None:
+            return result[0]
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+    return request.user if request.user.is_authenticated else None
+
+
+async def _event_stream(subscription, unread_count, keepalive):
+    try:
+        yield f"retry: {getattr(settings, 'NOTIFICATIONS_STREAM_RETRY_MS', 5000)}\n"
+        yield format_event({'event': 'hello', 'data': {'unread_count': unread_count}})
+        while True:
+            event = await subscription.get(keepalive)
+            # Comment lines keep proxies from closing an idle connection
+            yield format_event(event) if event is not None else ": keepalive\n\n"
+    finally:
+        subscription.close()
+
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream of the current user's new notifications
+    ("notification") and unread count changes ("unread"). Starts with a "hello"
+    event carrying the unread count; "resync" means events were dropped and
+    the client should reload. Needs the ASGI application (backend/asgi.py).
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': 'Method not allowed.'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'detail': 'Notification streaming requires the ASGI server.'}, status=501)
+    user = await sync_to_async(_stream_user)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    # Subscribe before counting so no change slips in between
+    subscription = get_broker().subscribe(user.id)
+    try:
+        unread_count = (await sync_to_async(get_summary)(user.id))['unread_count']
+    except Exception:
+        subscription.close()
+        raise
+    response = StreamingHttpResponse(
+        _event_stream(subscription, unread_count, getattr(settings, 'NOTIFICATIONS_STREAM_KEEPALIVE', 15)),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
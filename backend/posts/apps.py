@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        """Import signal handlers when app is ready"""
+        import posts.signals
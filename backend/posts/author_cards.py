@@ -0,0 +1,125 @@
+"""
+Author cards for post serialization.
+
+Every post carries the same handful of author fields (display name, categories,
+rating, public profile id/type and photo). They are computed once per author
+into a plain dict, cached under author_card:<user_id> and shared by all posts
+of that author. Cards are invalidated when the author's User or PublicProfile is
+saved (see posts.signals). The timeout stays below AWS_QUERYSTRING_EXPIRE so
+cached signed photo URLs never outlive their signature.
+"""
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from users import image_derivatives
+
+CACHE_KEY_PREFIX = 'author_card:'
+
+
+def _timeout():
+    default = min(600, max(getattr(settings, 'AWS_QUERYSTRING_EXPIRE', 3600) // 2, 1))
+    return getattr(settings, 'AUTHOR_CARD_CACHE_TIMEOUT', default)
+
+
+def cache_key(user_id):
+    return f'{CACHE_KEY_PREFIX}{user_id}'
+
+
+def _get_public_profile(user):
+    try:
+        return user.public_profile
+    except Exception:
+        return None
+
+
+def _category(profile):
+    category = profile.category if profile else None
+    # Lists are returned as-is (None when empty); legacy strings become a one-item list
+    if isinstance(category, list):
+        return category or None
+    if isinstance(category, str):
+        return [category] if category else None
+    return None
+
+
+def _sub_categories(profile):
+    sub_cats = profile.sub_categories if profile else None
+    if isinstance(sub_cats, list):
+        return sub_cats
+    if isinstance(sub_cats, str):
+        try:
+            return json.loads(sub_cats)
+        except ValueError:
+            return [sub_cats] if sub_cats else []
+    return []
+
+
+def _display_name(user, profile):
+    if profile:
+        try:
+            return profile.display_name
+        except Exception:
+            return profile.name
+    return user.username or user.get_full_name() or user.email
+
+
+def _photo(user, profile):
+    """User.image first, then the first PublicProfile image."""
+    try:
+        if user.image:
+            return user.image.url
+    except Exception:
+        pass
+    if profile and isinstance(profile.images, list) and profile.images:
+        return profile.images[0]
+    return None
+
+
+def _photo_srcset(user, profile):
+    """Resized WebP copies of the photo returned by _photo ({} until they are built)."""
+    try:
+        if user.image:
+            return image_derivatives.srcset(user.image.storage, user.image_derivatives)
+        if profile and isinstance(profile.images, list) and profile.images:
+            return image_derivatives.profile_images_srcset(profile)[0]
+    except Exception:
+        pass
+    return {}
+
+
+def build_card(user):
+    profile = _get_public_profile(user)
+    return {
+        'display_name': _display_name(user, profile),
+        'category': _category(profile),
+        'sub_categories': _sub_categories(profile),
+        'rating': float(profile.rating) if profile and profile.rating is not None else None,
+        'profile_id': profile.id if profile else None,
+        'profile_type': profile.profile_type if profile else None,
+        'photo': _photo(user, profile),
+        'photo_srcset': _photo_srcset(user, profile),
+    }
+
+
+def get_cards(authors):
+    """
+    Return {user_id: card} for the given User instances (load them with
+    select_related('public_profile') to build misses without extra queries).
+    """
+    authors = {author.id: author for author in authors if author is not None}
+    if not authors:
+        return {}
+    keys = {cache_key(user_id): user_id for user_id in authors}
+    cards = {keys[key]: card for key, card in cache.get_many(list(keys)).items()}
+    missing = {user_id: build_card(authors[user_id]) for user_id in authors if user_id not in cards}
+    if missing:
+        cache.set_many({cache_key(user_id): card for user_id, card in missing.items()}, timeout=_timeout())
+        cards.update(missing)
+    return cards
+
+
+def invalidate(user_id):
+    if user_id:
+        cache.delete(cache_key(user_id))
@@ -0,0 +1,49 @@
+"""
+Denormalized like/comment/vote counters.
+
+Post.likes_count, Post.comments_count and PollOption.votes_count are adjusted
+with F() expressions in the same transaction as the row they count, so feed
+reads never aggregate. reconcile_counters() recomputes them from the source
+tables to repair drift (rows removed through the admin, bulk deletes, etc.).
+"""
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import PollOption, PollVote, Post, PostComment, PostLike
+
+# (counted model, counter model, counter field, foreign key from counted model to counter model)
+COUNTERS = [
+    (PostLike, Post, 'likes_count', 'post'),
+    (PostComment, Post, 'comments_count', 'post'),
+    (PollVote, PollOption, 'votes_count', 'poll_option'),
+]
+
+
+def count_subquery(model, fk_name):
+    """Correlated COUNT(*) of `model` rows pointing at the outer row through `fk_name`."""
+    counts = (
+        model.objects.filter(**{fk_name: OuterRef('pk')})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def adjust_counter(model, pk, field, delta):
+    """Atomically add `delta` to a counter column, never going below zero."""
+    model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def reconcile_counters():
+    """Fix every counter that disagrees with its source table; returns {field: rows_fixed}."""
+    fixed = {}
+    for counted_model, counter_model, field, fk_name in COUNTERS:
+        actual = count_subquery(counted_model, fk_name)
+        drifted = counter_model.objects.annotate(actual_count=actual).exclude(**{field: F('actual_count')})
+        drifted_ids = list(drifted.values_list('pk', flat=True))
+        if drifted_ids:
+            counter_model.objects.filter(pk__in=drifted_ids).update(**{field: actual})
+        fixed[f'{counter_model._meta.model_name}.{field}'] = len(drifted_ids)
+    return fixed
@@ -0,0 +1,210 @@
+"""
+Direct-to-S3 uploads for post media.
+
+Instead of streaming media through Django (and re-uploading it to S3 from the
+worker), clients ask for a presigned upload, PUT the bytes straight to S3 and
+then finalize the post with the returned upload tokens:
+
+1. POST /api/posts/uploads/ -> presigned PUT URL, or presigned part URLs for
+   multipart uploads of large videos, plus a signed upload_token.
+2. The client uploads to S3 (for multipart, keeping each part's ETag).
+3. POST /api/posts/uploads/finalize/ with the tokens (and part ETags) -> the
+   server completes multipart uploads, checks the objects exist and creates
+   the Post and its PostMedia rows.
+
+Upload tokens are signed with the project SECRET_KEY, bound to the requesting
+user and expire with the presigned URLs, so no pending-upload table is needed.
+A token is single-use: finalizing claims its object name with a
+DirectUploadClaim row (unique on the name) before anything else, so a second
+or concurrent finalize with the same token is rejected by the database.
+Claims older than the token lifetime are purged as new ones are made.
+"""
+import posixpath
+import uuid
+from datetime import timedelta
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import DirectUploadClaim, PostMedia
+
+TOKEN_SALT = 'posts.direct_upload'
+VIDEO_EXTENSIONS = {'mp4', 'mov', 'avi', 'mkv', 'webm'}
+# S3 multipart limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+# Post types restricted to one kind of media; the others accept both
+POST_MEDIA_TYPES = {
+    'photo': {'image'},
+    'video': {'video'},
+}
+
+
+class DirectUploadError(Exception):
+    """Invalid upload request or token; the message is safe to show to clients."""
+
+
+def url_expiry():
+    return getattr(settings, 'DIRECT_UPLOAD_URL_EXPIRE', 3600)
+
+
+def max_upload_size():
+    return getattr(settings, 'DIRECT_UPLOAD_MAX_BYTES', 500 * 1024 * 1024)
+
+
+def get_media_storage():
+    return PostMedia._meta.get_field('media_file').storage
+
+
+def _s3_client(storage):
+    return storage.connection.meta.client
+
+
+def _object_key(storage, name):
+    location = getattr(storage, 'location', '') or ''
+    return posixpath.join(location, name) if location else name
+
+
+def media_type_for(filename, content_type=''):
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in VIDEO_EXTENSIONS or (content_type or '').startswith('video/'):
+        return 'video'
+    return 'image'
+
+
+def build_name(filename):
+    """Storage name for a new upload, in the same folder as PostMedia.media_file."""
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    upload_to = PostMedia._meta.get_field('media_file').upload_to
+    unique = uuid.uuid4().hex
+    return posixpath.join(upload_to, f'{unique}.{extension}' if extension else unique)
+
+
+def presign_upload(user, filename, content_type, size=None, parts=None):
+    """
+    Start a direct upload. Single PUT by default; `parts` > 1 starts a multipart
+    upload and returns one presigned URL per part.
+    """
+    if not (content_type or '').startswith(('image/', 'video/')):
+        raise DirectUploadError('Only image and video uploads are allowed.')
+    if size is not None and size > max_upload_size():
+        raise DirectUploadError('File is too large.')
+    if parts is not None and not 1 <= parts <= MAX_PARTS:
+        raise DirectUploadError(f'parts must be between 1 and {MAX_PARTS}.')
+
+    storage = get_media_storage()
+    client = _s3_client(storage)
+    name = build_name(filename)
+    key = _object_key(storage, name)
+    expires_in = url_expiry()
+    payload = {
+        'user': user.pk,
+        'name': name,
+        'media_type': media_type_for(filename, content_type),
+        'content_type': content_type,
+    }
+    response = {}
+
+    if parts and parts > 1:
+        upload = client.create_multipart_upload(Bucket=storage.bucket_name, Key=key, ContentType=content_type)
+        payload['upload_id'] = upload['UploadId']
+        response['parts'] = [
+            {
+                'part_number': number,
+                'url': client.generate_presigned_url(
+                    'upload_part',
+                    Params={
+                        'Bucket': storage.bucket_name,
+                        'Key': key,
+                        'UploadId': upload['UploadId'],
+                        'PartNumber': number,
+                    },
+                    ExpiresIn=expires_in,
+                ),
+            }
+            for number in range(1, parts + 1)
+        ]
+        response['min_part_size'] = MIN_PART_SIZE
+    else:
+        response['url'] = client.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': storage.bucket_name, 'Key': key, 'ContentType': content_type},
+            ExpiresIn=expires_in,
+        )
+        response['method'] = 'PUT'
+        response['headers'] = {'Content-Type': content_type}
+
+    response['upload_token'] = signing.dumps(payload, salt=TOKEN_SALT)
+    response['expires_in'] = expires_in
+    return response
+
+
+def read_upload_token(token, user):
+    try:
+        payload = signing.loads(token, salt=TOKEN_SALT, max_age=url_expiry() * 2)
+    except signing.BadSignature:
+        raise DirectUploadError('Invalid or expired upload token.')
+    if payload.get('user') != user.pk:
+        raise DirectUploadError('Invalid or expired upload token.')
+    return payload
+
+
+def check_upload(payload, post_type):
+    """Reject uploads of the wrong media type for `post_type`."""
+    allowed = POST_MEDIA_TYPES.get(post_type)
+    if allowed is not None and payload.get('media_type') not in allowed:
+        raise DirectUploadError(f'{post_type} posts only accept {" or ".join(sorted(allowed))} uploads.')
+
+
+def claim_uploads(names):
+    """Mark upload object names as used; raises DirectUploadError if any of them already is."""
+    DirectUploadClaim.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=url_expiry() * 2)).delete()
+    try:
+        with transaction.atomic():
+            DirectUploadClaim.objects.bulk_create([DirectUploadClaim(name=name) for name in names])
+    except IntegrityError:
+        raise DirectUploadError('Upload token has already been used.')
+
+
+def release_uploads(names):
+    """Undo claim_uploads() when the finalize fails, so the client can retry with the same tokens."""
+    DirectUploadClaim.objects.filter(name__in=names).delete()
+
+
+def complete_upload(payload, parts=None):
+    """
+    Complete a multipart upload (parts: [{'part_number', 'etag'}]) and check the
+    object landed in the bucket. Returns the storage name for PostMedia.media_file.
+    """
+    storage = get_media_storage()
+    client = _s3_client(storage)
+    key = _object_key(storage, payload['name'])
+
+    if payload.get('upload_id'):
+        if not parts:
+            raise DirectUploadError('parts are required to complete a multipart upload.')
+        try:
+            ordered = sorted(parts, key=lambda part: int(part['part_number']))
+            multipart = {
+                'Parts': [{'PartNumber': int(part['part_number']), 'ETag': part['etag']} for part in ordered]
+            }
+        except (KeyError, TypeError, ValueError):
+            raise DirectUploadError('Each part needs part_number and etag.')
+        try:
+            client.complete_multipart_upload(
+                Bucket=storage.bucket_name, Key=key, UploadId=payload['upload_id'], MultipartUpload=multipart
+            )
+        except ClientError as exc:
+            raise DirectUploadError(f'Could not complete upload: {exc}')
+
+    try:
+        head = client.head_object(Bucket=storage.bucket_name, Key=key)
+    except ClientError:
+        raise DirectUploadError('Uploaded file not found.')
+    if head.get('ContentLength', 0) > max_upload_size():
+        client.delete_object(Bucket=storage.bucket_name, Key=key)
+        raise DirectUploadError('File is too large.')
+    return payload['name']
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.stories import expire_stories
+
+
+class Command(BaseCommand):
+    help = 'Take expired stories (video posts) out of the feed and delete their media'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Posts expired per transaction'
+        )
+        parser.add_argument(
+            '--keep-media',
+            action='store_true',
+            help='Only flag posts as expired, keep their media files'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            help='Keep running, sweeping every INTERVAL seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            expired, files = expire_stories(
+                batch_size=options['batch_size'],
+                delete_media=not options['keep_media'],
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Expired {expired} stories, deleted {files} media files')
+            )
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.timeline import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the fan-out feed timelines from the newest posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--timeline',
+            type=str,
+            help="Only rebuild one timeline (e.g. 'all' or 'category:belleza')"
+        )
+
+    def handle(self, *args, **options):
+        written = rebuild(options['timeline'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt timelines ({written} entries)')
+        )
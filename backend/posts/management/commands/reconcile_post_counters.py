@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like/comment/vote counters that drifted from their source tables'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters()
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: {rows} rows fixed')
+        self.stdout.write(
+            self.style.SUCCESS(f'Reconciled post counters ({sum(fixed.values())} rows fixed)')
+        )
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:09
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def _count(model, fk_name):
+    counts = (
+        model.objects.filter(**{fk_name: OuterRef('pk')})
+        .order_by()
+        .values(fk_name)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostLike = apps.get_model('posts', 'PostLike')
+    PostComment = apps.get_model('posts', 'PostComment')
+    PollOption = apps.get_model('posts', 'PollOption')
+    PollVote = apps.get_model('posts', 'PollVote')
+    Post.objects.update(
+        likes_count=_count(PostLike, 'post'),
+        comments_count=_count(PostComment, 'post'),
+    )
+    PollOption.objects.update(votes_count=_count(PollVote, 'poll_option'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_add_linked_group_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='polloption',
+            name='votes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
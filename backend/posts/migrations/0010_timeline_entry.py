@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from services.category_rules import category_tokens
+
+TIMELINE_LENGTH = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Seed the global and per-category timelines with the newest posts."""
+    Post = apps.get_model('posts', 'Post')
+    PublicProfile = apps.get_model('users', 'PublicProfile')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+
+    categories_by_user = {
+        user_id: sorted(category_tokens(category))
+        for user_id, category in PublicProfile.objects.values_list('user_id', 'category')
+    }
+    written = {}
+    batch = []
+    for post_id, author_id, created_at in (
+        Post.objects.order_by('-created_at', '-id').values_list('id', 'author_id', 'created_at').iterator()
+    ):
+        names = ['all'] + [f'category:{token}'[:120] for token in categories_by_user.get(author_id, [])]
+        for name in names:
+            if written.get(name, 0) >= TIMELINE_LENGTH:
+                continue
+            written[name] = written.get(name, 0) + 1
+            batch.append(TimelineEntry(timeline=name, post_id=post_id, created_at=created_at))
+        if len(batch) >= 500:
+            TimelineEntry.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_denormalized_counters'),
+        ('users', '0031_publicprofile_effective_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timeline', models.CharField(max_length=120)),
+                ('created_at', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timeline', '-created_at', '-post'], name='posts_timel_timelin_476259_idx')],
+                'unique_together': {('timeline', 'post')},
+            },
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('posts', '0010_timeline_entry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_live',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_live', True)), fields=['-created_at', '-id'], name='posts_live_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_live', True), ('post_type', 'video')), fields=['expires_at'], name='posts_live_story_expiry_idx'),
+        ),
+    ]
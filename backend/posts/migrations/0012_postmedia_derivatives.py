@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_is_live'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postmedia',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_vote_posts(apps, schema_editor):
+    """Copy each vote's post from its option and keep only the newest vote per user per poll."""
+    PollVote = apps.get_model('posts', 'PollVote')
+    PollOption = apps.get_model('posts', 'PollOption')
+
+    post_by_option = dict(PollOption.objects.values_list('id', 'post_id'))
+    seen = set()
+    duplicates = []
+    for vote_id, option_id, user_id in (
+        PollVote.objects.order_by('-created_at', '-id').values_list('id', 'poll_option_id', 'user_id').iterator()
+    ):
+        key = (post_by_option[option_id], user_id)
+        if key in seen:
+            duplicates.append(vote_id)
+        seen.add(key)
+    for start in range(0, len(duplicates), 500):
+        PollVote.objects.filter(id__in=duplicates[start:start + 500]).delete()
+
+    for option_id, post_id in post_by_option.items():
+        PollVote.objects.filter(poll_option_id=option_id).update(post_id=post_id)
+
+    # Deleted duplicates were counted; recount the affected options
+    for option in PollOption.objects.all().iterator():
+        votes = PollVote.objects.filter(poll_option_id=option.id).count()
+        if votes != option.votes_count:
+            PollOption.objects.filter(id=option.id).update(votes_count=votes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_postmedia_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pollvote',
+            name='post',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='poll_votes', to='posts.post'),
+        ),
+        migrations.RunPython(backfill_vote_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0013: on PostgreSQL the backfill leaves deferred FK trigger
+    # events that block ALTER TABLE until its transaction commits.
+
+    dependencies = [
+        ('posts', '0013_pollvote_post'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pollvote',
+            name='post',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='poll_votes', to='posts.post'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='pollvote',
+            unique_together={('post', 'user')},
+        ),
+    ]
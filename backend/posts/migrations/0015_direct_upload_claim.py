@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 04:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_pollvote_post_not_null'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectUploadClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
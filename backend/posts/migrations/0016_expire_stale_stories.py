@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.utils import timezone
+
+from posts.stories import delete_media_files
+
+BATCH_SIZE = 500
+
+
+def expire_stale_stories(apps, schema_editor):
+    """Expire the stories that were already past expires_at when is_live was introduced (all defaulted to live)."""
+    Post = apps.get_model('posts', 'Post')
+    PostMedia = apps.get_model('posts', 'PostMedia')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+
+    now = timezone.now()
+    while True:
+        post_ids = list(
+            Post.objects.filter(is_live=True, post_type='video', expires_at__lte=now)
+            .order_by('expires_at').values_list('id', flat=True)[:BATCH_SIZE]
+        )
+        if not post_ids:
+            break
+        Post.objects.filter(id__in=post_ids).update(is_live=False)
+        TimelineEntry.objects.filter(post_id__in=post_ids).delete()
+        media_items = list(PostMedia.objects.filter(post_id__in=post_ids))
+        PostMedia.objects.filter(id__in=[media.id for media in media_items]).delete()
+        delete_media_files(media_items)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_direct_upload_claim'),
+    ]
+
+    operations = [
+        migrations.RunPython(expire_stale_stories, migrations.RunPython.noop),
+    ]
@@ -35,6 +35,8 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     expires_at = models.DateTimeField(null=True, blank=True)
+    # False once a story (video post) has expired and been swept (see posts.stories)
+    is_live = models.BooleanField(default=True)
 
     # Generic foreign key for flexible content association
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
@@ -54,8 +56,20 @@ class Post(models.Model):
     linked_service_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     linked_service_duration_minutes = models.PositiveIntegerField(null=True, blank=True)
 
+    # Denormalized counters, updated atomically with F() (see posts.counters)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'], condition=models.Q(is_live=True), name='posts_live_created_idx'
+            ),
+            models.Index(
+                fields=['expires_at'], condition=models.Q(is_live=True, post_type='video'), name='posts_live_story_expiry_idx'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.author.username} - {self.post_type} - {self.created_at}"
@@ -64,6 +78,8 @@ class PostMedia(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='media')
     media_type = models.CharField(max_length=10, choices=[('image', 'Image'), ('video', 'Video')])
     media_file = models.FileField(upload_to='posts/media/', storage=MediaStorage())
+    # Resized WebP copies of image media (see users.image_derivatives)
+    derivatives = models.JSONField(default=dict, blank=True, editable=False)
     caption = models.TextField(blank=True, null=True)
     order = models.PositiveIntegerField(default=0)
 
@@ -92,14 +108,47 @@ class PollOption(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='poll_options')
     text = models.CharField(max_length=200)
     order = models.PositiveIntegerField(default=0)
+    votes_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['order']
 
 class PollVote(models.Model):
+    # Denormalized from poll_option so one vote per user per poll is a constraint
+    # and changing a vote is a single UPDATE (see posts.polls.cast_vote)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='poll_votes')
     poll_option = models.ForeignKey(PollOption, on_delete=models.CASCADE, related_name='votes')
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ['poll_option', 'user']
\ No newline at end of file
+        unique_together = ['post', 'user']
+
+    def save(self, *args, **kwargs):
+        if self.post_id is None and self.poll_option_id is not None:
+            self.post_id = self.poll_option.post_id
+        super().save(*args, **kwargs)
+
+class TimelineEntry(models.Model):
+    """
+    Fan-out-on-write feed store: one row per (timeline, post), pushed when a post
+    is created and trimmed to POST_TIMELINE_LENGTH entries per timeline (see posts.timeline).
+    """
+    timeline = models.CharField(max_length=120)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['timeline', 'post']
+        indexes = [
+            models.Index(fields=['timeline', '-created_at', '-post']),
+        ]
+
+
+class DirectUploadClaim(models.Model):
+    """
+    A direct-upload object that has been finalized (see posts.direct_uploads).
+    The unique name makes each upload token single-use, even under concurrent finalizes.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination on (created_at, id) for posts and comments.
+
+OFFSET paging gets slower the deeper a user scrolls and shifts pages as new
+posts arrive. These paginators seek from the last item seen instead:
+
+- ``?cursor=<token>`` returns the page after that item (``next`` carries the token).
+- ``?since=<token>`` returns items newer than that item, for "new posts available"
+  polling. ``gap`` is true when there are more new items than fit in one page.
+- Every response includes ``since``: the token of the newest item, to poll with.
+
+Requests that still send ``?page=N`` get the legacy page-number response.
+Sources can be querysets or objects exposing ``keyset(older_than=, newer_than=)``
+(see posts.timeline.TimelinePage).
+"""
+import base64
+import binascii
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(key):
+    created_at, pk = key
+    raw = f'{created_at.isoformat()}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+        created_at, pk = raw.rsplit('|', 1)
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (TypeError, ValueError, UnicodeError, binascii.Error):
+        raise NotFound('Invalid cursor')
+    if created_at is None:
+        raise NotFound('Invalid cursor')
+    return created_at, pk
+
+
+def item_key(item):
+    """(created_at, id) of a model instance or a (created_at, id) pair."""
+    if isinstance(item, tuple):
+        return item
+    return item.created_at, item.pk
+
+
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    since_query_param = 'since'
+    legacy_query_param = 'page'
+    # Newest first; set to False for oldest-first lists such as comments
+    descending = True
+
+    def __init__(self):
+        self.legacy = None
+
+    def _bounded(self, source, older_than=None, newer_than=None):
+        if not isinstance(source, QuerySet):
+            return source.keyset(older_than=older_than, newer_than=newer_than)
+        if older_than is not None:
+            created_at, pk = older_than
+            source = source.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+        if newer_than is not None:
+            created_at, pk = newer_than
+            source = source.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        if self.descending:
+            return source.order_by('-created_at', '-pk')
+        return source.order_by('created_at', 'pk')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.legacy_query_param in request.query_params:
+            self.legacy = PageNumberPagination()
+            return self.legacy.paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        since = request.query_params.get(self.since_query_param)
+        self.since_key = decode_cursor(since) if since else None
+        cursor_key = decode_cursor(cursor) if cursor else None
+
+        if self.since_key is not None:
+            source = self._bounded(queryset, newer_than=self.since_key)
+        elif self.descending:
+            source = self._bounded(queryset, older_than=cursor_key)
+        else:
+            source = self._bounded(queryset, newer_than=cursor_key)
+
+        rows = list(source[:self.page_size + 1])
+        self.has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def _newest_key(self):
+        if not self.page:
+            return self.since_key
+        newest = self.page[0] if self.descending else self.page[-1]
+        return item_key(newest)
+
+    def get_next_link(self):
+        if not self.has_more or (self.since_key is not None and self.descending):
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.since_query_param)
+        return replace_query_param(url, self.cursor_query_param, encode_cursor(item_key(self.page[-1])))
+
+    def get_paginated_response(self, data):
+        if self.legacy is not None:
+            return self.legacy.get_paginated_response(data)
+        newest = self._newest_key()
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('since', encode_cursor(newest) if newest else None),
+            ('gap', self.descending and self.since_key is not None and self.has_more),
+            ('results', data),
+        ]))
+
+
+class PostKeysetPagination(KeysetPagination):
+    """Newest first, for the feed and liked posts."""
+
+
+class CommentKeysetPagination(KeysetPagination):
+    """Oldest first; ``since`` and ``cursor`` both continue after the given comment."""
+    descending = False
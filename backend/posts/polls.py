@@ -0,0 +1,79 @@
+"""
+Poll voting and results.
+
+A user has at most one PollVote per poll (unique on post + user). Voting
+creates it, or moves it to the new option with a single UPDATE, and shifts the
+PollOption.votes_count counters in the same transaction. poll_results() builds
+the per-option counts and percentages from those counters and caches them
+until the next vote, so popular polls are not recounted on every read.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from .counters import adjust_counter
+from .models import PollOption, PollVote
+
+CACHE_KEY_PREFIX = 'poll_results:'
+
+
+def _timeout():
+    return getattr(settings, 'POLL_RESULTS_CACHE_TIMEOUT', 300)
+
+
+def cache_key(post_id):
+    return f'{CACHE_KEY_PREFIX}{post_id}'
+
+
+def invalidate(post_id):
+    cache.delete(cache_key(post_id))
+
+
+def _move_vote(vote, option):
+    if vote.poll_option_id == option.pk:
+        return vote
+    previous_option_id = vote.poll_option_id
+    PollVote.objects.filter(pk=vote.pk).update(poll_option=option)
+    adjust_counter(PollOption, previous_option_id, 'votes_count', -1)
+    adjust_counter(PollOption, option.pk, 'votes_count', 1)
+    vote.poll_option = option
+    return vote
+
+
+def cast_vote(option, user):
+    """Record `user`'s vote for `option`, replacing any earlier vote in the same poll."""
+    with transaction.atomic():
+        vote = PollVote.objects.select_for_update().filter(post_id=option.post_id, user=user).first()
+        if vote is not None:
+            vote = _move_vote(vote, option)
+        else:
+            try:
+                with transaction.atomic():
+                    vote = PollVote.objects.create(post_id=option.post_id, poll_option=option, user=user)
+            except IntegrityError:
+                # A concurrent request from the same user voted first; change that vote instead
+                vote = _move_vote(
+                    PollVote.objects.select_for_update().get(post_id=option.post_id, user=user), option
+                )
+            else:
+                adjust_counter(PollOption, option.pk, 'votes_count', 1)
+        transaction.on_commit(lambda: invalidate(option.post_id))
+    return vote
+
+
+def build_results(post_id):
+    options = list(PollOption.objects.filter(post_id=post_id).order_by('order', 'id').values('id', 'text', 'votes_count'))
+    total = sum(option['votes_count'] for option in options)
+    for option in options:
+        option['percentage'] = round(option['votes_count'] * 100 / total, 1) if total else 0.0
+    return {'post_id': post_id, 'total_votes': total, 'options': options}
+
+
+def poll_results(post_id):
+    """Cached {'post_id', 'total_votes', 'options': [{id, text, votes_count, percentage}]}."""
+    key = cache_key(post_id)
+    results = cache.get(key)
+    if results is None:
+        results = build_results(post_id)
+        cache.set(key, results, timeout=_timeout())
+    return results
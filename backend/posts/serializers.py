@@ -1,5 +1,8 @@
+from django.db import models
 from rest_framework import serializers
+from users import image_derivatives
 from users.models import User
+from . import author_cards, polls
 from .models import Post, PostMedia, PostLike, PostComment, PollOption, PollVote
 
 class UserSerializer(serializers.ModelSerializer):
@@ -9,25 +12,28 @@ class UserSerializer(serializers.ModelSerializer):
 
 class PostMediaSerializer(serializers.ModelSerializer):
     media_url = serializers.SerializerMethodField()
+    media_srcset = serializers.SerializerMethodField()
     
     class Meta:
         model = PostMedia
-        fields = ['id', 'media_type', 'media_file', 'media_url', 'caption', 'order']
+        fields = ['id', 'media_type', 'media_file', 'media_url', 'media_srcset', 'caption', 'order']
     
     def get_media_url(self, obj):
         if obj.media_file:
             return obj.media_file.url
         return None
 
-class PollOptionSerializer(serializers.ModelSerializer):
-    votes_count = serializers.SerializerMethodField()
+    def get_media_srcset(self, obj):
+        """{width: url} of resized WebP copies; empty until they are built"""
+        if not obj.media_file:
+            return {}
+        return image_derivatives.srcset(obj.media_file.storage, obj.derivatives)
 
+class PollOptionSerializer(serializers.ModelSerializer):
     class Meta:
         model = PollOption
         fields = ['id', 'text', 'order', 'votes_count']
-
-    def get_votes_count(self, obj):
-        return obj.votes.count()
+        read_only_fields = ['votes_count']
 
 class PostCommentSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
@@ -51,11 +57,41 @@ class PostLikeSerializer(serializers.ModelSerializer):
         model = PostLike
         fields = ['id', 'user', 'created_at']
 
+GROUP_SESSIONS_CONTEXT_KEY = 'group_sessions'
+AUTHOR_CARDS_CONTEXT_KEY = 'author_cards'
+
+
+def load_group_sessions(session_ids):
+    """Fetch GroupSessions by id in one query; ids that don't exist map to None."""
+    from reservations.models import GroupSession
+
+    session_ids = set(session_ids)
+    sessions = dict.fromkeys(session_ids)
+    if session_ids:
+        queryset = GroupSession.objects.select_related('service', 'provider_content_type').filter(id__in=session_ids)
+        sessions.update((gs.id, gs) for gs in queryset)
+    return sessions
+
+
+class PostListSerializer(serializers.ListSerializer):
+    """
+    Bulk-loads the GroupSessions linked from a page of posts and the authors'
+    cards into the serializer context.
+    """
+
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        sessions = self.context.setdefault(GROUP_SESSIONS_CONTEXT_KEY, {})
+        missing = {post.linked_group_session_id for post in posts if post.linked_group_session_id} - sessions.keys()
+        sessions.update(load_group_sessions(missing))
+        cards = self.context.setdefault(AUTHOR_CARDS_CONTEXT_KEY, {})
+        cards.update(author_cards.get_cards(post.author for post in posts if post.author_id not in cards))
+        return super().to_representation(posts)
+
+
 class PostSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     media = PostMediaSerializer(many=True, read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    comments_count = serializers.SerializerMethodField()
     user_has_liked = serializers.SerializerMethodField()
     poll_options = PollOptionSerializer(many=True, read_only=True)
     author_category = serializers.SerializerMethodField()
@@ -66,6 +102,7 @@ class PostSerializer(serializers.ModelSerializer):
     author_public_profile_id = serializers.SerializerMethodField()
     author_profile_type = serializers.SerializerMethodField()
     author_photo = serializers.SerializerMethodField()
+    author_photo_srcset = serializers.SerializerMethodField()
     linked_group_session_date = serializers.SerializerMethodField()
     linked_group_session_time = serializers.SerializerMethodField()
     linked_group_session_capacity = serializers.SerializerMethodField()
@@ -81,7 +118,7 @@ class PostSerializer(serializers.ModelSerializer):
             'media', 'likes_count', 'comments_count', 'user_has_liked', 'poll_options',
             'author_category', 'author_sub_categories', 'author_display_name',
             'author_rating', 'author_profile_id', 'author_public_profile_id', 'author_profile_type',
-            'author_photo',
+            'author_photo', 'author_photo_srcset',
             'linked_subcategory',
             'linked_service_id', 'linked_service_type', 'linked_provider_id',
             'linked_service_name', 'linked_service_price', 'linked_service_duration_minutes',
@@ -91,141 +128,64 @@ class PostSerializer(serializers.ModelSerializer):
             'linked_group_session_service_name', 'linked_group_session_provider_type',
             'linked_group_session_provider_object_id',
         ]
-        read_only_fields = ['id', 'author', 'created_at', 'updated_at']
-
-    def get_likes_count(self, obj):
-        return obj.likes.count()
-
-    def get_comments_count(self, obj):
-        return obj.comments.count()
+        read_only_fields = ['id', 'author', 'created_at', 'updated_at', 'likes_count', 'comments_count']
+        list_serializer_class = PostListSerializer
 
+    # Feed querysets annotate viewer_has_liked (see posts.views.annotate_viewer_state);
+    # fall back to a query otherwise.
     def get_user_has_liked(self, obj):
+        annotated = getattr(obj, 'viewer_has_liked', None)
+        if annotated is not None:
+            return bool(annotated)
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.likes.filter(user=request.user).exists()
         return False
 
+    def _get_author_card(self, obj):
+        cards = self.context.setdefault(AUTHOR_CARDS_CONTEXT_KEY, {})
+        if obj.author_id not in cards:
+            cards.update(author_cards.get_cards([obj.author]))
+        return cards[obj.author_id]
+
     def get_author_category(self, obj):
         """Get the author's category from their PublicProfile"""
-        try:
-            # Try to access public_profile directly
-            # If it doesn't exist, Django will raise PublicProfile.DoesNotExist
-            profile = obj.author.public_profile
-            if not profile:
-                return None
-            
-            category = profile.category
-            if category is None:
-                return None
-            
-            # Handle JSONField (list format) - return the list itself
-            # Frontend can handle both list and string formats
-            if isinstance(category, list):
-                # Return the list if it has items, otherwise return None
-                # Frontend will check if selectedMainCategory is in the list
-                return category if len(category) > 0 else None
-            
-            # Handle string format (backward compatibility)
-            # Convert single string to list for consistency
-            if isinstance(category, str):
-                return [category] if category else None
-            
-            # Fallback for any other type
-            return None
-        except Exception:
-            # Profile doesn't exist or other error
-            return None
+        return self._get_author_card(obj)['category']
 
     def get_author_sub_categories(self, obj):
         """Get the author's subcategories from their PublicProfile"""
-        try:
-            # Try to access public_profile directly
-            profile = obj.author.public_profile
-            if not profile:
-                return []
-            
-            sub_cats = profile.sub_categories
-            # Ensure it's a list and handle None
-            if sub_cats is None:
-                return []
-            if isinstance(sub_cats, list):
-                return sub_cats
-            # If it's stored as a string, try to parse it
-            if isinstance(sub_cats, str):
-                import json
-                try:
-                    return json.loads(sub_cats)
-                except:
-                    return [sub_cats] if sub_cats else []
-            return []
-        except Exception:
-            # Profile doesn't exist or other error
-            return []
-
-    def _get_public_profile(self, obj):
-        try:
-            return obj.author.public_profile
-        except Exception:
-            return None
+        return self._get_author_card(obj)['sub_categories']
 
     def get_author_display_name(self, obj):
-        profile = self._get_public_profile(obj)
-        if profile:
-            try:
-                return profile.display_name
-            except Exception:
-                return profile.name
-        return obj.author.username or obj.author.get_full_name() or obj.author.email
+        return self._get_author_card(obj)['display_name']
 
     def get_author_rating(self, obj):
-        profile = self._get_public_profile(obj)
-        if profile and profile.rating is not None:
-            return float(profile.rating)
-        return None
+        return self._get_author_card(obj)['rating']
 
     def get_author_profile_id(self, obj):
-        profile = self._get_public_profile(obj)
-        if profile:
-            return profile.id
-        return None
+        return self._get_author_card(obj)['profile_id']
     
     def get_author_public_profile_id(self, obj):
         """Alias for author_profile_id for consistency"""
         return self.get_author_profile_id(obj)
 
     def get_author_profile_type(self, obj):
-        profile = self._get_public_profile(obj)
-        if profile:
-            return profile.profile_type
-        return None
+        return self._get_author_card(obj)['profile_type']
     
     def get_author_photo(self, obj):
         """Get author's profile photo from User.image or PublicProfile"""
-        # First, try to get the main profile photo from user.image
-        try:
-            if obj.author and obj.author.image:
-                return obj.author.image.url
-        except Exception:
-            pass
-        
-        # Fallback to PublicProfile images
-        profile = self._get_public_profile(obj)
-        if profile:
-            # PublicProfile uses a JSON field for images or ProfileImage model
-            if hasattr(profile, 'images') and profile.images:
-                # If images is a list with at least one URL
-                if isinstance(profile.images, list) and len(profile.images) > 0:
-                    return profile.images[0]  # Return first image
-        return None
+        return self._get_author_card(obj)['photo']
+
+    def get_author_photo_srcset(self, obj):
+        return self._get_author_card(obj).get('photo_srcset') or {}
 
     def _get_linked_group_session(self, obj):
         if not obj.linked_group_session_id:
             return None
-        from reservations.models import GroupSession
-        try:
-            return GroupSession.objects.select_related('service').get(id=obj.linked_group_session_id)
-        except GroupSession.DoesNotExist:
-            return None
+        sessions = self.context.setdefault(GROUP_SESSIONS_CONTEXT_KEY, {})
+        if obj.linked_group_session_id not in sessions:
+            sessions.update(load_group_sessions([obj.linked_group_session_id]))
+        return sessions.get(obj.linked_group_session_id)
 
     def get_linked_group_session_date(self, obj):
         gs = self._get_linked_group_session(obj)
@@ -399,6 +359,29 @@ class PostCreateSerializer(serializers.ModelSerializer):
 
         return post
 
+class DirectUploadRequestSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(required=False, min_value=1)
+    parts = serializers.IntegerField(required=False, min_value=1)
+
+
+class DirectUploadPartSerializer(serializers.Serializer):
+    part_number = serializers.IntegerField(min_value=1)
+    etag = serializers.CharField()
+
+
+class DirectUploadItemSerializer(serializers.Serializer):
+    upload_token = serializers.CharField()
+    parts = DirectUploadPartSerializer(many=True, required=False)
+    caption = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
+class DirectUploadFinalizeSerializer(serializers.Serializer):
+    post_type = serializers.ChoiceField(choices=['photo', 'video', 'carousel', 'mosaic', 'pet_adoption'])
+    uploads = DirectUploadItemSerializer(many=True, allow_empty=False)
+
+
 class CommentCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostComment
@@ -409,15 +392,11 @@ class PollVoteSerializer(serializers.ModelSerializer):
         model = PollVote
         fields = ['poll_option']
 
-    def create(self, validated_data):
-        poll_option = validated_data['poll_option']
-        user = self.context['request'].user
-
-        # Remove any existing vote by this user on this poll
-        PollVote.objects.filter(
-            poll_option__post=poll_option.post,
-            user=user
-        ).delete()
-
-        return PollVote.objects.create(poll_option=poll_option, user=user)
+    def validate_poll_option(self, poll_option):
+        post = self.context.get('post')
+        if post is not None and poll_option.post_id != post.id:
+            raise serializers.ValidationError('Option does not belong to this poll.')
+        return poll_option
 
+    def create(self, validated_data):
+        return polls.cast_vote(validated_data['poll_option'], self.context['request'].user)
@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from services.category_rules import category_tokens
+from users import image_derivatives
+from users.ranking import get_public_profile_id_for_favorite
+
+from . import author_cards, timeline
+
+
+@receiver(post_save, sender='users.User')
+def invalidate_author_card_on_user_change(sender, instance, **kwargs):
+    author_cards.invalidate(instance.pk)
+
+
+@receiver(post_save, sender='users.PublicProfile')
+@receiver(post_delete, sender='users.PublicProfile')
+def invalidate_author_card_on_profile_change(sender, instance, **kwargs):
+    author_cards.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender='users.PublicProfile')
+def move_author_timeline_entries(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the author's posts in the category timelines of their current categories"""
+    if update_fields is not None and 'category' not in update_fields:
+        return
+    previous = [] if created else instance.loaded_category()
+    if previous is None:
+        # Saved without being loaded: compare with where the author's posts are now
+        previous_timelines = timeline.author_category_timelines(instance.user_id)
+    elif category_tokens(previous) == category_tokens(instance.category):
+        return
+    else:
+        previous_timelines = timeline.timelines_for_categories(previous)
+    timeline.sync_author(instance.user_id, instance, previous_timelines)
+
+
+@receiver(post_delete, sender='users.PublicProfile')
+def drop_author_category_timeline_entries(sender, instance, **kwargs):
+    timeline.sync_author(instance.user_id, None, timeline.author_category_timelines(instance.user_id))
+
+
+# Connected after users.signals (INSTALLED_APPS order), so favorites_count is already updated.
+# Only losing a favorite can take an author from pull back to push.
+@receiver(post_delete, sender='favorites.Favorite')
+def backfill_author_no_longer_pulled(sender, instance, **kwargs):
+    if timeline.pull_threshold() is not None:
+        timeline.favorites_changed(get_public_profile_id_for_favorite(instance), -1)
+
+
+@receiver(post_save, sender='posts.Post')
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Push new posts into the feed timelines"""
+    if created:
+        timeline.push(instance)
+
+
+@receiver(post_save, sender='posts.PostMedia')
+def build_post_media_derivatives(sender, instance, update_fields=None, **kwargs):
+    """Render feed-sized WebP copies of new image media"""
+    if instance.media_type != 'image' or not instance.media_file:
+        return
+    if not image_derivatives.is_current(instance.derivatives, instance.media_file.name):
+        image_derivatives.submit(image_derivatives.build_post_media_derivatives, instance.pk)
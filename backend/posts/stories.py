@@ -0,0 +1,63 @@
+"""
+Story (video post) expiry.
+
+Video posts expire 24h after creation. Instead of excluding expired stories
+with an OR filter on every feed read, expire_stories() periodically flips
+is_live off for them, removes them from the feed timelines and deletes their
+media files from storage. Feed queries then filter on is_live=True, which is
+served by a partial index.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Post, PostMedia, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+
+def expired_stories(now=None):
+    return Post.objects.filter(is_live=True, post_type='video', expires_at__lte=now or timezone.now())
+
+
+def delete_media_files(media_items):
+    """Delete the stored files of PostMedia rows; failures are logged and skipped."""
+    deleted = 0
+    for media in media_items:
+        if not media.media_file:
+            continue
+        try:
+            media.media_file.delete(save=False)
+            deleted += 1
+        except Exception as exc:
+            logger.warning('Could not delete story media %s: %s', media.media_file.name, exc)
+    return deleted
+
+
+def expire_stories(now=None, batch_size=500, delete_media=True):
+    """
+    Take expired stories out of the live set in batches.
+    Returns (posts_expired, media_files_deleted).
+    """
+    now = now or timezone.now()
+    expired_total = 0
+    files_total = 0
+    while True:
+        with transaction.atomic():
+            post_ids = list(
+                expired_stories(now).order_by('expires_at').values_list('id', flat=True)[:batch_size]
+            )
+            if not post_ids:
+                break
+            Post.objects.filter(id__in=post_ids).update(is_live=False)
+            TimelineEntry.objects.filter(post_id__in=post_ids).delete()
+            media_items = list(PostMedia.objects.filter(post_id__in=post_ids)) if delete_media else []
+            if media_items:
+                PostMedia.objects.filter(id__in=[media.id for media in media_items]).delete()
+        # Storage deletes happen outside the transaction; rows are already gone either way
+        files_total += delete_media_files(media_items)
+        expired_total += len(post_ids)
+        if len(post_ids) < batch_size:
+            break
+    return expired_total, files_total
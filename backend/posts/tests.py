@@ -1,3 +1,522 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from unittest import skipIf
+from unittest.mock import patch
 
-# Create your tests here.
+import boto3
+import requests
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+try:
+    from moto import mock_aws
+except ImportError:  # moto is only needed for the direct upload tests
+    mock_aws = None
+
+from users.models import ProfileRankingFeatures, PublicProfile, User
+
+from . import author_cards, direct_uploads, timeline
+from .counters import reconcile_counters
+from .models import DirectUploadClaim, PollOption, PollVote, Post, PostComment, PostLike, PostMedia, TimelineEntry
+from .pagination import CommentKeysetPagination, PostKeysetPagination
+from .stories import expire_stories
+
+
+class PostFeedQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        UserModel = get_user_model()
+        self.author = UserModel.objects.create_user(email='author@example.com', username='author', password='pass')
+        self.viewer = UserModel.objects.create_user(email='viewer@example.com', username='viewer', password='pass')
+
+    def _create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(author=self.author, post_type='tips', content=f'tip {i}')
+            PostLike.objects.create(post=post, user=self.author)
+            PostComment.objects.create(post=post, author=self.viewer, content='nice')
+
+    def _list_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/list/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_like_and_comment_endpoints_update_counters(self):
+        post = Post.objects.create(author=self.author, post_type='tips', content='tip')
+        self.client.force_login(self.viewer)
+        self.client.post(f'/api/posts/list/{post.id}/like/')
+        self.client.post(f'/api/posts/list/{post.id}/add_comment/', {'content': 'hola'})
+        comment_id = self.client.post(f'/api/posts/list/{post.id}/add_comment/', {'content': 'otro'}).json()['id']
+        self.client.delete(f'/api/posts/list/{post.id}/delete_comment/?comment_id={comment_id}')
+
+        item = self.client.get('/api/posts/list/').json()['results'][0]
+        self.assertEqual(item['likes_count'], 1)
+        self.assertEqual(item['comments_count'], 1)
+        self.assertTrue(item['user_has_liked'])
+
+        self.client.post(f'/api/posts/list/{post.id}/like/')
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, 0)
+
+    def test_concurrent_unlike_and_comment_delete_decrement_once(self):
+        post = Post.objects.create(author=self.author, post_type='tips', content='tip')
+        like = PostLike.objects.create(post=post, user=self.viewer)
+        comment = PostComment.objects.create(post=post, author=self.viewer, content='hola')
+        Post.objects.filter(pk=post.pk).update(likes_count=1, comments_count=1)
+        self.client.force_login(self.viewer)
+
+        # Another request already deleted the like this one loaded
+        like.delete()
+        with patch.object(PostLike.objects, 'get_or_create', return_value=(like, False)):
+            self.client.post(f'/api/posts/list/{post.id}/like/')
+        stale = PostComment.objects.get(pk=comment.pk)
+        comment.delete()
+        with patch.object(PostComment.objects, 'get', return_value=stale):
+            self.client.delete(f'/api/posts/list/{post.id}/delete_comment/?comment_id={comment.id}')
+
+        post.refresh_from_db()
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+
+    def test_poll_vote_moves_counter_between_options(self):
+        post = Post.objects.create(author=self.author, post_type='poll', content='?')
+        first = PollOption.objects.create(post=post, text='A', order=0)
+        second = PollOption.objects.create(post=post, text='B', order=1)
+        self.client.force_login(self.viewer)
+        self.client.post(f'/api/posts/{post.id}/vote/', {'poll_option': first.id})
+        self.client.post(f'/api/posts/{post.id}/vote/', {'poll_option': second.id})
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.votes_count, second.votes_count), (0, 1))
+        self.assertEqual(PollVote.objects.filter(post=post, user=self.viewer).count(), 1)
+
+    def test_poll_results_use_counters_and_refresh_after_votes(self):
+        post = Post.objects.create(author=self.author, post_type='poll', content='?')
+        first = PollOption.objects.create(post=post, text='A', order=0)
+        second = PollOption.objects.create(post=post, text='B', order=1)
+        other = Post.objects.create(author=self.author, post_type='poll', content='other')
+        foreign = PollOption.objects.create(post=other, text='X', order=0)
+        self.client.force_login(self.author)
+        self.client.post(f'/api/posts/{post.id}/vote/', {'poll_option': first.id})
+        self.client.force_login(self.viewer)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{post.id}/vote/', {'poll_option': second.id})
+
+        with self.assertNumQueries(5):  # session, user, poll exists, viewer vote, options
+            results = self.client.get(f'/api/posts/{post.id}/poll-results/').json()
+        self.assertEqual(results['total_votes'], 2)
+        self.assertEqual([o['percentage'] for o in results['options']], [50.0, 50.0])
+        self.assertEqual(results['user_vote'], second.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/{post.id}/vote/', {'poll_option': first.id})
+        results = self.client.get(f'/api/posts/{post.id}/poll-results/').json()
+        self.assertEqual([o['votes_count'] for o in results['options']], [2, 0])
+        self.assertEqual(results['user_vote'], first.id)
+
+        response = self.client.post(f'/api/posts/{post.id}/vote/', {'poll_option': foreign.id})
+        self.assertEqual(response.status_code, 400)
+
+    def test_reconcile_repairs_drift(self):
+        self._create_posts(2)
+        self.assertEqual(reconcile_counters(), {'post.likes_count': 2, 'post.comments_count': 2, 'polloption.votes_count': 0})
+        self.assertEqual(set(Post.objects.values_list('likes_count', 'comments_count')), {(1, 1)})
+        self.assertEqual(sum(reconcile_counters().values()), 0)
+
+    def test_feed_query_count_is_constant(self):
+        self.client.force_login(self.viewer)
+        self._create_posts(2)
+        _, small_page = self._list_query_count()
+        self._create_posts(5)
+        response, large_page = self._list_query_count()
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertEqual(small_page, large_page)
+
+    def test_linked_group_sessions_are_batch_loaded(self):
+        from datetime import date, time, timedelta
+        from django.contrib.contenttypes.models import ContentType
+        from reservations.models import GroupSession
+        from services.models import ServicesCategory, ServicesType
+        from users.models import PlaceProfile
+
+        service = ServicesType.objects.create(
+            category=ServicesCategory.objects.create(name='Yoga'), name='Vinyasa'
+        )
+        place = PlaceProfile.objects.create(user=self.author, name='Studio', street='Main', postal_code='00000', owner=self.author)
+
+        def link_session(count):
+            for _ in range(count):
+                session = GroupSession.objects.create(
+                    provider_content_type=ContentType.objects.get_for_model(PlaceProfile),
+                    provider_object_id=place.id,
+                    service=service,
+                    date=date(2030, 1, 1),
+                    time=time(9, 0),
+                    duration=timedelta(hours=1),
+                    capacity=10,
+                )
+                Post.objects.create(author=self.author, post_type='tips', linked_group_session_id=session.id)
+
+        self.client.force_login(self.viewer)
+        link_session(1)
+        _, small_page = self._list_query_count()
+        link_session(4)
+        response, large_page = self._list_query_count()
+        item = response.json()['results'][0]
+        self.assertEqual(item['linked_group_session_service_name'], 'Vinyasa')
+        self.assertEqual(item['linked_group_session_provider_type'], 'place')
+        self.assertEqual(item['linked_group_session_time'], '09:00')
+        self.assertEqual(small_page, large_page)
+
+
+class AuthorCardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user(
+            email='studio@example.com', username='studio', password='pass', role=User.Role.PLACE,
+        )
+        self.profile = PublicProfile.objects.create(
+            user=self.author, profile_type='PLACE', name='Studio', category=['belleza'],
+            sub_categories=['uñas'], rating=Decimal('4.50'),
+        )
+        for i in range(3):
+            Post.objects.create(author=self.author, post_type='tips', content=f'tip {i}')
+
+    def test_posts_share_cached_author_card(self):
+        results = self.client.get('/api/posts/list/').json()['results']
+        self.assertEqual({item['author_display_name'] for item in results}, {'Studio'})
+        self.assertEqual(results[0]['author_category'], ['belleza'])
+        self.assertEqual(results[0]['author_sub_categories'], ['uñas'])
+        self.assertEqual(results[0]['author_rating'], 4.5)
+        self.assertEqual(results[0]['author_profile_id'], self.profile.id)
+        self.assertEqual(cache.get(author_cards.cache_key(self.author.id))['profile_type'], 'PLACE')
+
+    def test_profile_save_invalidates_card(self):
+        self.client.get('/api/posts/list/')
+        self.profile.name = 'Renamed'
+        self.profile.save()
+        self.assertIsNone(cache.get(author_cards.cache_key(self.author.id)))
+        results = self.client.get('/api/posts/list/').json()['results']
+        self.assertEqual(results[0]['author_display_name'], 'Renamed')
+
+
+class PostTimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        UserModel = get_user_model()
+        self.studio = UserModel.objects.create_user(
+            email='studio@example.com', username='studio', password='pass', role=User.Role.PLACE,
+        )
+        self.studio_profile = PublicProfile.objects.create(
+            user=self.studio, profile_type='PLACE', name='Studio', category=['Belleza'],
+        )
+        self.other = UserModel.objects.create_user(email='other@example.com', username='other', password='pass')
+
+    def _ids(self, response):
+        return [item['id'] for item in response.json()['results']]
+
+    def test_new_posts_are_fanned_out_by_category(self):
+        beauty = Post.objects.create(author=self.studio, post_type='tips', content='a')
+        general = Post.objects.create(author=self.other, post_type='tips', content='b')
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list('timeline', 'post_id')),
+            {('all', beauty.id), ('category:belleza', beauty.id), ('all', general.id)},
+        )
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/')), [general.id, beauty.id])
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/', {'category': 'belleza'})), [beauty.id])
+
+    @override_settings(POST_TIMELINE_LENGTH=2)
+    def test_timelines_are_trimmed(self):
+        posts = [Post.objects.create(author=self.other, post_type='tips', content=str(i)) for i in range(4)]
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(timeline='all').order_by('-created_at', '-post_id').values_list('post_id', flat=True)),
+            [posts[3].id, posts[2].id],
+        )
+
+    @override_settings(POST_TIMELINE_PULL_THRESHOLD=1)
+    def test_popular_authors_are_pulled_at_read_time(self):
+        ProfileRankingFeatures.objects.filter(profile=self.studio_profile).update(favorites_count=5)
+        older = Post.objects.create(author=self.other, post_type='tips', content='old')
+        popular = Post.objects.create(author=self.studio, post_type='tips', content='new')
+        self.assertFalse(TimelineEntry.objects.filter(post=popular).exists())
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/')), [popular.id, older.id])
+        self.assertEqual(self.client.get('/api/posts/list/', {'page': 1}).json()['count'], 2)
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/', {'category': 'belleza'})), [popular.id])
+
+    @override_settings(POST_TIMELINE_LENGTH=2)
+    def test_feed_continues_past_the_trimmed_tail(self):
+        posts = [Post.objects.create(author=self.other, post_type='tips', content=str(i)) for i in range(5)]
+        newest_first = [post.id for post in reversed(posts)]
+        seen = []
+        with patch.object(PostKeysetPagination, 'page_size', 2):
+            response = self.client.get('/api/posts/list/')
+            seen.extend(self._ids(response))
+            while response.json()['next']:
+                response = self.client.get(response.json()['next'])
+                seen.extend(self._ids(response))
+        self.assertEqual(seen, newest_first)
+        legacy = self.client.get('/api/posts/list/', {'page': 1}).json()
+        self.assertEqual(legacy['count'], 5)
+
+    def test_category_change_moves_author_entries(self):
+        post = Post.objects.create(author=self.studio, post_type='tips', content='a')
+        self.studio_profile.category = ['Bienestar']
+        self.studio_profile.save()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post=post).values_list('timeline', flat=True)),
+            {'all', 'category:bienestar'},
+        )
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/', {'category': 'bienestar'})), [post.id])
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/', {'category': 'belleza'})), [])
+
+    def test_profile_save_without_category_change_leaves_timelines_alone(self):
+        Post.objects.create(author=self.studio, post_type='tips', content='a')
+        TimelineEntry.objects.all().delete()
+        profile = PublicProfile.objects.get(pk=self.studio_profile.pk)
+        profile.description = 'New description'
+        with CaptureQueriesContext(connection) as queries:
+            profile.save()
+        self.assertFalse([query for query in queries if 'posts_timelineentry' in query['sql']])
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(POST_TIMELINE_PULL_THRESHOLD=1)
+    def test_author_dropping_back_to_push_is_backfilled(self):
+        from django.contrib.contenttypes.models import ContentType
+        from favorites.models import Favorite
+
+        favorite = Favorite.objects.create(
+            user=self.other, content_type=ContentType.objects.get_for_model(PublicProfile),
+            object_id=self.studio_profile.pk,
+        )
+        post = Post.objects.create(author=self.studio, post_type='tips', content='while popular')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+
+        favorite.delete()
+
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post=post).values_list('timeline', flat=True)),
+            {'all', 'category:belleza'},
+        )
+        self.assertEqual(self._ids(self.client.get('/api/posts/list/', {'category': 'belleza'})), [post.id])
+
+    def test_rebuild_restores_entries(self):
+        post = Post.objects.create(author=self.studio, post_type='tips', content='a')
+        TimelineEntry.objects.all().delete()
+        self.assertEqual(timeline.rebuild(), 2)
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), 2)
+
+
+class PostKeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user(email='author@example.com', username='author', password='pass')
+        self.posts = [Post.objects.create(author=self.author, post_type='tips', content=str(i)) for i in range(5)]
+        self.newest_first = [post.id for post in reversed(self.posts)]
+
+    def _ids(self, data):
+        return [item['id'] for item in data['results']]
+
+    def _walk(self, url, params=None):
+        seen = []
+        data = self.client.get(url, params or {}).json()
+        seen.extend(self._ids(data))
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            seen.extend(self._ids(data))
+        return seen
+
+    def test_cursor_walks_feed_and_filtered_feed(self):
+        with patch.object(PostKeysetPagination, 'page_size', 2):
+            self.assertEqual(self._walk('/api/posts/list/'), self.newest_first)
+            self.assertEqual(self._walk('/api/posts/list/', {'type': 'tips'}), self.newest_first)
+
+    def test_since_returns_only_new_posts(self):
+        with patch.object(PostKeysetPagination, 'page_size', 2):
+            first = self.client.get('/api/posts/list/').json()
+            newer = Post.objects.create(author=self.author, post_type='tips', content='new')
+            polled = self.client.get('/api/posts/list/', {'since': first['since']}).json()
+            self.assertEqual(self._ids(polled), [newer.id])
+            self.assertFalse(polled['gap'])
+            empty = self.client.get('/api/posts/list/', {'since': polled['since']}).json()
+            self.assertEqual(empty['results'], [])
+            self.assertEqual(empty['since'], polled['since'])
+
+    def test_comments_and_liked_posts_use_cursors(self):
+        post = self.posts[0]
+        comments = [PostComment.objects.create(post=post, author=self.author, content=str(i)) for i in range(3)]
+        for liked in self.posts:
+            PostLike.objects.create(post=liked, user=self.author)
+        self.client.force_login(self.author)
+        with patch.object(CommentKeysetPagination, 'page_size', 2), patch.object(PostKeysetPagination, 'page_size', 2):
+            self.assertEqual(self._walk(f'/api/posts/list/{post.id}/comments/'), [c.id for c in comments])
+            self.assertEqual(self._walk('/api/posts/list/liked/'), self.newest_first)
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/api/posts/list/', {'cursor': 'garbage'}).status_code, 404)
+
+
+class StoryExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = get_user_model().objects.create_user(email='author@example.com', username='author', password='pass')
+
+    def test_sweeper_takes_expired_stories_out_of_the_feed(self):
+        now = timezone.now()
+        expired = Post.objects.create(author=self.author, post_type='video', expires_at=now - timedelta(minutes=1))
+        PostMedia.objects.create(post=expired, media_type='video', media_file='')
+        live = Post.objects.create(author=self.author, post_type='video', expires_at=now + timedelta(hours=1))
+        tip = Post.objects.create(author=self.author, post_type='tips', content='tip')
+
+        self.assertEqual(expire_stories(now=now), (1, 0))
+        expired.refresh_from_db()
+        self.assertFalse(expired.is_live)
+        self.assertFalse(expired.media.exists())
+        self.assertFalse(TimelineEntry.objects.filter(post=expired).exists())
+        ids = [item['id'] for item in self.client.get('/api/posts/list/').json()['results']]
+        self.assertEqual(ids, [tip.id, live.id])
+        self.assertEqual(self.client.get(f'/api/posts/list/{expired.id}/').status_code, 404)
+        self.assertEqual(expire_stories(now=now), (0, 0))
+
+    def test_migration_expires_stories_that_expired_before_deploy(self):
+        migration = import_module('posts.migrations.0016_expire_stale_stories')
+        stale = Post.objects.create(author=self.author, post_type='video', expires_at=timezone.now() - timedelta(days=3))
+        PostMedia.objects.create(post=stale, media_type='video', media_file='')
+        live = Post.objects.create(author=self.author, post_type='video', expires_at=timezone.now() + timedelta(hours=1))
+
+        migration.expire_stale_stories(apps, None)
+        stale.refresh_from_db()
+        live.refresh_from_db()
+        self.assertFalse(stale.is_live)
+        self.assertFalse(stale.media.exists())
+        self.assertFalse(TimelineEntry.objects.filter(post=stale).exists())
+        self.assertTrue(live.is_live)
+        self.assertTrue(TimelineEntry.objects.filter(post=live).exists())
+
+
+@skipIf(mock_aws is None, 'moto is not installed')
+class DirectUploadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.mock = mock_aws()
+        self.mock.start()
+        self.addCleanup(self.mock.stop)
+        self.storage = direct_uploads.get_media_storage()
+        self.s3 = boto3.client('s3', region_name=self.storage.region_name or 'us-east-1')
+        self.s3.create_bucket(
+            Bucket=self.storage.bucket_name,
+            CreateBucketConfiguration={'LocationConstraint': self.storage.region_name},
+        )
+        self.user = get_user_model().objects.create_user(email='author@example.com', username='author', password='pass')
+        self.client.force_login(self.user)
+
+    def _presign(self, **data):
+        response = self.client.post('/api/posts/uploads/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def test_single_put_upload_and_finalize(self):
+        upload = self._presign(filename='clip.mp4', content_type='video/mp4', size=11)
+        put = requests.put(upload['url'], data=b'video-bytes', headers=upload['headers'])
+        self.assertEqual(put.status_code, 200)
+
+        response = self.client.post(
+            '/api/posts/uploads/finalize/',
+            {'post_type': 'video', 'uploads': [{'upload_token': upload['upload_token']}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        post = Post.objects.get(id=response.json()['id'])
+        self.assertIsNotNone(post.expires_at)
+        media = post.media.get()
+        self.assertEqual(media.media_type, 'video')
+        self.assertTrue(media.media_file.name.startswith('posts/media/'))
+        self.assertEqual(self.storage.open(media.media_file.name).read(), b'video-bytes')
+
+    def test_multipart_upload(self):
+        upload = self._presign(filename='long.mov', content_type='video/quicktime', parts=2)
+        chunks = [b'a' * direct_uploads.MIN_PART_SIZE, b'tail']
+        parts = []
+        for part, chunk in zip(upload['parts'], chunks):
+            put = requests.put(part['url'], data=chunk)
+            self.assertEqual(put.status_code, 200)
+            parts.append({'part_number': part['part_number'], 'etag': put.headers['ETag']})
+
+        response = self.client.post(
+            '/api/posts/uploads/finalize/',
+            {'post_type': 'video', 'uploads': [{'upload_token': upload['upload_token'], 'parts': parts}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        name = Post.objects.get(id=response.json()['id']).media.get().media_file.name
+        self.assertEqual(self.storage.size(name), direct_uploads.MIN_PART_SIZE + 4)
+
+    def test_finalize_rejects_missing_object_and_foreign_tokens(self):
+        upload = self._presign(filename='photo.jpg', content_type='image/jpeg')
+        body = {'post_type': 'photo', 'uploads': [{'upload_token': upload['upload_token']}]}
+        response = self.client.post('/api/posts/uploads/finalize/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        other = get_user_model().objects.create_user(email='other@example.com', username='other', password='pass')
+        self.client.force_login(other)
+        requests.put(upload['url'], data=b'jpeg', headers=upload['headers'])
+        response = self.client.post('/api/posts/uploads/finalize/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+    def test_upload_tokens_are_single_use(self):
+        upload = self._presign(filename='photo.jpg', content_type='image/jpeg')
+        requests.put(upload['url'], data=b'jpeg', headers=upload['headers'])
+        item = {'upload_token': upload['upload_token']}
+
+        response = self.client.post(
+            '/api/posts/uploads/finalize/', {'post_type': 'carousel', 'uploads': [item, item]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        body = {'post_type': 'photo', 'uploads': [item]}
+        response = self.client.post('/api/posts/uploads/finalize/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        response = self.client.post('/api/posts/uploads/finalize/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Post.objects.count(), 1)
+
+    def test_second_claim_of_an_upload_is_rejected(self):
+        direct_uploads.claim_uploads(['posts/media/a.jpg'])
+        with self.assertRaises(direct_uploads.DirectUploadError):
+            direct_uploads.claim_uploads(['posts/media/b.jpg', 'posts/media/a.jpg'])
+        # The failed claim is all-or-nothing
+        self.assertEqual(list(DirectUploadClaim.objects.values_list('name', flat=True)), ['posts/media/a.jpg'])
+
+    def test_failed_finalize_releases_the_claim(self):
+        upload = self._presign(filename='photo.jpg', content_type='image/jpeg')
+        body = {'post_type': 'photo', 'uploads': [{'upload_token': upload['upload_token']}]}
+        response = self.client.post('/api/posts/uploads/finalize/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        requests.put(upload['url'], data=b'jpeg', headers=upload['headers'])
+        response = self.client.post('/api/posts/uploads/finalize/', body, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_finalize_checks_media_type_against_post_type(self):
+        upload = self._presign(filename='photo.jpg', content_type='image/jpeg')
+        requests.put(upload['url'], data=b'jpeg', headers=upload['headers'])
+        response = self.client.post(
+            '/api/posts/uploads/finalize/',
+            {'post_type': 'video', 'uploads': [{'upload_token': upload['upload_token']}]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Post.objects.exists())
+
+    def test_rejects_non_media_content_types(self):
+        response = self.client.post(
+            '/api/posts/uploads/', {'filename': 'x.exe', 'content_type': 'application/octet-stream'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,326 @@
+"""
+Fan-out-on-write timelines for the post feed.
+
+Instead of filtering the whole Post table on every read, each new post is
+pushed into the timelines it belongs to: the global timeline ('all') and one
+per main category of its author ('category:<token>'). Each timeline is an
+ordered list of (created_at, post_id) rows in TimelineEntry, trimmed to
+POST_TIMELINE_LENGTH entries, so a feed page is an index range read followed
+by a bulk fetch of the posts.
+
+Timelines only hold the newest POST_TIMELINE_LENGTH posts; pages past the
+trimmed tail continue from the Post table. When an author's categories
+change, sync_author() moves their posts between category timelines.
+
+Hybrid mode: authors with at least POST_TIMELINE_PULL_THRESHOLD favorites are
+not fanned out. Their recent posts are pulled at read time and merged into the
+page, so a burst of posts from a very popular author doesn't rewrite every
+timeline. When an author drops back below the threshold, favorites_changed()
+backfills their recent posts into their timelines, since they are no longer
+pulled.
+"""
+import heapq
+
+from django.conf import settings
+from django.db.models import Q
+
+from services.category_rules import category_tokens, normalize_category_token
+
+from .models import Post, TimelineEntry
+
+GLOBAL_TIMELINE = 'all'
+
+
+def timeline_length():
+    return getattr(settings, 'POST_TIMELINE_LENGTH', 1000)
+
+
+def pull_threshold():
+    """Favorites count from which an author is read on pull; None disables hybrid mode."""
+    return getattr(settings, 'POST_TIMELINE_PULL_THRESHOLD', None)
+
+
+def category_timeline(category):
+    token = normalize_category_token(category)
+    return f'category:{token}'[:120] if token else GLOBAL_TIMELINE
+
+
+def timelines_for_categories(category):
+    """Category timelines for a raw PublicProfile.category value."""
+    return [category_timeline(token) for token in sorted(category_tokens(category))]
+
+
+def category_timelines(profile):
+    """Category timelines of an author with `profile` (None for no profile)."""
+    if profile is None:
+        return []
+    return timelines_for_categories(profile.category)
+
+
+def author_category_timelines(author_id):
+    """Category timelines that currently hold posts by `author_id`."""
+    return list(
+        TimelineEntry.objects.filter(post__author_id=author_id, timeline__startswith='category:')
+        .values_list('timeline', flat=True).distinct()
+    )
+
+
+def timelines_for_author(author):
+    """Timelines a post by `author` is pushed to."""
+    try:
+        profile = author.public_profile
+    except Exception:
+        profile = None
+    return [GLOBAL_TIMELINE] + category_timelines(profile)
+
+
+def pull_author_ids():
+    """User ids of authors whose posts are pulled at read time instead of fanned out."""
+    from users.models import ProfileRankingFeatures
+
+    threshold = pull_threshold()
+    if threshold is None:
+        return set()
+    return set(
+        ProfileRankingFeatures.objects.filter(favorites_count__gte=threshold)
+        .values_list('profile__user_id', flat=True)
+    )
+
+
+def is_pull_author(author):
+    from users.models import ProfileRankingFeatures
+
+    threshold = pull_threshold()
+    if threshold is None:
+        return False
+    return ProfileRankingFeatures.objects.filter(
+        profile__user_id=author.pk, favorites_count__gte=threshold
+    ).exists()
+
+
+def trim(timeline, length=None):
+    """Drop entries beyond the newest `length` of a timeline."""
+    length = timeline_length() if length is None else length
+    boundary = (
+        TimelineEntry.objects.filter(timeline=timeline)
+        .order_by('-created_at', '-post_id')
+        .values_list('created_at', 'post_id')[length:length + 1]
+    )
+    boundary = list(boundary)
+    if not boundary:
+        return 0
+    created_at, post_id = boundary[0]
+    stale = TimelineEntry.objects.filter(timeline=timeline, created_at__lte=created_at).exclude(
+        created_at=created_at, post_id__gt=post_id
+    )
+    deleted, _ = stale.delete()
+    return deleted
+
+
+def push(post):
+    """Fan a new post out to its author's timelines (no-op for pull authors)."""
+    if is_pull_author(post.author):
+        return []
+    names = timelines_for_author(post.author)
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(timeline=name, post=post, created_at=post.created_at) for name in names],
+        ignore_conflicts=True,
+    )
+    for name in names:
+        trim(name)
+    return names
+
+
+def backfill_author(author_id, timelines):
+    """Add an author's newest live posts to `timelines`."""
+    timelines = list(timelines)
+    if not timelines:
+        return
+    posts = list(
+        Post.objects.filter(author_id=author_id, is_live=True)
+        .order_by('-created_at', '-id')
+        .values_list('id', 'created_at')[:timeline_length()]
+    )
+    if not posts:
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(timeline=name, post_id=post_id, created_at=created_at)
+            for name in timelines
+            for post_id, created_at in posts
+        ],
+        ignore_conflicts=True,
+    )
+    for name in timelines:
+        trim(name)
+
+
+def sync_author(author_id, profile, previous_timelines):
+    """
+    Move an author's posts from the category timelines in `previous_timelines`
+    to those of `profile` (their current public profile, or None once it is
+    deleted): entries in timelines they left are deleted and their newest posts
+    are added to the ones they joined.
+    """
+    wanted = set(category_timelines(profile))
+    previous = set(previous_timelines)
+    left = previous - wanted
+    if left:
+        TimelineEntry.objects.filter(post__author_id=author_id, timeline__in=left).delete()
+    joined = wanted - previous
+    if joined and author_id not in pull_author_ids():
+        backfill_author(author_id, joined)
+
+
+def favorites_changed(profile_id, delta):
+    """
+    Call after a profile's favorites_count moved by `delta`. When that took its
+    author from pull back to push, their recent posts are backfilled into their
+    timelines (they were never pushed while pulled).
+    """
+    from users.models import ProfileRankingFeatures, User
+
+    threshold = pull_threshold()
+    if threshold is None or not profile_id:
+        return
+    row = (
+        ProfileRankingFeatures.objects.filter(profile_id=profile_id)
+        .values_list('favorites_count', 'profile__user_id')
+        .first()
+    )
+    if row is None:
+        return
+    count, author_id = row
+    if count - delta >= threshold > count:
+        author = User.objects.select_related('public_profile').get(pk=author_id)
+        backfill_author(author_id, timelines_for_author(author))
+
+
+def rebuild(timeline=None):
+    """Recreate timelines from the newest posts; returns the number of entries written."""
+    length = timeline_length()
+    pulled = pull_author_ids()
+    if timeline is None:
+        TimelineEntry.objects.all().delete()
+    else:
+        TimelineEntry.objects.filter(timeline=timeline).delete()
+    posts = (
+        Post.objects.filter(is_live=True).exclude(author_id__in=pulled)
+        .select_related('author__public_profile')
+        .order_by('-created_at', '-id')
+    )
+    written = {}
+    batch = []
+    for post in posts.iterator(chunk_size=500):
+        for name in timelines_for_author(post.author):
+            if timeline is not None and name != timeline:
+                continue
+            if written.get(name, 0) >= length:
+                continue
+            written[name] = written.get(name, 0) + 1
+            batch.append(TimelineEntry(timeline=name, post=post, created_at=post.created_at))
+        if len(batch) >= 500:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    return sum(written.values())
+
+
+class TimelinePage:
+    """
+    Sliceable, countable view of a timeline merged with pulled authors' posts,
+    usable as a paginator object_list. Slices return (created_at, post_id) pairs,
+    newest first. Past the oldest entry of the timeline (it is trimmed to
+    POST_TIMELINE_LENGTH) the page continues with posts read from Post.
+    """
+
+    def __init__(self, timeline, pulled_author_ids=None, older_than=None, newer_than=None):
+        self.timeline = timeline
+        self.pulled_author_ids = pull_author_ids() if pulled_author_ids is None else set(pulled_author_ids)
+        self.older_than = older_than
+        self.newer_than = newer_than
+
+    def keyset(self, older_than=None, newer_than=None):
+        """Same timeline bounded by (created_at, post_id) keys (see posts.pagination)."""
+        return TimelinePage(self.timeline, self.pulled_author_ids, older_than=older_than, newer_than=newer_than)
+
+    def _bound(self, queryset, id_field):
+        if self.older_than is not None:
+            created_at, pk = self.older_than
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, **{f'{id_field}__lt': pk})
+            )
+        if self.newer_than is not None:
+            created_at, pk = self.newer_than
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, **{f'{id_field}__gt': pk})
+            )
+        return queryset
+
+    def _entries(self):
+        return self._bound(TimelineEntry.objects.filter(timeline=self.timeline), 'post_id')
+
+    def _in_timeline(self, posts):
+        if self.timeline != GLOBAL_TIMELINE:
+            token = self.timeline.split(':', 1)[1]
+            from users.models import PublicProfileCategoryToken
+            posts = posts.filter(
+                author__public_profile__category_tokens__kind=PublicProfileCategoryToken.Kind.CATEGORY,
+                author__public_profile__category_tokens__token=token,
+            )
+        return posts
+
+    def _pulled(self):
+        posts = Post.objects.filter(author_id__in=self.pulled_author_ids, is_live=True)
+        return self._bound(self._in_timeline(posts), 'id')
+
+    def _older_than_tail(self):
+        """Posts of this timeline older than its oldest entry (the trimmed part), pulled authors excluded."""
+        tail = (
+            TimelineEntry.objects.filter(timeline=self.timeline)
+            .order_by('created_at', 'post_id')
+            .values_list('created_at', 'post_id')
+            .first()
+        )
+        posts = Post.objects.filter(is_live=True).exclude(author_id__in=self.pulled_author_ids)
+        if tail is not None:
+            created_at, post_id = tail
+            posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=post_id))
+        return self._bound(self._in_timeline(posts), 'id')
+
+    def count(self):
+        total = self._entries().count() + self._older_than_tail().count()
+        if self.pulled_author_ids:
+            total += self._pulled().count()
+        return total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('TimelinePage only supports slicing')
+        start, stop = index.start or 0, index.stop
+        entries = (
+            self._entries()
+            .order_by('-created_at', '-post_id')
+            .values_list('created_at', 'post_id')
+        )
+        entries = list(entries[:stop])
+        if stop is None or len(entries) < stop:
+            # Ran past the newest entries the timeline keeps
+            older = self._older_than_tail().order_by('-created_at', '-id').values_list('created_at', 'id')
+            entries.extend(older[:None if stop is None else stop - len(entries)])
+        if not self.pulled_author_ids:
+            return entries[start:stop]
+        pulled = self._pulled().order_by('-created_at', '-id').values_list('created_at', 'id')
+        merged = heapq.merge(entries, list(pulled[:stop]), reverse=True)
+        # An author who became popular may have older posts in both sources
+        seen = set()
+        page = []
+        for created_at, post_id in merged:
+            if post_id not in seen:
+                seen.add(post_id)
+                page.append((created_at, post_id))
+        return page[start:stop]
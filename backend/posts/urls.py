@@ -15,7 +15,10 @@ urlpatterns = [
     path('poll/', views.create_poll_post, name='create-poll-post'),
     path('review/', views.create_review_post, name='create-review-post'),
     path('pet_adoption/', views.create_pet_adoption_post, name='create-pet-adoption-post'),
+    path('uploads/', views.create_direct_upload, name='create-direct-upload'),
+    path('uploads/finalize/', views.finalize_direct_upload_post, name='finalize-direct-upload-post'),
     path('<int:post_id>/vote/', views.vote_in_poll, name='vote-in-poll'),
+    path('<int:post_id>/poll-results/', views.poll_results, name='poll-results'),
     # Router URLs come last
     path('', include(router.urls)),
 ]
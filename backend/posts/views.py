@@ -4,19 +4,45 @@ from rest_framework.decorators import action, api_view, parser_classes, permissi
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Value
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
 from datetime import timedelta
+from services.category_rules import normalize_category_token
+from users.models import PublicProfileCategoryToken
+from users import image_derivatives
+from . import direct_uploads, polls, timeline
+from .counters import adjust_counter
+from .pagination import CommentKeysetPagination, PostKeysetPagination
 from .models import Post, PostMedia, PostLike, PostComment, PollOption, PollVote
 from .serializers import (
     PostSerializer, PostCreateSerializer, CommentCreateSerializer,
-    PollVoteSerializer, PostMediaSerializer, PostCommentSerializer
+    PollVoteSerializer, PostMediaSerializer, PostCommentSerializer,
+    DirectUploadRequestSerializer, DirectUploadFinalizeSerializer
 )
 
+def annotate_viewer_state(queryset, user):
+    """
+    Annotate viewer_has_liked so PostSerializer never queries likes per post.
+    Like/comment counts are denormalized on Post (see posts.counters).
+    """
+    if user is not None and user.is_authenticated:
+        viewer_has_liked = Exists(PostLike.objects.filter(post=OuterRef('pk'), user=user))
+    else:
+        viewer_has_liked = Value(False)
+    return queryset.annotate(viewer_has_liked=viewer_has_liked)
+
+
+# Query params a timeline can serve; any other filter queries Post directly
+TIMELINE_PARAMS = {'category', 'page', 'cursor', 'since'}
+
+
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     permission_classes = [IsAuthenticated]
+    pagination_class = PostKeysetPagination
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -29,20 +55,16 @@ class PostViewSet(viewsets.ModelViewSet):
             return [AllowAny()]
         return [IsAuthenticated()]
 
-    def get_queryset(self):
-        queryset = Post.objects.select_related('author').prefetch_related('media', 'likes', 'comments')
-
-        # Filter out expired video posts (stories-like behavior)
-        # Show videos that either:
-        # 1. Are not expired (expires_at > now) OR
-        # 2. Don't have an expiration date (expires_at is null) OR
-        # 3. Are not video type posts
-        now = timezone.now()
-        queryset = queryset.filter(
-            Q(post_type='video', expires_at__gt=now) | 
-            Q(post_type='video', expires_at__isnull=True) | 
-            ~Q(post_type='video')
+    def _live_posts(self):
+        queryset = annotate_viewer_state(
+            Post.objects.select_related('author', 'author__public_profile').prefetch_related('media', 'poll_options'),
+            self.request.user,
         )
+        # Expired stories (video posts) are flagged by the expire_stories sweeper
+        return queryset.filter(is_live=True)
+
+    def get_queryset(self):
+        queryset = self._live_posts()
 
         # Filter by author
         author = self.request.query_params.get('author', None)
@@ -54,14 +76,14 @@ class PostViewSet(viewsets.ModelViewSet):
         if post_type:
             queryset = queryset.filter(post_type=post_type)
 
-        # Filter by author's main category (PublicProfile.category JSON/list or legacy string)
+        # Filter by author's main category (normalized PublicProfile category token index)
         category = self.request.query_params.get('category', None)
         if category:
-            category_token = str(category).strip().lower()
+            category_token = normalize_category_token(category)
             if category_token:
                 queryset = queryset.filter(
-                    Q(author__public_profile__category__contains=[category_token]) |
-                    Q(author__public_profile__category=category_token)
+                    author__public_profile__category_tokens__kind=PublicProfileCategoryToken.Kind.CATEGORY,
+                    author__public_profile__category_tokens__token=category_token,
                 )
 
         # Filter by post's linked_subcategory (single subcategory the post is linked to)
@@ -73,6 +95,32 @@ class PostViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def _timeline_for_request(self):
+        """Timeline that can serve this list request, or None to query Post directly."""
+        if not getattr(settings, 'POST_TIMELINE_ENABLED', False):
+            return None
+        params = self.request.query_params
+        if not set(params.keys()) <= TIMELINE_PARAMS:
+            return None
+        return timeline.category_timeline(params.get('category'))
+
+    def list(self, request, *args, **kwargs):
+        """
+        Feed. Unfiltered and category-only requests are a range read on the
+        fan-out timeline plus a bulk fetch of the posts.
+        """
+        timeline_name = self._timeline_for_request()
+        if timeline_name is None:
+            return super().list(request, *args, **kwargs)
+
+        entries = self.paginate_queryset(timeline.TimelinePage(timeline_name))
+        post_ids = [post_id for _, post_id in entries]
+        # The timeline already decided membership (category included); only drop expired stories
+        posts_by_id = self._live_posts().in_bulk(post_ids)
+        posts = [posts_by_id[post_id] for post_id in post_ids if post_id in posts_by_id]
+        serializer = self.get_serializer(posts, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def retrieve(self, request, *args, **kwargs):
         """Return a single post."""
         instance = self.get_object()
@@ -101,13 +149,18 @@ class PostViewSet(viewsets.ModelViewSet):
         post = self.get_object()
         user = request.user
 
-        # Check if like already exists
-        like, created = PostLike.objects.get_or_create(post=post, user=user)
+        with transaction.atomic():
+            # Check if like already exists
+            like, created = PostLike.objects.get_or_create(post=post, user=user)
+
+            if not created:
+                # Unlike if already exists; a concurrent unlike may have deleted it first
+                deleted, _ = PostLike.objects.filter(pk=like.pk).delete()
+                if deleted:
+                    adjust_counter(Post, post.pk, 'likes_count', -1)
+                return Response({'liked': False})
 
-        if not created:
-            # Unlike if already exists
-            like.delete()
-            return Response({'liked': False})
+            adjust_counter(Post, post.pk, 'likes_count', 1)
 
         return Response({'liked': True})
     
@@ -115,10 +168,12 @@ class PostViewSet(viewsets.ModelViewSet):
     def liked_posts(self, request):
         """Get all posts liked by the authenticated user"""
         user = request.user
-        liked_post_ids = PostLike.objects.filter(user=user).values_list('post_id', flat=True)
-        posts = Post.objects.filter(id__in=liked_post_ids).select_related(
-            'author', 'author__public_profile'
-        ).prefetch_related('media', 'likes', 'comments')
+        posts = annotate_viewer_state(
+            Post.objects.filter(likes__user=user).select_related(
+                'author', 'author__public_profile'
+            ).prefetch_related('media', 'poll_options'),
+            user,
+        )
         
         page = self.paginate_queryset(posts)
         if page is not None:
@@ -132,11 +187,12 @@ class PostViewSet(viewsets.ModelViewSet):
     def comments(self, request, pk=None):
         post = self.get_object()
         comments = post.comments.select_related('author').all()
-        page = self.paginate_queryset(comments)
+        paginator = CommentKeysetPagination()
+        page = paginator.paginate_queryset(comments, request, view=self)
 
         if page is not None:
             serializer = PostCommentSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
+            return paginator.get_paginated_response(serializer.data)
 
         serializer = PostCommentSerializer(comments, many=True, context={'request': request})
         return Response(serializer.data)
@@ -147,11 +203,13 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = CommentCreateSerializer(data=request.data, context={'request': request})
 
         if serializer.is_valid():
-            comment = PostComment.objects.create(
-                post=post,
-                author=request.user,
-                **serializer.validated_data
-            )
+            with transaction.atomic():
+                comment = PostComment.objects.create(
+                    post=post,
+                    author=request.user,
+                    **serializer.validated_data
+                )
+                adjust_counter(Post, post.pk, 'comments_count', 1)
             return Response(PostCommentSerializer(comment, context={'request': request}).data)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -166,7 +224,10 @@ class PostViewSet(viewsets.ModelViewSet):
 
         try:
             comment = PostComment.objects.get(id=comment_id, post=post, author=request.user)
-            comment.delete()
+            with transaction.atomic():
+                deleted, _ = PostComment.objects.filter(pk=comment.pk).delete()
+                if deleted:
+                    adjust_counter(Post, post.pk, 'comments_count', -1)
             return Response({'deleted': True})
         except PostComment.DoesNotExist:
             return Response({'error': 'Comment not found or not authorized'}, status=status.HTTP_404_NOT_FOUND)
@@ -243,6 +304,80 @@ def create_video_post(request):
         'has_media_in_files': 'media' in request.FILES,
     }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def create_direct_upload(request):
+    """
+    Issue a presigned S3 upload for post media (see posts.direct_uploads).
+    POST /api/posts/uploads/ {filename, content_type, size?, parts?}
+    """
+    serializer = DirectUploadRequestSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    try:
+        upload = direct_uploads.presign_upload(request.user, **serializer.validated_data)
+    except direct_uploads.DirectUploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(upload, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def finalize_direct_upload_post(request):
+    """
+    Create a post from media uploaded directly to S3.
+    POST /api/posts/uploads/finalize/ {post_type, content?, linked_*?, uploads: [{upload_token, parts?, caption?}]}
+    """
+    finalize = DirectUploadFinalizeSerializer(data=request.data)
+    finalize.is_valid(raise_exception=True)
+    post_type = finalize.validated_data['post_type']
+
+    post_data = {'post_type': post_type}
+    post_data.update({
+        key: request.data[key]
+        for key in ('content', 'linked_service_id', 'linked_group_session_id', 'linked_subcategory')
+        if key in request.data
+    })
+    serializer = PostCreateSerializer(data=post_data, context={'request': request})
+    serializer.is_valid(raise_exception=True)
+
+    try:
+        payloads = [
+            (direct_uploads.read_upload_token(item['upload_token'], request.user), item)
+            for item in finalize.validated_data['uploads']
+        ]
+        for payload, _ in payloads:
+            direct_uploads.check_upload(payload, post_type)
+        names = [payload['name'] for payload, _ in payloads]
+        direct_uploads.claim_uploads(names)
+    except direct_uploads.DirectUploadError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        media = [
+            (direct_uploads.complete_upload(payload, item.get('parts')), payload['media_type'], item.get('caption'))
+            for payload, item in payloads
+        ]
+    except direct_uploads.DirectUploadError as e:
+        direct_uploads.release_uploads(names)
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    extra = {'post_type': post_type}
+    if post_type == 'video':
+        # Same story semantics as create_video_post
+        extra.update(expires_at=timezone.now() + timedelta(hours=24), content=None)
+    with transaction.atomic():
+        post = serializer.save(**extra)
+        created = PostMedia.objects.bulk_create([
+            PostMedia(post=post, media_file=name, media_type=media_type, caption=caption, order=i)
+            for i, (name, media_type, caption) in enumerate(media)
+        ])
+        # bulk_create skips post_save, so queue image derivatives here
+        for item in created:
+            if item.media_type == 'image' and item.pk:
+                image_derivatives.submit(image_derivatives.build_post_media_derivatives, item.pk)
+    return Response(PostSerializer(post, context={'request': request}).data, status=status.HTTP_201_CREATED)
+
+
 @api_view(['POST'])
 @parser_classes([MultiPartParser, FormParser])
 def create_carousel_post(request):
@@ -473,10 +608,23 @@ def vote_in_poll(request, post_id):
         post = Post.objects.get(id=post_id, post_type='poll')
     except Post.DoesNotExist:
         return Response({'error': 'Poll not found'}, status=status.HTTP_404_NOT_FOUND)
-    serializer = PollVoteSerializer(data=request.data, context={'request': request})
+    serializer = PollVoteSerializer(data=request.data, context={'request': request, 'post': post})
 
     if serializer.is_valid():
         vote = serializer.save()
         return Response({'voted': True})
 
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def poll_results(request, post_id):
+    if not Post.objects.filter(id=post_id, post_type='poll').exists():
+        return Response({'error': 'Poll not found'}, status=status.HTTP_404_NOT_FOUND)
+    results = dict(polls.poll_results(post_id))
+    # The shared results are cached; the viewer's own vote is looked up per request
+    results['user_vote'] = (
+        PollVote.objects.filter(post_id=post_id, user=request.user).values_list('poll_option_id', flat=True).first()
+    )
+    return Response(results)
\ No newline at end of file
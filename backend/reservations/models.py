@@ -73,11 +73,42 @@ class Reservation(models.Model):
     def __str__(self):
         return f"Reservation {self.code} - {self.client.user.username}"
     
+    # Fields whose previous values the notification signals compare against
+    TRACKED_FIELDS = ('status', 'date', 'time')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_tracked_fields()
+        return instance
+
+    def _snapshot_tracked_fields(self, fields=None):
+        deferred = self.get_deferred_fields()
+        loaded = dict(getattr(self, '_loaded_values', {}))
+        for name in fields or self.TRACKED_FIELDS:
+            if name in self.TRACKED_FIELDS and name not in deferred:
+                loaded[name] = getattr(self, name)
+        self._loaded_values = loaded
+
+    def loaded_values(self):
+        """Tracked fields as of the last load or save ({} for instances never saved or loaded)"""
+        return getattr(self, '_loaded_values', {})
+
+    def set_provider_user(self, user, name=None):
+        """Provider user (and display name) the caller already loaded, so the notification signals need not look them up again"""
+        self._provider_user = (self.provider_content_type_id, self.provider_object_id, user, name)
+
     def save(self, *args, **kwargs):
         # Auto-generate unique code if not set
         if not self.code:
             self.code = self.generate_unique_code()
         super().save(*args, **kwargs)
+        # post_save handlers have seen the previous values; the saved ones are the baseline from now on
+        self._snapshot_tracked_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._snapshot_tracked_fields(fields)
     
     @staticmethod
     def generate_unique_code():
@@ -471,6 +471,8 @@ class ReservationViewSet(viewsets.ModelViewSet):
             )
         
         reservation.status = 'CONFIRMED'
+        # The permission check above loaded the provider user; let the signal reuse it
+        reservation.set_provider_user(request.user)
         # Save will trigger the signal which will create the calendar event and notifications
         reservation.save(update_fields=['status', 'updated_at'])
         
@@ -515,7 +517,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
         reason = request.data.get('reason', '')
         reservation.status = 'REJECTED'
         reservation.rejection_reason = reason
-        reservation.save()
+        reservation.save(update_fields=['status', 'rejection_reason', 'updated_at'])
 
         if reservation.group_session:
             reservation.group_session.release_one_slot()
@@ -565,7 +567,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
         reason = request.data.get('reason', '')
         reservation.status = 'CANCELLED'
         reservation.cancellation_reason = reason
-        reservation.save()
+        reservation.save(update_fields=['status', 'cancellation_reason', 'updated_at'])
 
         if reservation.group_session:
             reservation.group_session.release_one_slot()
@@ -643,7 +645,7 @@ class ReservationViewSet(viewsets.ModelViewSet):
             )
         
         reservation.status = 'COMPLETED'
-        reservation.save()
+        reservation.save(update_fields=['status', 'updated_at'])
         
         serializer = ReservationSerializer(reservation)
         return Response({
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Iterable, Set
+import json
+from typing import Iterable, List, Set
 
 
 def _normalize(value: str | None) -> str:
@@ -9,6 +10,11 @@ def _normalize(value: str | None) -> str:
     return str(value).strip().lower().replace(" ", "").replace("_", "")
 
 
+def normalize_category_token(value: str | None) -> str:
+    """Normalize a single category name the same way the category token index does."""
+    return _normalize(value)
+
+
 def _to_iterable(value) -> Iterable[str]:
     if value is None:
         return []
@@ -17,22 +23,60 @@ def _to_iterable(value) -> Iterable[str]:
     return [value]
 
 
-def get_profile_category_tokens(profile) -> Set[str]:
+def _expand_stringified_lists(values: Iterable) -> Iterable:
+    """Flatten entries stored as stringified JSON arrays (legacy migration data)."""
+    for value in values:
+        if isinstance(value, str) and value.strip().startswith("[") and value.strip().endswith("]"):
+            try:
+                parsed = json.loads(value)
+            except (json.JSONDecodeError, ValueError):
+                yield value
+                continue
+            if isinstance(parsed, list):
+                yield from parsed
+            else:
+                yield value
+        else:
+            yield value
+
+
+def category_tokens(value) -> Set[str]:
     """
-    Return normalized tokens for a provider profile categories.
+    Return normalized tokens for a raw category/sub_categories value.
     Supports values like:
     - ["belleza", "bienestar"]
     - ["Belleza"]
+    - "belleza" (legacy string)
+    - ['["belleza"]'] (legacy stringified JSON array)
     """
     tokens: Set[str] = set()
-    raw_categories = getattr(profile, "category", []) or []
-    for category in _to_iterable(raw_categories):
+    for category in _expand_stringified_lists(_to_iterable(value)):
         normalized = _normalize(category)
         if normalized:
             tokens.add(normalized)
     return tokens
 
 
+def category_names(value) -> List[str]:
+    """Category names as stored (stripped, legacy stringified lists flattened), without duplicates."""
+    names: List[str] = []
+    for category in _expand_stringified_lists(_to_iterable(value)):
+        name = str(category).strip() if category is not None else ""
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def get_profile_category_tokens(profile) -> Set[str]:
+    """Return normalized tokens for a provider profile categories."""
+    return category_tokens(getattr(profile, "category", []) or [])
+
+
+def get_profile_category_names(profile) -> List[str]:
+    """Return a provider profile's category names as shown to users."""
+    return category_names(getattr(profile, "category", []) or [])
+
+
 def is_service_category_allowed_for_profile(service_category_name: str | None, profile) -> bool:
     """
     A service category is valid when it matches one of the profile categories.
@@ -23,7 +23,6 @@ import secrets
 import hashlib
 import hmac
 from django.conf import settings
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.utils import timezone
@@ -34,6 +33,7 @@ from .models import GoogleAuthPendingCode, GoogleAuthCredentials
 from .profile_models import ProfileImage, CustomService, AvailabilitySchedule
 from reservations.models import Reservation, GroupSession
 from services.models import ProviderAvailability, TimeSlotBlock
+from notifications.outbox import enqueue as enqueue_email
 
 # Get logger for this module
 logger = logging.getLogger(__name__)
@@ -311,16 +311,17 @@ def email_request_code_view(request):
         else:
             email_addr = str(default_email)
         from_email = f"Código de acceso - nabbi <{email_addr}>"
-        send_mail(
+        enqueue_email(
             subject="Código de acceso - nabbi",
             message=plain_message,
             from_email=from_email,
             recipient_list=[email],
             html_message=html_message,
-            fail_silently=False,
+            expires_at=expires_at,
+            sensitive=True,
         )
         email_sent = True
-        logger.info(f"Email code sent successfully to {email}")
+        logger.info(f"Email code queued for {email}")
     except Exception as e:
         logger.error(f"Failed sending email code to {email}: {e}")
         # In development, if console backend is used, email will be printed to console
@@ -0,0 +1,85 @@
+"""
+Server-side cache for the public-profiles discovery list.
+
+The list shown on app launch only depends on the viewer's city and a few
+filters, so it is identical for every user in the same city. Pages are cached
+under (city, profile_type, category, subcategory, page) together with an ETag.
+All keys embed a generation number that is bumped whenever a PublicProfile
+(including its review rating) or a listed User field changes, which
+invalidates every cached page at once without having to enumerate keys.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from services.category_rules import normalize_category_token
+
+GENERATION_KEY = 'discovery:generation'
+
+# Query params that are part of the cache key; any other filter bypasses the cache
+CACHEABLE_PARAMS = {'profile_type', 'category', 'subcategory', 'page'}
+
+
+def _timeout():
+    return getattr(settings, 'DISCOVERY_CACHE_TIMEOUT', 300)
+
+
+def _generation():
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, 1, timeout=None)
+        generation = cache.get(GENERATION_KEY, 1)
+    return generation
+
+
+def is_cacheable(query_params):
+    """Only plain discovery requests are cached (no search/geo/city overrides)."""
+    return set(query_params.keys()) <= CACHEABLE_PARAMS
+
+
+def build_key(viewer_city, query_params):
+    parts = [
+        (viewer_city or '').strip().lower(),
+        query_params.get('profile_type') or '',
+        normalize_category_token(query_params.get('category')),
+        normalize_category_token(query_params.get('subcategory')),
+        query_params.get('page') or '1',
+    ]
+    digest = hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()
+    return f'discovery:{_generation()}:{digest}'
+
+
+def _etag_for(payload):
+    return '"%s"' % hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def get_page(key):
+    """Return cached {'etag', 'data'} for a key, or None."""
+    return cache.get(key)
+
+
+def store_page(key, data):
+    """Cache plain JSON data for a page (serializer Return* containers are not stored)."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    entry = {'etag': _etag_for(payload), 'data': json.loads(payload)}
+    cache.set(key, entry, timeout=_timeout())
+    return entry
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not header or not etag:
+        return False
+    candidates = [value.strip() for value in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def invalidate():
+    """Drop every cached discovery page by moving to a new generation."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 2, timeout=None)
@@ -0,0 +1,172 @@
+"""
+Caching client behind the Google Maps proxy endpoints.
+
+Autocomplete fires on every keystroke, so identical lookups are very common.
+All calls go through one pooled requests.Session, successful responses are kept
+in an in-process LRU cache with a TTL, and concurrent identical requests are
+coalesced so only one of them reaches Google while the others wait for it.
+The base URL is configurable (GOOGLE_MAPS_BASE_URL) so the client can be
+pointed at a local stub server.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+DEFAULT_BASE_URL = 'https://maps.googleapis.com'
+
+AUTOCOMPLETE_PATH = '/maps/api/place/autocomplete/json'
+PLACE_DETAILS_PATH = '/maps/api/place/details/json'
+GEOCODE_PATH = '/maps/api/geocode/json'
+
+# Google statuses worth caching; anything else (OVER_QUERY_LIMIT, REQUEST_DENIED...) is retried
+CACHEABLE_STATUSES = {'OK', 'ZERO_RESULTS'}
+
+# ~11 m at the equator; nearby reverse-geocode lookups share a cache entry
+COORDINATE_PRECISION = 4
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after being stored."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def normalize_input(value):
+    """Case/whitespace-insensitive key for autocomplete input."""
+    return re.sub(r'\s+', ' ', (value or '').strip()).lower()
+
+
+def round_coordinates(lat, lng):
+    return round(float(lat), COORDINATE_PRECISION), round(float(lng), COORDINATE_PRECISION)
+
+
+class GoogleMapsClient:
+    def __init__(self, base_url=None, timeout=None, cache_size=None, cache_ttl=None, pool_size=None):
+        self.base_url = (base_url or getattr(settings, 'GOOGLE_MAPS_BASE_URL', DEFAULT_BASE_URL)).rstrip('/')
+        self.timeout = timeout or getattr(settings, 'GOOGLE_MAPS_TIMEOUT', 10)
+        self.cache = TTLCache(
+            cache_size or getattr(settings, 'GOOGLE_MAPS_CACHE_SIZE', 2048),
+            cache_ttl or getattr(settings, 'GOOGLE_MAPS_CACHE_TTL', 24 * 60 * 60),
+        )
+        pool_size = pool_size or getattr(settings, 'GOOGLE_MAPS_POOL_SIZE', 10)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, cache_key, path, params):
+        """
+        Return the decoded JSON for a Google Maps request, served from cache when possible.
+        Raises requests.RequestException on transport/HTTP errors.
+        """
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            in_flight = self._in_flight.get(cache_key)
+            leader = in_flight is None
+            if leader:
+                in_flight = self._in_flight[cache_key] = _InFlight()
+
+        if not leader:
+            in_flight.done.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            response = self.session.get(f'{self.base_url}{path}', params=params, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+            if data.get('status') in CACHEABLE_STATUSES:
+                self.cache.set(cache_key, data)
+            in_flight.result = data
+            return data
+        except Exception as exc:
+            in_flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(cache_key, None)
+            in_flight.done.set()
+
+    def autocomplete(self, query, api_key):
+        return self.fetch(
+            ('autocomplete', normalize_input(query)),
+            AUTOCOMPLETE_PATH,
+            {'input': query.strip(), 'key': api_key},
+        )
+
+    def place_details(self, place_id, api_key):
+        return self.fetch(
+            ('details', place_id.strip()),
+            PLACE_DETAILS_PATH,
+            {'place_id': place_id.strip(), 'fields': 'geometry,formatted_address,address_components', 'key': api_key},
+        )
+
+    def reverse_geocode(self, lat, lng, api_key):
+        lat, lng = round_coordinates(lat, lng)
+        return self.fetch(
+            ('reverse', lat, lng),
+            GEOCODE_PATH,
+            {'latlng': f'{lat},{lng}', 'key': api_key},
+        )
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client (shared session and cache)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GoogleMapsClient()
+    return _client
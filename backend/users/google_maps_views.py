@@ -11,6 +11,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .google_maps_client import get_client
+
 def _get_google_maps_api_key():
     """Get Google Maps API key from environment variables"""
     # First, try to get from environment (should be loaded by settings.py)
@@ -46,7 +48,7 @@ def _get_google_maps_api_key():
 @permission_classes([AllowAny])
 def google_places_autocomplete(request):
     """
-    Proxy endpoint for Google Places Autocomplete API
+    Proxy endpoint for Google Places Autocomplete API (cached, see google_maps_client)
     GET /api/google-maps/places/autocomplete/?input=address
     """
     api_key = _get_google_maps_api_key()
@@ -61,15 +63,7 @@ def google_places_autocomplete(request):
         return Response({'predictions': []})
     
     try:
-        url = 'https://maps.googleapis.com/maps/api/place/autocomplete/json'
-        params = {
-            'input': query,
-            'key': api_key,
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().autocomplete(query, api_key)
         
         # Return only the predictions array
         predictions = data.get('predictions', [])
@@ -119,16 +113,7 @@ def google_place_details(request):
         )
     
     try:
-        url = 'https://maps.googleapis.com/maps/api/place/details/json'
-        params = {
-            'place_id': place_id,
-            'fields': 'geometry,formatted_address,address_components',
-            'key': api_key,
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = get_client().place_details(place_id, api_key)
         
         if data.get('status') != 'OK':
             return Response(
@@ -205,15 +190,16 @@ def google_reverse_geocode(request):
         )
     
     try:
-        url = 'https://maps.googleapis.com/maps/api/geocode/json'
-        params = {
-            'latlng': f'{lat},{lng}',
-            'key': api_key,
-        }
-        
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        float(lat)
+        float(lng)
+    except ValueError:
+        return Response(
+            {'error': 'lat and lng must be numbers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    try:
+        data = get_client().reverse_geocode(lat, lng, api_key)
         
         if data.get('status') != 'OK':
             return Response(
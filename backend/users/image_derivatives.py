@@ -0,0 +1,257 @@
+"""
+Resized WebP derivatives for post media and profile images.
+
+Feed cards only need small images, but clients used to download the original
+uploads. When an image is uploaded, a background worker pool renders WebP
+copies at IMAGE_DERIVATIVE_WIDTHS with Pillow and stores them next to the
+original (<folder>/derivatives/<name>_<width>w.webp). The resulting
+{width: storage name} maps are kept on the owning row and exposed by the
+serializers as srcset-style {width: url} maps.
+
+Derivative maps have the shape {'source': <original name>, 'sizes': {'320': name, ...}},
+so a changed original is detected by comparing 'source'.
+"""
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_profile_images_storage = None
+
+
+def derivative_widths():
+    return tuple(sorted(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (320, 640, 1080))))
+
+
+def _quality():
+    return getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+            thread_name_prefix='image-derivatives',
+        )
+    return _executor
+
+
+def _run(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception('Image derivative job %s%s failed', job.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def submit(job, *args):
+    """Run `job(*args)` in the worker pool once the current transaction commits."""
+    if not getattr(settings, 'IMAGE_DERIVATIVES_ASYNC', True):
+        transaction.on_commit(lambda: job(*args))
+        return
+    transaction.on_commit(lambda: _get_executor().submit(_run, job, *args))
+
+
+def derivative_name(name, width):
+    folder, filename = posixpath.split(name)
+    stem = filename.rsplit('.', 1)[0]
+    return posixpath.join(folder, 'derivatives', f'{stem}_{width}w.webp')
+
+
+def render(source, widths=None, quality=None):
+    """Return {width: webp bytes} for a source image file object."""
+    widths = widths or derivative_widths()
+    quality = quality or _quality()
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        targets = [width for width in widths if width < image.width] or [image.width]
+        rendered = {}
+        for width in targets:
+            height = max(round(image.height * width / image.width), 1)
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, format='WEBP', quality=quality, method=4)
+            rendered[width] = buffer.getvalue()
+    return rendered
+
+
+def generate(storage, name, widths=None):
+    """Render and store derivatives of storage file `name`; returns a derivative map."""
+    with storage.open(name, 'rb') as source:
+        rendered = render(source, widths)
+    overwrites = _overwrites(storage)
+    sizes = {}
+    for width, data in rendered.items():
+        target = derivative_name(name, width)
+        if not overwrites:
+            # Otherwise save() picks a new suffixed name and orphans the previous render
+            storage.delete(target)
+        sizes[str(width)] = storage.save(target, ContentFile(data))
+    return {'source': name, 'sizes': sizes}
+
+
+def _overwrites(storage):
+    """True when save() replaces an existing file of the same name (file_overwrite S3 storages)."""
+    return bool(getattr(storage, 'file_overwrite', False) or getattr(storage, 'allow_overwrite', False))
+
+
+def delete_derivatives(storage, derivatives, keep=()):
+    """Delete the files of a derivative map, except names in `keep`; failures are logged, not raised."""
+    for name in ((derivatives or {}).get('sizes') or {}).values():
+        if name in keep:
+            continue
+        try:
+            storage.delete(name)
+        except Exception:
+            logger.exception('Could not delete image derivative %s', name)
+
+
+def is_current(derivatives, name):
+    return bool(name) and (derivatives or {}).get('source') == name
+
+
+def srcset(storage, derivatives):
+    """{width: url} for a derivative map ({} when none are ready)."""
+    sizes = (derivatives or {}).get('sizes') or {}
+    urls = {}
+    for width, name in sorted(sizes.items(), key=lambda item: int(item[0])):
+        try:
+            urls[width] = storage.url(name)
+        except Exception:
+            continue
+    return urls
+
+
+def storage_name_from_url(storage, url):
+    """Map a stored file URL (as kept in PublicProfile.images) back to its storage name."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    base = urlparse(storage.url('_'))
+    if base.netloc and parsed.netloc and parsed.netloc != base.netloc:
+        return None
+    path = unquote(parsed.path)
+    base_path = base.path[:-1]
+    if base_path:
+        if not path.startswith(base_path):
+            return None
+        path = path[len(base_path):]
+    return path.lstrip('/') or None
+
+
+# ======================
+# JOBS
+# ======================
+
+def build_post_media_derivatives(media_id):
+    from posts.models import PostMedia
+
+    media = PostMedia.objects.filter(id=media_id, media_type='image').first()
+    if media is None or not media.media_file or is_current(media.derivatives, media.media_file.name):
+        return
+    derivatives = generate(media.media_file.storage, media.media_file.name)
+    PostMedia.objects.filter(id=media_id, media_file=media.media_file.name).update(derivatives=derivatives)
+
+
+def build_user_image_derivatives(user_id):
+    from .models import User
+
+    user = User.objects.filter(id=user_id).first()
+    if user is None or not user.image or is_current(user.image_derivatives, user.image.name):
+        return
+    user.image_derivatives = generate(user.image.storage, user.image.name)
+    # save() (not update()) so cached author cards are invalidated by their signal
+    user.save(update_fields=['image_derivatives'])
+
+
+def profile_images_storage():
+    """Storage PublicProfile.images are uploaded to (see PublicProfileViewSet.upload_image)."""
+    global _profile_images_storage
+    if _profile_images_storage is None:
+        from storages.backends.s3boto3 import S3Boto3Storage
+
+        # Overwrite in place so re-rendered derivatives keep their names (no HEAD request per save)
+        _profile_images_storage = S3Boto3Storage(file_overwrite=True)
+    return _profile_images_storage
+
+
+def profile_needs_derivatives(profile, storage=None):
+    if not profile.images and not profile.image_derivatives:
+        return False
+    storage = storage or profile_images_storage()
+    names = {storage_name_from_url(storage, url) for url in profile.images or []} - {None}
+    existing = profile.image_derivatives or {}
+    return names != set(existing) or any(not is_current(existing[name], name) for name in names)
+
+
+def profile_images_srcset(profile, storage=None):
+    """One {width: url} map per entry of profile.images ({} where none are ready)."""
+    images = profile.images or []
+    derivatives = profile.image_derivatives or {}
+    if not derivatives:
+        return [{} for _ in images]
+    storage = storage or profile_images_storage()
+    return [srcset(storage, derivatives.get(storage_name_from_url(storage, url))) for url in images]
+
+
+def _profile_image_names(storage, profile):
+    names = [storage_name_from_url(storage, url) for url in profile.images or []]
+    return [name for name in names if name]
+
+
+def build_profile_image_derivatives(profile_id, storage=None):
+    """
+    Render missing derivatives without holding the profile's row lock, then lock
+    it only to merge them into the images it has now. Derivative files of
+    images no longer on the profile are deleted.
+    """
+    from .models import PublicProfile
+
+    storage = storage or profile_images_storage()
+    profile = PublicProfile.objects.filter(id=profile_id).first()
+    if profile is None:
+        return
+    existing = profile.image_derivatives or {}
+    rendered = {}
+    for name in _profile_image_names(storage, profile):
+        if name in rendered or is_current(existing.get(name), name):
+            continue
+        try:
+            rendered[name] = generate(storage, name)
+        except Exception:
+            logger.exception('Could not build derivatives for profile %s image %s', profile_id, name)
+
+    with transaction.atomic():
+        profile = PublicProfile.objects.select_for_update().filter(id=profile_id).first()
+        if profile is None:
+            existing, derivatives = {}, {}
+        else:
+            # Images added since the first read are picked up by the job their save queued
+            existing = profile.image_derivatives or {}
+            derivatives = {}
+            for name in _profile_image_names(storage, profile):
+                if is_current(existing.get(name), name):
+                    derivatives[name] = existing[name]
+                elif name in rendered:
+                    derivatives[name] = rendered[name]
+            if derivatives != existing:
+                profile.image_derivatives = derivatives
+                profile.save(update_fields=['image_derivatives'])
+
+    kept = {
+        size for derivative in derivatives.values() for size in (derivative.get('sizes') or {}).values()
+    }
+    for derivative in [*existing.values(), *rendered.values()]:
+        delete_derivatives(storage, derivative, keep=kept)
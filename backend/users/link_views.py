@@ -4,19 +4,20 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
-import json
 from .profile_models import (
     PlaceProfessionalLink,
     LinkedAvailabilitySchedule,
     LinkedTimeSlot,
 )
-from .models import User, ProfessionalProfile, PlaceProfile, PublicProfile
+from .models import User, ProfessionalProfile, PlaceProfile, PublicProfile, PublicProfileCategoryToken
 from .profile_serializers import (
     PlaceProfessionalLinkSerializer,
     LinkedAvailabilityScheduleSerializer,
     LinkedTimeSlotSerializer,
 )
-from notifications.signals import create_system_notification
+from notifications.fanout import build_notification, create_notifications
+from notifications.models import Notification
+from services.category_rules import get_profile_category_names, get_profile_category_tokens
 
 
 class PlaceProfessionalLinkViewSet(viewsets.ModelViewSet):
@@ -99,60 +100,32 @@ class PlaceProfessionalLinkViewSet(viewsets.ModelViewSet):
         
         professional = get_object_or_404(ProfessionalProfile, id=professional_id)
         
-        # Get categories from PublicProfile (where they are actually edited and stored)
-        try:
-            place_public_profile = place.user.public_profile
-            place_categories = place_public_profile.category if isinstance(place_public_profile.category, list) else ([place_public_profile.category] if place_public_profile.category else [])
-        except PublicProfile.DoesNotExist:
-            # Fallback to PlaceProfile category if PublicProfile doesn't exist
-            place_categories = place.category if isinstance(place.category, list) else ([place.category] if place.category else [])
-        
-        try:
-            professional_public_profile = professional.user.public_profile
-            professional_categories = professional_public_profile.category if isinstance(professional_public_profile.category, list) else ([professional_public_profile.category] if professional_public_profile.category else [])
-        except PublicProfile.DoesNotExist:
-            # Fallback to ProfessionalProfile category if PublicProfile doesn't exist
-            professional_categories = professional.category if isinstance(professional.category, list) else ([professional.category] if professional.category else [])
-        
-        # Handle case where category might be a stringified JSON array (from migration issues)
-        def normalize_category_list(categories):
-            """Normalize category list, handling stringified JSON arrays"""
-            if not categories:
-                return []
-            result = []
-            for cat in categories:
-                if isinstance(cat, str):
-                    # Check if it's a stringified JSON array
-                    if cat.strip().startswith('[') and cat.strip().endswith(']'):
-                        try:
-                            parsed = json.loads(cat)
-                            if isinstance(parsed, list):
-                                result.extend(parsed)
-                            else:
-                                result.append(cat)
-                        except (json.JSONDecodeError, ValueError):
-                            result.append(cat)
-                    else:
-                        result.append(cat)
-                else:
-                    result.append(cat)
-            return result
-        
-        place_categories = normalize_category_list(place_categories)
-        professional_categories = normalize_category_list(professional_categories)
-        
-        # Normalize categories to strings for comparison
-        place_categories = [str(cat).strip().lower() for cat in place_categories if cat]
-        professional_categories = [str(cat).strip().lower() for cat in professional_categories if cat]
-        
-        # Check if there's any intersection
-        common_categories = set(place_categories) & set(professional_categories)
-        
-        if not common_categories:
+        # Categories are edited and stored on PublicProfile; fall back to the legacy
+        # Place/ProfessionalProfile categories when a public profile doesn't exist
+        place_public_profile = PublicProfile.objects.filter(user_id=place.user_id).first()
+        professional_public_profile = PublicProfile.objects.filter(user_id=professional.user_id).first()
+
+        if place_public_profile and professional_public_profile:
+            # Intersect the normalized category token index instead of parsing JSON here
+            has_common_category = PublicProfileCategoryToken.objects.filter(
+                profile=place_public_profile,
+                kind=PublicProfileCategoryToken.Kind.CATEGORY,
+                token__in=PublicProfileCategoryToken.objects.filter(
+                    profile=professional_public_profile,
+                    kind=PublicProfileCategoryToken.Kind.CATEGORY,
+                ).values('token'),
+            ).exists()
+        else:
+            has_common_category = bool(
+                get_profile_category_tokens(place_public_profile or place)
+                & get_profile_category_tokens(professional_public_profile or professional)
+            )
+
+        if not has_common_category:
             return Response({
                 'detail': 'No se puede enviar la invitación. El establecimiento y el profesional deben tener al menos una categoría principal en común.',
-                'place_categories': place_categories,
-                'professional_categories': professional_categories
+                'place_categories': get_profile_category_names(place_public_profile or place),
+                'professional_categories': get_profile_category_names(professional_public_profile or professional),
             }, status=status.HTTP_400_BAD_REQUEST)
         
         link, created = PlaceProfessionalLink.objects.get_or_create(
@@ -168,36 +141,40 @@ class PlaceProfessionalLinkViewSet(viewsets.ModelViewSet):
 
         # Create notifications for both parties
         try:
-            # To invited professional
-            create_system_notification(
-                professional.user,
-                title="Invitación a establecimiento",
-                message=f"{place.name} te invitó a vincularte como profesional.",
-                metadata={
-                    'link_id': link.id,
-                    'status': link.status,
-                    'place_id': place.id,
-                    'place_name': getattr(place, 'name', ''),
-                    'professional_id': professional.id,
-                    'professional_name': getattr(professional, 'name', ''),
-                    'invited_by_email': user.email,
-                },
-            )
-            # Confirmation to place
-            create_system_notification(
-                place.user,
-                title="Invitación enviada",
-                message=f"Se envió una invitación a {getattr(professional, 'name', '')}.",
-                metadata={
-                    'link_id': link.id,
-                    'status': link.status,
-                    'place_id': place.id,
-                    'place_name': getattr(place, 'name', ''),
-                    'professional_id': professional.id,
-                    'professional_name': getattr(professional, 'name', ''),
-                    'invited_by_email': user.email,
-                },
-            )
+            create_notifications([
+                # To invited professional
+                build_notification(
+                    professional.user,
+                    Notification.NotificationType.SYSTEM,
+                    title="Invitación a establecimiento",
+                    message=f"{place.name} te invitó a vincularte como profesional.",
+                    metadata={
+                        'link_id': link.id,
+                        'status': link.status,
+                        'place_id': place.id,
+                        'place_name': getattr(place, 'name', ''),
+                        'professional_id': professional.id,
+                        'professional_name': getattr(professional, 'name', ''),
+                        'invited_by_email': user.email,
+                    },
+                ),
+                # Confirmation to place
+                build_notification(
+                    place.user,
+                    Notification.NotificationType.SYSTEM,
+                    title="Invitación enviada",
+                    message=f"Se envió una invitación a {getattr(professional, 'name', '')}.",
+                    metadata={
+                        'link_id': link.id,
+                        'status': link.status,
+                        'place_id': place.id,
+                        'place_name': getattr(place, 'name', ''),
+                        'professional_id': professional.id,
+                        'professional_name': getattr(professional, 'name', ''),
+                        'invited_by_email': user.email,
+                    },
+                ),
+            ])
         except Exception:
             # Notifications should not break the flow
             pass
@@ -245,32 +222,36 @@ class PlaceProfessionalLinkViewSet(viewsets.ModelViewSet):
 
         # Notify both parties
         try:
-            create_system_notification(
-                link.place.user,
-                title="Invitación aceptada",
-                message=f"{getattr(link.professional, 'name', '')} aceptó tu invitación.",
-                metadata={
-                    'link_id': link.id,
-                    'status': link.status,
-                    'place_id': link.place.id,
-                    'place_name': getattr(link.place, 'name', ''),
-                    'professional_id': link.professional.id,
-                    'professional_name': getattr(link.professional, 'name', ''),
-                },
-            )
-            create_system_notification(
-                link.professional.user,
-                title="Vinculación confirmada",
-                message=f"Ahora estás vinculado con {getattr(link.place, 'name', '')}.",
-                metadata={
-                    'link_id': link.id,
-                    'status': link.status,
-                    'place_id': link.place.id,
-                    'place_name': getattr(link.place, 'name', ''),
-                    'professional_id': link.professional.id,
-                    'professional_name': getattr(link.professional, 'name', ''),
-                },
-            )
+            create_notifications([
+                build_notification(
+                    link.place.user,
+                    Notification.NotificationType.SYSTEM,
+                    title="Invitación aceptada",
+                    message=f"{getattr(link.professional, 'name', '')} aceptó tu invitación.",
+                    metadata={
+                        'link_id': link.id,
+                        'status': link.status,
+                        'place_id': link.place.id,
+                        'place_name': getattr(link.place, 'name', ''),
+                        'professional_id': link.professional.id,
+                        'professional_name': getattr(link.professional, 'name', ''),
+                    },
+                ),
+                build_notification(
+                    link.professional.user,
+                    Notification.NotificationType.SYSTEM,
+                    title="Vinculación confirmada",
+                    message=f"Ahora estás vinculado con {getattr(link.place, 'name', '')}.",
+                    metadata={
+                        'link_id': link.id,
+                        'status': link.status,
+                        'place_id': link.place.id,
+                        'place_name': getattr(link.place, 'name', ''),
+                        'professional_id': link.professional.id,
+                        'professional_name': getattr(link.professional, 'name', ''),
+                    },
+                ),
+            ])
         except Exception:
             pass
         return Response(self.get_serializer(link).data)
@@ -305,32 +286,36 @@ class PlaceProfessionalLinkViewSet(viewsets.ModelViewSet):
 
         # Notify both parties
         try:
-            create_system_notification(
-                link.place.user,
-                title="Invitación rechazada",
-                message=f"{getattr(link.professional, 'name', '')} rechazó tu invitación.",
-                metadata={
-                    'link_id': link.id,
-                    'status': link.status,
-                    'place_id': link.place.id,
-                    'place_name': getattr(link.place, 'name', ''),
-                    'professional_id': link.professional.id,
-                    'professional_name': getattr(link.professional, 'name', ''),
-                },
-            )
-            create_system_notification(
-                link.professional.user,
-                title="Invitación rechazada",
-                message=f"Has rechazado la invitación de {getattr(link.place, 'name', '')}.",
-                metadata={
-                    'link_id': link.id,
-                    'status': link.status,
-                    'place_id': link.place.id,
-                    'place_name': getattr(link.place, 'name', ''),
-                    'professional_id': link.professional.id,
-                    'professional_name': getattr(link.professional, 'name', ''),
-                },
-            )
+            create_notifications([
+                build_notification(
+                    link.place.user,
+                    Notification.NotificationType.SYSTEM,
+                    title="Invitación rechazada",
+                    message=f"{getattr(link.professional, 'name', '')} rechazó tu invitación.",
+                    metadata={
+                        'link_id': link.id,
+                        'status': link.status,
+                        'place_id': link.place.id,
+                        'place_name': getattr(link.place, 'name', ''),
+                        'professional_id': link.professional.id,
+                        'professional_name': getattr(link.professional, 'name', ''),
+                    },
+                ),
+                build_notification(
+                    link.professional.user,
+                    Notification.NotificationType.SYSTEM,
+                    title="Invitación rechazada",
+                    message=f"Has rechazado la invitación de {getattr(link.place, 'name', '')}.",
+                    metadata={
+                        'link_id': link.id,
+                        'status': link.status,
+                        'place_id': link.place.id,
+                        'place_name': getattr(link.place, 'name', ''),
+                        'professional_id': link.professional.id,
+                        'professional_name': getattr(link.professional, 'name', ''),
+                    },
+                ),
+            ])
         except Exception:
             pass
         return Response(self.get_serializer(link).data)
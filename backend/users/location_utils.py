@@ -1,12 +1,14 @@
 import math
 from typing import Iterable, List, Optional, Tuple
 
+EARTH_RADIUS_KM = 6371.0
+
 
 def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
     Calculate distance in kilometers between two coordinates using Haversine formula.
     """
-    radius_km = 6371.0
+    radius_km = EARTH_RADIUS_KM
     phi1 = math.radians(lat1)
     phi2 = math.radians(lat2)
     delta_phi = math.radians(lat2 - lat1)
@@ -17,11 +19,42 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     return radius_km * c
 
 
-def _get_coords(item) -> Tuple[Optional[float], Optional[float]]:
+def bounding_box(latitude: float, longitude: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km.
+    """
+    lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6 or abs(latitude) + lat_delta >= 90:
+        lng_delta = 180.0
+    else:
+        lng_delta = min(math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+
+def within_bounding_box(queryset, latitude: float, longitude: float, radius_km: float):
     """
-    Get coordinates from item. Checks User model first (user.latitude, user.longitude),
-    then falls back to PublicProfile coordinates for backward compatibility.
+    Narrow a PublicProfile queryset to the box around a point using the indexed
+    geo_latitude/geo_longitude columns. Exact distances still need calculate_distance.
     """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(geo_latitude__range=(min_lat, max_lat))
+    if max_lng - min_lng >= 360:
+        return queryset.filter(geo_longitude__isnull=False)
+    return queryset.filter(geo_longitude__range=(min_lng, max_lng))
+
+
+def get_coords(item) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Get coordinates from item. Uses the denormalized effective location
+    (geo_latitude/geo_longitude) when present, otherwise checks the User model
+    first and then falls back to PublicProfile coordinates.
+    """
+    geo_latitude = getattr(item, "geo_latitude", None)
+    geo_longitude = getattr(item, "geo_longitude", None)
+    if geo_latitude is not None and geo_longitude is not None:
+        return geo_latitude, geo_longitude
+
     # First try to get from User model (preferred - coordinates are now stored in User)
     if hasattr(item, 'user'):
         user = item.user
@@ -50,7 +83,7 @@ def annotate_distance(items: Iterable, latitude: float, longitude: float) -> Lis
     """
     annotated = []
     for item in items:
-        item_lat, item_lng = _get_coords(item)
+        item_lat, item_lng = get_coords(item)
         if item_lat is None or item_lng is None:
             setattr(item, "distance_km", None)
         else:
@@ -65,7 +98,7 @@ def filter_by_radius(items: Iterable, latitude: float, longitude: float, radius_
     """
     filtered = []
     for item in items:
-        item_lat, item_lng = _get_coords(item)
+        item_lat, item_lng = get_coords(item)
         if item_lat is None or item_lng is None:
             continue
         distance = calculate_distance(latitude, longitude, item_lat, item_lng)
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from users.models import PublicProfile
+
+
+class Command(BaseCommand):
+    help = 'Recompute the denormalized effective location (geo_latitude/geo_longitude) of public profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of profiles written per bulk update'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        batch = []
+        total = 0
+        for profile in PublicProfile.objects.select_related('user').iterator(chunk_size=batch_size):
+            location = profile.compute_effective_location()
+            if location == (profile.geo_latitude, profile.geo_longitude):
+                continue
+            profile.geo_latitude, profile.geo_longitude = location
+            batch.append(profile)
+            if len(batch) >= batch_size:
+                PublicProfile.objects.bulk_update(batch, ['geo_latitude', 'geo_longitude'])
+                total += len(batch)
+                batch = []
+        if batch:
+            PublicProfile.objects.bulk_update(batch, ['geo_latitude', 'geo_longitude'])
+            total += len(batch)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Updated effective location for {total} profiles')
+        )
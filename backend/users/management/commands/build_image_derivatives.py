@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import PostMedia
+from users import image_derivatives
+from users.models import PublicProfile, User
+
+
+class Command(BaseCommand):
+    help = 'Build resized WebP derivatives for post media and profile images uploaded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--only',
+            choices=['posts', 'users', 'profiles'],
+            help='Limit the backfill to one kind of image',
+        )
+
+    def _build(self, label, job, ids):
+        built = failed = 0
+        for pk in ids:
+            try:
+                job(pk)
+                built += 1
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'{label} {pk}: {exc}')
+        self.stdout.write(f'{label}: {built} processed, {failed} failed')
+
+    def handle(self, *args, **options):
+        only = options['only']
+        if only in (None, 'posts'):
+            ids = PostMedia.objects.filter(media_type='image').exclude(media_file='').values_list('id', flat=True)
+            self._build('post media', image_derivatives.build_post_media_derivatives, ids.iterator())
+        if only in (None, 'users'):
+            ids = User.objects.exclude(image='').exclude(image__isnull=True).values_list('id', flat=True)
+            self._build('user images', image_derivatives.build_user_image_derivatives, ids.iterator())
+        if only in (None, 'profiles'):
+            ids = PublicProfile.objects.exclude(images=[]).values_list('id', flat=True)
+            self._build('profile images', image_derivatives.build_profile_image_derivatives, ids.iterator())
+        self.stdout.write(self.style.SUCCESS('Image derivatives are up to date'))
@@ -0,0 +1,95 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations.models import Reservation
+from users.models import PlaceProfile, ProfessionalProfile, PublicProfile, User
+from users.ranking import get_ranking_weights, rank_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Offline evaluation of recommendation ranking: replays clients with a saved location '
+        'against the providers they actually booked and reports hit rate@k and MRR, '
+        'compared with the distance-only baseline'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='k: number of recommendations per client')
+        parser.add_argument('--radius', type=float, default=10.0, help='Search radius in km')
+        parser.add_argument('--max-users', type=int, default=500, help='Maximum clients to replay')
+        parser.add_argument(
+            '--weights',
+            type=str,
+            help='JSON object overriding ranking weights, e.g. \'{"rating": 0.4}\''
+        )
+
+    def handle(self, *args, **options):
+        try:
+            overrides = json.loads(options['weights']) if options['weights'] else None
+        except ValueError as exc:
+            raise CommandError(f'Invalid --weights JSON: {exc}')
+
+        booked = self._booked_profiles_by_user()
+        clients = User.objects.filter(
+            id__in=list(booked.keys()),
+            latitude__isnull=False,
+            longitude__isnull=False,
+        )[:options['max_users']]
+
+        candidates = list(PublicProfile.objects.select_related('user', 'ranking_features'))
+        variants = {
+            'baseline (distance only)': {'distance': 1.0, 'rating': 0, 'reviews': 0, 'favorites': 0, 'availability': 0},
+            'ranking': get_ranking_weights(overrides),
+        }
+
+        evaluated = 0
+        results = {name: {'hits': 0, 'reciprocal_rank': 0.0} for name in variants}
+        for client in clients:
+            targets = booked[client.id]
+            evaluated += 1
+            for name, weights in variants.items():
+                ranked = rank_profiles(
+                    candidates,
+                    float(client.latitude),
+                    float(client.longitude),
+                    options['radius'],
+                    options['limit'],
+                    weights=weights,
+                )
+                for position, profile in enumerate(ranked, start=1):
+                    if profile.id in targets:
+                        results[name]['hits'] += 1
+                        results[name]['reciprocal_rank'] += 1.0 / position
+                        break
+
+        if not evaluated:
+            self.stdout.write(self.style.WARNING('No clients with location and bookings to evaluate'))
+            return
+
+        self.stdout.write(f'Evaluated {evaluated} clients (k={options["limit"]}, radius={options["radius"]}km)')
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name}: hit_rate@k={metrics["hits"] / evaluated:.3f} '
+                f'mrr={metrics["reciprocal_rank"] / evaluated:.3f}'
+            )
+
+    def _booked_profiles_by_user(self):
+        """Map client user id -> set of PublicProfile ids they booked (confirmed/completed)."""
+        provider_users = {}
+        for model in (ProfessionalProfile, PlaceProfile):
+            content_type = ContentType.objects.get_for_model(model)
+            for provider_id, user_id in model.objects.values_list('id', 'user_id'):
+                provider_users[(content_type.id, provider_id)] = user_id
+        profile_by_user = dict(PublicProfile.objects.values_list('user_id', 'id'))
+
+        booked = {}
+        reservations = Reservation.objects.filter(
+            status__in=[Reservation.Status.CONFIRMED, Reservation.Status.COMPLETED]
+        ).values_list('client__user_id', 'provider_content_type_id', 'provider_object_id')
+        for client_user_id, content_type_id, provider_id in reservations:
+            profile_id = profile_by_user.get(provider_users.get((content_type_id, provider_id)))
+            if profile_id:
+                booked.setdefault(client_user_id, set()).add(profile_id)
+        return booked
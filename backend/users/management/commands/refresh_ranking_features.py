@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from users.models import PublicProfile
+from users.ranking import refresh_ranking_features
+
+
+class Command(BaseCommand):
+    help = 'Recompute recommendation ranking features (backfill and drift repair)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--profile-id',
+            type=int,
+            help='Only refresh a specific public profile'
+        )
+
+    def handle(self, *args, **options):
+        profiles = PublicProfile.objects.all()
+        if options['profile_id']:
+            profiles = profiles.filter(id=options['profile_id'])
+
+        total = 0
+        for profile in profiles.iterator():
+            refresh_ranking_features(profile)
+            total += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Refreshed ranking features for {total} profiles')
+        )
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_category_tokens(apps, schema_editor):
+    """Index categories of existing public profiles."""
+    from services.category_rules import category_tokens
+
+    PublicProfile = apps.get_model('users', 'PublicProfile')
+    PublicProfileCategoryToken = apps.get_model('users', 'PublicProfileCategoryToken')
+    batch = []
+    for profile in PublicProfile.objects.only('id', 'category', 'sub_categories').iterator():
+        for kind, value in (('category', profile.category), ('subcategory', profile.sub_categories)):
+            for token in category_tokens(value):
+                batch.append(PublicProfileCategoryToken(profile_id=profile.id, kind=kind, token=token[:100]))
+        if len(batch) >= 1000:
+            PublicProfileCategoryToken.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        PublicProfileCategoryToken.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0028_allow_blank_description_customservice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PublicProfileCategoryToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('category', 'Category'), ('subcategory', 'Sub-category')], max_length=12)),
+                ('token', models.CharField(max_length=100)),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_tokens', to='users.publicprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'token'], name='users_publi_kind_a6f3d5_idx')],
+                'unique_together': {('profile', 'kind', 'token')},
+            },
+        ),
+        migrations.RunPython(backfill_category_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0029_public_profile_category_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileRankingFeatures',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('favorites_count', models.PositiveIntegerField(default=0)),
+                ('available_weekdays', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('profile', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ranking_features', to='users.publicprofile')),
+            ],
+        ),
+    ]
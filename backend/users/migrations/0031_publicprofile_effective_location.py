@@ -0,0 +1,48 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:05
+
+from django.db import migrations, models
+
+
+def backfill_effective_location(apps, schema_editor):
+    """Copy user coordinates (or legacy profile coordinates) into geo_latitude/geo_longitude."""
+    PublicProfile = apps.get_model('users', 'PublicProfile')
+    batch = []
+    for profile in PublicProfile.objects.select_related('user').iterator(chunk_size=500):
+        user = profile.user
+        if user.latitude is not None and user.longitude is not None:
+            profile.geo_latitude, profile.geo_longitude = float(user.latitude), float(user.longitude)
+        elif profile.latitude is not None and profile.longitude is not None:
+            profile.geo_latitude, profile.geo_longitude = float(profile.latitude), float(profile.longitude)
+        else:
+            continue
+        batch.append(profile)
+        if len(batch) >= 500:
+            PublicProfile.objects.bulk_update(batch, ['geo_latitude', 'geo_longitude'])
+            batch = []
+    if batch:
+        PublicProfile.objects.bulk_update(batch, ['geo_latitude', 'geo_longitude'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0030_profile_ranking_features'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publicprofile',
+            name='geo_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='publicprofile',
+            name='geo_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='publicprofile',
+            index=models.Index(fields=['geo_latitude', 'geo_longitude'], name='users_publi_geo_lat_a68027_idx'),
+        ),
+        migrations.RunPython(backfill_effective_location, migrations.RunPython.noop),
+    ]
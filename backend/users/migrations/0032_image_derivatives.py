@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 03:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0031_publicprofile_effective_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='publicprofile',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
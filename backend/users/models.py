@@ -1,3 +1,5 @@
+import copy
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
@@ -47,6 +49,8 @@ class User(AbstractUser):
     
     # Profile image for all users - use custom S3 storage for signed URLs
     image = models.ImageField(upload_to="users/images/", storage=UserImageStorage(), blank=True, null=True)
+    # Resized WebP copies of image (see users.image_derivatives)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     
     # Address and location for all users
     address = models.CharField(max_length=500, blank=True, null=True, help_text="Full address string")
@@ -303,11 +307,18 @@ class PublicProfile(models.Model):
     category = models.JSONField(default=list, blank=True, help_text="List of main categories")
     sub_categories = models.JSONField(default=list, blank=True, help_text="List of sub-categories")
     images = models.JSONField(default=list, blank=True, help_text="List of image URLs/paths")
+    # {storage name of an image: derivative map} for images (see users.image_derivatives)
+    image_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     linked_pros_place = models.JSONField(default=list, blank=True, help_text="List of linked professional/place IDs")
     has_calendar = models.BooleanField(default=False, help_text="Whether this profile has calendar functionality")
     # Geolocation (only for PROFESSIONAL and PLACE)
     latitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    # Effective location used by all geo queries: user.latitude/longitude when set, otherwise the
+    # profile coordinates above. Denormalized as floats; refreshed on save() and by users.signals
+    # when the user's coordinates change.
+    geo_latitude = models.FloatField(null=True, blank=True, editable=False)
+    geo_longitude = models.FloatField(null=True, blank=True, editable=False)
     
     # Place-specific fields
     street = models.CharField(max_length=200, blank=True, null=True)
@@ -327,13 +338,117 @@ class PublicProfile(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['geo_latitude', 'geo_longitude']),
+        ]
     
     def __str__(self):
         return f"{self.profile_type}: {self.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot_category()
+        return instance
+
+    def _snapshot_category(self):
+        if 'category' not in self.get_deferred_fields():
+            self._loaded_category = copy.deepcopy(self.category)
+
+    def loaded_category(self):
+        """category as of the last load or save (None for instances never saved or loaded)"""
+        return getattr(self, '_loaded_category', None)
+
+    def save(self, *args, **kwargs):
+        self.geo_latitude, self.geo_longitude = self.compute_effective_location()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude', 'user'}.intersection(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geo_latitude', 'geo_longitude'}
+        super().save(*args, **kwargs)
+        # post_save handlers have seen the previous categories; the saved ones are the baseline from now on
+        if update_fields is None or 'category' in update_fields:
+            self._snapshot_category()
+    
+    def compute_effective_location(self, user=None):
+        """Return (lat, lng) as floats: user coordinates first, then profile coordinates."""
+        if user is None and self.user_id:
+            user = self.user
+        if user is not None and user.latitude is not None and user.longitude is not None:
+            return float(user.latitude), float(user.longitude)
+        if self.latitude is not None and self.longitude is not None:
+            return float(self.latitude), float(self.longitude)
+        return None, None
+    
     @property
     def display_name(self):
         """Get display name based on profile type"""
         if self.profile_type == 'PROFESSIONAL' and self.last_name:
             return f"{self.name} {self.last_name}"
-        return self.name
\ No newline at end of file
+        return self.name
+
+class PublicProfileCategoryToken(models.Model):
+    """
+    Inverted index of normalized category/sub-category tokens for PublicProfile.
+    Kept in sync from PublicProfile.category/sub_categories on save (see users.signals),
+    so category browsing is an index probe instead of JSON containment.
+    """
+
+    class Kind(models.TextChoices):
+        CATEGORY = "category", "Category"
+        SUBCATEGORY = "subcategory", "Sub-category"
+
+    profile = models.ForeignKey(PublicProfile, on_delete=models.CASCADE, related_name="category_tokens")
+    kind = models.CharField(max_length=12, choices=Kind.choices)
+    token = models.CharField(max_length=100)
+
+    class Meta:
+        unique_together = ('profile', 'kind', 'token')
+        indexes = [
+            models.Index(fields=['kind', 'token']),
+        ]
+
+    def __str__(self):
+        return f"{self.profile_id} {self.kind}:{self.token}"
+
+    @classmethod
+    def tokens_for(cls, profile):
+        """Return the set of (kind, token) pairs a profile should be indexed under."""
+        from services.category_rules import category_tokens
+
+        pairs = {(cls.Kind.CATEGORY, token) for token in category_tokens(profile.category)}
+        pairs |= {(cls.Kind.SUBCATEGORY, token) for token in category_tokens(profile.sub_categories)}
+        return {(kind, token[:100]) for kind, token in pairs}
+
+    @classmethod
+    def sync_for_profile(cls, profile):
+        """Bring the index rows for a profile in line with its current category fields."""
+        wanted = cls.tokens_for(profile)
+        existing = {
+            (row['kind'], row['token']): row['id']
+            for row in cls.objects.filter(profile=profile).values('id', 'kind', 'token')
+        }
+        stale_ids = [row_id for pair, row_id in existing.items() if pair not in wanted]
+        if stale_ids:
+            cls.objects.filter(id__in=stale_ids).delete()
+        missing = wanted - existing.keys()
+        if missing:
+            cls.objects.bulk_create(
+                [cls(profile=profile, kind=kind, token=token) for kind, token in missing],
+                ignore_conflicts=True,
+            )
+
+
+class ProfileRankingFeatures(models.Model):
+    """
+    Precomputed per-profile inputs for the recommendations ranking (see users.ranking).
+    Counters are maintained incrementally by signals; refresh_ranking_features repairs drift.
+    """
+    profile = models.OneToOneField(PublicProfile, on_delete=models.CASCADE, related_name="ranking_features")
+    review_count = models.PositiveIntegerField(default=0)
+    favorites_count = models.PositiveIntegerField(default=0)
+    # Bit N is set when the provider has working hours on weekday N (0 = Monday)
+    available_weekdays = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ranking features for profile {self.profile_id}"
@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from django.contrib.contenttypes.models import ContentType
+from . import image_derivatives
 from .models import PublicProfile, User, ProfessionalProfile, PlaceProfile
 from .profile_models import AvailabilitySchedule
 from .profile_serializers import AvailabilityScheduleSerializer
@@ -15,6 +16,8 @@ class PublicProfileSerializer(serializers.ModelSerializer):
     user_country = serializers.CharField(source='user.country', read_only=True)
     user_address = serializers.CharField(source='user.address', read_only=True)
     user_image = serializers.SerializerMethodField()
+    user_image_srcset = serializers.SerializerMethodField()
+    images_srcset = serializers.SerializerMethodField()
     display_name = serializers.CharField(read_only=True)
     availability = serializers.SerializerMethodField()
     professional_profile_id = serializers.SerializerMethodField()
@@ -44,14 +47,27 @@ class PublicProfileSerializer(serializers.ModelSerializer):
                         return request.build_absolute_uri(image_url)
                 return image_url
         return None
+
+    def get_user_image_srcset(self, obj):
+        """Resized WebP copies of user_image as {width: url}"""
+        if obj.user and obj.user.image:
+            return image_derivatives.srcset(obj.user.image.storage, obj.user.image_derivatives)
+        return {}
+
+    def get_images_srcset(self, obj):
+        """One {width: url} map per entry of images ({} until built)"""
+        try:
+            return image_derivatives.profile_images_srcset(obj)
+        except Exception:
+            return [{} for _ in obj.images or []]
     
     class Meta:
         model = PublicProfile
         fields = [
             'id', 'user', 'user_email', 'user_first_name', 'user_last_name', 
-            'user_phone', 'user_country', 'user_address', 'user_image',
+            'user_phone', 'user_country', 'user_address', 'user_image', 'user_image_srcset',
             'profile_type', 'name', 'description', 'category', 'sub_categories',
-            'images', 'linked_pros_place', 'has_calendar',
+            'images', 'images_srcset', 'linked_pros_place', 'has_calendar',
             'street', 'number_ext', 'number_int', 'postal_code', 'city', 'country',
             'last_name', 'bio', 'rating', 'display_name', 'availability',
             'professional_profile_id', 'place_profile_id',
@@ -142,16 +158,12 @@ class PublicProfileSerializer(serializers.ModelSerializer):
         return getattr(obj, "distance_km", None)
 
     def get_latitude(self, obj):
-        """Get latitude from User model (preferred) or PublicProfile (fallback)"""
-        if obj.user and getattr(obj.user, "latitude", None) is not None:
-            return float(obj.user.latitude)
-        return float(obj.latitude) if obj.latitude is not None else None
+        """Effective latitude (User coordinates, falling back to the profile's)"""
+        return obj.geo_latitude
 
     def get_longitude(self, obj):
-        """Get longitude from User model (preferred) or PublicProfile (fallback)"""
-        if obj.user and getattr(obj.user, "longitude", None) is not None:
-            return float(obj.user.longitude)
-        return float(obj.longitude) if obj.longitude is not None else None
+        """Effective longitude (User coordinates, falling back to the profile's)"""
+        return obj.geo_longitude
 
 
 class PublicProfileCreateSerializer(serializers.ModelSerializer):
@@ -269,15 +281,9 @@ class PublicProfileListSerializer(serializers.ModelSerializer):
         return getattr(obj, "distance_km", None)
     
     def get_latitude(self, obj):
-        """Get latitude from User model (preferred) or PublicProfile (fallback)"""
-        if obj.user and obj.user.latitude is not None:
-            return float(obj.user.latitude)
-        # Fallback to PublicProfile coordinates for backward compatibility
-        return float(obj.latitude) if obj.latitude is not None else None
+        """Effective latitude (User coordinates, falling back to the profile's)"""
+        return obj.geo_latitude
     
     def get_longitude(self, obj):
-        """Get longitude from User model (preferred) or PublicProfile (fallback)"""
-        if obj.user and obj.user.longitude is not None:
-            return float(obj.user.longitude)
-        # Fallback to PublicProfile coordinates for backward compatibility
-        return float(obj.longitude) if obj.longitude is not None else None
\ No newline at end of file
+        """Effective longitude (User coordinates, falling back to the profile's)"""
+        return obj.geo_longitude
\ No newline at end of file
@@ -4,8 +4,11 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.exceptions import NotFound
 from django.db.models import Q
-from .models import PublicProfile, User
-from .location_utils import filter_by_radius
+from services.category_rules import normalize_category_token
+from .models import PublicProfile, PublicProfileCategoryToken, User
+from .location_utils import filter_by_radius, within_bounding_box
+from .ranking import rank_profiles
+from . import discovery_cache
 from .public_profile_serializers import (
     PublicProfileSerializer, 
     PublicProfileCreateSerializer,
@@ -62,11 +65,18 @@ class PublicProfileViewSet(viewsets.ModelViewSet):
         if profile_type:
             queryset = queryset.filter(profile_type=profile_type)
 
-        # Filter by category
-        category = self.request.query_params.get('category')
+        # Filter by category / sub-category (probe the normalized token index)
+        category = normalize_category_token(self.request.query_params.get('category'))
         if category:
             queryset = queryset.filter(
-                Q(category__contains=[category]) | Q(category=category)
+                category_tokens__kind=PublicProfileCategoryToken.Kind.CATEGORY,
+                category_tokens__token=category,
+            )
+        subcategory = normalize_category_token(self.request.query_params.get('subcategory'))
+        if subcategory:
+            queryset = queryset.filter(
+                category_tokens__kind=PublicProfileCategoryToken.Kind.SUBCATEGORY,
+                category_tokens__token=subcategory,
             )
 
         # Optional city param (narrows down further; viewer_city already applied)
@@ -93,13 +103,38 @@ class PublicProfileViewSet(viewsets.ModelViewSet):
                 radius_km = float(radius) if radius is not None else 10.0
             except (TypeError, ValueError):
                 return queryset
-            items = list(queryset)
+            # Indexed bounding-box prefilter, then exact haversine distance on the candidates
+            items = list(within_bounding_box(queryset, latitude, longitude, radius_km))
             items = filter_by_radius(items, latitude, longitude, radius_km)
             items.sort(key=lambda item: item.distance_km if item.distance_km is not None else float("inf"))
             return items
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        """
+        Discovery list. Plain (city, profile_type, category, page) requests are served
+        from the discovery cache with ETag/If-None-Match support.
+        """
+        if not discovery_cache.is_cacheable(request.query_params):
+            return super().list(request, *args, **kwargs)
+
+        key = discovery_cache.build_key(self._viewer_city(), request.query_params)
+        entry = discovery_cache.get_page(key)
+        if entry is None:
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            entry = discovery_cache.store_page(key, response.data)
+
+        if discovery_cache.etag_matches(request, entry['etag']):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a public profile by ID - accessible to all authenticated users."""
         instance = self.get_object()
@@ -159,20 +194,17 @@ class PublicProfileViewSet(viewsets.ModelViewSet):
         if profile_type:
             queryset = queryset.filter(profile_type=profile_type)
         
-        # Filter by radius using user's saved location
-        items = filter_by_radius(
-            list(queryset),
+        # Score candidates within the radius (distance, rating, reviews, favorites,
+        # availability) and keep only the top `limit` for serialization
+        queryset = within_bounding_box(queryset, float(user.latitude), float(user.longitude), radius_km)
+        items = rank_profiles(
+            queryset.select_related('ranking_features'),
             float(user.latitude),
             float(user.longitude),
-            radius_km
+            radius_km,
+            limit,
         )
         
-        # Sort by distance (closest first)
-        items.sort(key=lambda item: item.distance_km if item.distance_km is not None else float("inf"))
-        
-        # Limit results
-        items = items[:limit]
-        
         serializer = PublicProfileListSerializer(items, many=True)
         return Response({
             "results": serializer.data,
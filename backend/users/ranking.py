@@ -0,0 +1,222 @@
+"""
+Ranking engine for public-profile recommendations.
+
+Each candidate within the search radius gets a score that combines distance,
+rating, review count, favorites count and how soon the provider is next
+available. Everything except distance comes from ProfileRankingFeatures, which
+is kept up to date incrementally (see users.signals), so ranking never
+aggregates reviews/favorites per request. Only the top ``limit`` candidates are
+selected (heap selection, no full sort) and handed to the serializer.
+"""
+import heapq
+import math
+from datetime import date as date_cls
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .location_utils import calculate_distance, get_coords
+from .models import PlaceProfile, ProfessionalProfile, ProfileRankingFeatures, PublicProfile
+
+# Favorite content types that point at a provider profile
+PROFILE_FAVORITE_MODELS = {'publicprofile', 'professionalprofile', 'placeprofile'}
+
+DEFAULT_RANKING_WEIGHTS = {
+    'distance': 0.45,
+    'rating': 0.25,
+    'reviews': 0.10,
+    'favorites': 0.10,
+    'availability': 0.10,
+}
+
+# Counts at which the review/favorites signals saturate (log-scaled below that)
+REVIEW_COUNT_SATURATION = 50
+FAVORITES_COUNT_SATURATION = 100
+
+
+def get_ranking_weights(overrides=None):
+    """Default weights, overridden by settings.RECOMMENDATION_WEIGHTS and then `overrides`."""
+    weights = dict(DEFAULT_RANKING_WEIGHTS)
+    weights.update(getattr(settings, 'RECOMMENDATION_WEIGHTS', None) or {})
+    weights.update(overrides or {})
+    return weights
+
+
+def days_until_available(available_weekdays, today=None):
+    """Days from `today` to the next weekday with working hours, or None if never available."""
+    if not available_weekdays:
+        return None
+    weekday = (today or date_cls.today()).weekday()
+    for offset in range(7):
+        if available_weekdays & (1 << ((weekday + offset) % 7)):
+            return offset
+    return None
+
+
+def _log_scaled(count, saturation):
+    if not count:
+        return 0.0
+    return min(math.log1p(count) / math.log1p(saturation), 1.0)
+
+
+def score_candidate(distance_km, radius_km, rating, review_count, favorites_count, days_until, weights):
+    """Weighted sum of normalized [0, 1] signals."""
+    distance_score = 1.0 - min(distance_km / radius_km, 1.0) if radius_km > 0 else 0.0
+    rating_score = min(float(rating or 0) / 5.0, 1.0)
+    availability_score = 0.0 if days_until is None else 1.0 - days_until / 7.0
+    return (
+        weights.get('distance', 0) * distance_score
+        + weights.get('rating', 0) * rating_score
+        + weights.get('reviews', 0) * _log_scaled(review_count, REVIEW_COUNT_SATURATION)
+        + weights.get('favorites', 0) * _log_scaled(favorites_count, FAVORITES_COUNT_SATURATION)
+        + weights.get('availability', 0) * availability_score
+    )
+
+
+def rank_profiles(profiles, latitude, longitude, radius_km, limit, weights=None, today=None):
+    """
+    Return the best `limit` profiles within radius_km, highest score first.
+    Profiles should be loaded with select_related('user', 'ranking_features').
+    Sets distance_km and ranking_score on the returned items.
+    """
+    weights = weights or get_ranking_weights()
+    today = today or date_cls.today()
+    scored = []
+    for index, profile in enumerate(profiles):
+        item_lat, item_lng = get_coords(profile)
+        if item_lat is None or item_lng is None:
+            continue
+        distance = calculate_distance(latitude, longitude, item_lat, item_lng)
+        if distance > radius_km:
+            continue
+        features = getattr(profile, 'ranking_features', None)
+        score = score_candidate(
+            distance,
+            radius_km,
+            profile.rating,
+            features.review_count if features else 0,
+            features.favorites_count if features else 0,
+            days_until_available(features.available_weekdays, today) if features else None,
+            weights,
+        )
+        # Ties go to the closer profile; index keeps the heap from comparing model instances
+        scored.append((score, -distance, index, profile))
+
+    top = heapq.nlargest(max(limit, 0), scored)
+    ranked = []
+    for score, negative_distance, _, profile in top:
+        profile.distance_km = -negative_distance
+        profile.ranking_score = round(score, 4)
+        ranked.append(profile)
+    return ranked
+
+
+# ======================
+# FEATURE MAINTENANCE
+# ======================
+
+def get_provider_for_profile(profile):
+    """Return the ProfessionalProfile/PlaceProfile backing a PublicProfile, if any."""
+    if profile.profile_type == 'PROFESSIONAL':
+        return ProfessionalProfile.objects.filter(user_id=profile.user_id).first()
+    if profile.profile_type == 'PLACE':
+        return PlaceProfile.objects.filter(user_id=profile.user_id).first()
+    return None
+
+
+def get_public_profile_id_for_object(obj):
+    """Map a PublicProfile/ProfessionalProfile/PlaceProfile instance to its PublicProfile id."""
+    if isinstance(obj, PublicProfile):
+        return obj.id
+    user_id = getattr(obj, 'user_id', None)
+    if not user_id:
+        return None
+    return PublicProfile.objects.filter(user_id=user_id).values_list('id', flat=True).first()
+
+
+def get_public_profile_id_for_favorite(favorite):
+    """PublicProfile id a Favorite points at (None for favorites of anything but a provider profile)."""
+    if favorite.content_type.model not in PROFILE_FAVORITE_MODELS:
+        return None
+    target = favorite.content_object
+    return get_public_profile_id_for_object(target) if target is not None else None
+
+
+def compute_available_weekdays(provider):
+    """Bitmask of weekdays the provider has working hours on."""
+    from services.models import ProviderAvailability
+    from .profile_models import AvailabilitySchedule
+
+    if provider is None:
+        return 0
+    provider_ct = ContentType.objects.get_for_model(provider)
+    days = set(
+        ProviderAvailability.objects.filter(
+            content_type=provider_ct, object_id=provider.id, is_active=True
+        ).values_list('day_of_week', flat=True)
+    )
+    days.update(
+        AvailabilitySchedule.objects.filter(
+            content_type=provider_ct,
+            object_id=provider.id,
+            is_available=True,
+            time_slots__is_active=True,
+        ).values_list('day_of_week', flat=True)
+    )
+    mask = 0
+    for day in days:
+        mask |= 1 << day
+    return mask
+
+
+def compute_favorites_count(profile, provider=None):
+    from favorites.models import Favorite
+
+    targets = [(ContentType.objects.get_for_model(PublicProfile), profile.id)]
+    if provider is not None:
+        targets.append((ContentType.objects.get_for_model(provider), provider.id))
+    total = 0
+    for content_type, object_id in targets:
+        total += Favorite.objects.filter(content_type=content_type, object_id=object_id).count()
+    return total
+
+
+def refresh_ranking_features(profile):
+    """Recompute every feature for a profile from source tables (also used to repair drift)."""
+    provider = get_provider_for_profile(profile)
+    features, _ = ProfileRankingFeatures.objects.update_or_create(
+        profile=profile,
+        defaults={
+            'review_count': profile.reviews_received.count(),
+            'favorites_count': compute_favorites_count(profile, provider),
+            'available_weekdays': compute_available_weekdays(provider),
+        },
+    )
+    return features
+
+
+def adjust_ranking_counter(profile_id, field, delta):
+    """Atomically add `delta` to a counter; builds the row from scratch when it is missing."""
+    if not profile_id:
+        return
+    updated = ProfileRankingFeatures.objects.filter(profile_id=profile_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+    # Decrements without a row happen during profile deletion cascades; nothing to fix then
+    if not updated and delta > 0:
+        profile = PublicProfile.objects.filter(id=profile_id).first()
+        if profile:
+            refresh_ranking_features(profile)
+
+
+def refresh_available_weekdays(provider):
+    """Recompute the availability mask after a provider's schedule changes."""
+    profile_id = get_public_profile_id_for_object(provider)
+    if not profile_id:
+        return
+    mask = compute_available_weekdays(provider)
+    updated = ProfileRankingFeatures.objects.filter(profile_id=profile_id).update(available_weekdays=mask)
+    if not updated:
+        ProfileRankingFeatures.objects.get_or_create(profile_id=profile_id, defaults={'available_weekdays': mask})
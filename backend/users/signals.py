@@ -0,0 +1,150 @@
+import logging
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import discovery_cache, image_derivatives
+from .models import PublicProfile, PublicProfileCategoryToken, User
+from .profile_models import AvailabilitySchedule, TimeSlot
+from .ranking import (
+    adjust_ranking_counter,
+    get_public_profile_id_for_favorite,
+    refresh_available_weekdays,
+    refresh_ranking_features,
+)
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_FIELDS = {'category', 'sub_categories'}
+# User fields that show up in (or filter) the discovery list
+DISCOVERY_USER_FIELDS = {'email', 'city', 'latitude', 'longitude'}
+LOCATION_FIELDS = {'latitude', 'longitude'}
+
+
+@receiver(post_save, sender=PublicProfile)
+def sync_public_profile_category_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """Keep the category token index in sync when categories change"""
+    if update_fields is not None and not CATEGORY_FIELDS.intersection(update_fields):
+        return
+    PublicProfileCategoryToken.sync_for_profile(instance)
+
+
+@receiver(post_save, sender=PublicProfile)
+@receiver(post_delete, sender=PublicProfile)
+def invalidate_discovery_on_profile_change(sender, instance, **kwargs):
+    """Any profile change (including review rating updates) invalidates cached discovery pages"""
+    discovery_cache.invalidate()
+
+
+@receiver(post_save, sender=User)
+def invalidate_discovery_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    """Invalidate discovery pages when a listed user field may have changed"""
+    if created:
+        return
+    if update_fields is not None and not DISCOVERY_USER_FIELDS.intersection(update_fields):
+        return
+    if not hasattr(instance, 'public_profile'):
+        return
+    discovery_cache.invalidate()
+
+
+@receiver(post_save, sender=User)
+def sync_public_profile_location(sender, instance, created, update_fields=None, **kwargs):
+    """Copy the user's coordinates into the profile's effective location columns"""
+    if update_fields is not None and not LOCATION_FIELDS.intersection(update_fields):
+        return
+    if instance.latitude is not None and instance.longitude is not None:
+        geo = {'geo_latitude': float(instance.latitude), 'geo_longitude': float(instance.longitude)}
+    else:
+        # No user coordinates: fall back to the profile's own coordinates
+        geo = {
+            'geo_latitude': Cast(F('latitude'), FloatField()),
+            'geo_longitude': Cast(F('longitude'), FloatField()),
+        }
+    PublicProfile.objects.filter(user=instance).update(**geo)
+
+
+# ======================
+# RANKING FEATURES
+# ======================
+
+@receiver(post_save, sender=PublicProfile)
+def create_ranking_features(sender, instance, created, **kwargs):
+    if created:
+        refresh_ranking_features(instance)
+
+
+@receiver(post_save, sender='reviews.Review')
+def count_review_for_ranking(sender, instance, created, **kwargs):
+    if created:
+        adjust_ranking_counter(instance.to_public_profile_id, 'review_count', 1)
+
+
+@receiver(post_delete, sender='reviews.Review')
+def uncount_review_for_ranking(sender, instance, **kwargs):
+    adjust_ranking_counter(instance.to_public_profile_id, 'review_count', -1)
+
+
+@receiver(post_save, sender='favorites.Favorite')
+def count_favorite_for_ranking(sender, instance, created, **kwargs):
+    if created:
+        adjust_ranking_counter(get_public_profile_id_for_favorite(instance), 'favorites_count', 1)
+
+
+@receiver(post_delete, sender='favorites.Favorite')
+def uncount_favorite_for_ranking(sender, instance, **kwargs):
+    adjust_ranking_counter(get_public_profile_id_for_favorite(instance), 'favorites_count', -1)
+
+
+def _refresh_schedule_provider(schedule_owner):
+    try:
+        provider = schedule_owner.provider
+    except ObjectDoesNotExist:
+        # Content type gone along with the provider; nothing left to rank
+        return
+    if provider is not None:
+        refresh_available_weekdays(provider)
+
+
+@receiver(post_save, sender=AvailabilitySchedule)
+@receiver(post_delete, sender=AvailabilitySchedule)
+@receiver(post_save, sender='services.ProviderAvailability')
+@receiver(post_delete, sender='services.ProviderAvailability')
+def refresh_availability_for_ranking(sender, instance, **kwargs):
+    _refresh_schedule_provider(instance)
+
+
+@receiver(post_save, sender=TimeSlot)
+@receiver(post_delete, sender=TimeSlot)
+def refresh_time_slot_availability_for_ranking(sender, instance, **kwargs):
+    schedule = AvailabilitySchedule.objects.filter(id=instance.schedule_id).first()
+    if schedule:
+        _refresh_schedule_provider(schedule)
+
+
+# ======================
+# IMAGE DERIVATIVES
+# ======================
+
+@receiver(post_save, sender=User)
+def build_user_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image and not image_derivatives.is_current(instance.image_derivatives, instance.image.name):
+        image_derivatives.submit(image_derivatives.build_user_image_derivatives, instance.pk)
+
+
+@receiver(post_save, sender=PublicProfile)
+def build_profile_image_derivatives(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'images' not in update_fields:
+        return
+    try:
+        needed = image_derivatives.profile_needs_derivatives(instance)
+    except Exception as exc:
+        logger.warning('Could not check image derivatives for profile %s: %s', instance.pk, exc)
+        return
+    if needed:
+        image_derivatives.submit(image_derivatives.build_profile_image_derivatives, instance.pk)
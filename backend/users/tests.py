@@ -1,7 +1,23 @@
+import io
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock
+
+from PIL import Image
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from .models import ProfessionalProfile, PlaceProfile, User
+from .models import ProfessionalProfile, PlaceProfile, ProfileRankingFeatures, PublicProfile, User
 from .profile_models import PlaceProfessionalLink, LinkedAvailabilitySchedule, LinkedTimeSlot, AvailabilitySchedule
+from . import image_derivatives
+from .google_maps_client import GoogleMapsClient
+from .ranking import rank_profiles
 
 
 class PlaceProfessionalLinkModelTests(TestCase):
@@ -31,6 +47,41 @@ class PlaceProfessionalLinkModelTests(TestCase):
         self.assertFalse(created)
         self.assertEqual(link2.id, link1.id)
     
+    def test_invite_without_common_category_returns_original_names(self):
+        PublicProfile.objects.create(
+            user=self.place_user, profile_type='PLACE', name='My Place', category=['Belleza', '["Bienestar"]'],
+        )
+        PublicProfile.objects.create(
+            user=self.pro_user, profile_type='PROFESSIONAL', name='John', category=['Mascotas'],
+        )
+        self.client.force_login(self.place_user)
+
+        response = self.client.post('/api/links/', {'place_id': self.place.id, 'professional_id': self.prof.id})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['place_categories'], ['Belleza', 'Bienestar'])
+        self.assertEqual(response.json()['professional_categories'], ['Mascotas'])
+        self.assertFalse(PlaceProfessionalLink.objects.exists())
+
+    def test_invite_error_keeps_category_casing_while_matching_ignores_it(self):
+        # The 400 lists names as stored (the old response lowercased them); only the match is normalized
+        self.place.category = ['  BELLEZA ', 'Spa Día']
+        self.place.save()
+        self.prof.category = ['Mascotas']
+        self.prof.save()
+        self.client.force_login(self.place_user)
+
+        response = self.client.post('/api/links/', {'place_id': self.place.id, 'professional_id': self.prof.id})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['place_categories'], ['BELLEZA', 'Spa Día'])
+        self.assertEqual(response.json()['professional_categories'], ['Mascotas'])
+
+        self.prof.category = ['belleza']
+        self.prof.save()
+        response = self.client.post('/api/links/', {'place_id': self.place.id, 'professional_id': self.prof.id})
+        self.assertNotEqual(response.status_code, 400)
+        self.assertTrue(PlaceProfessionalLink.objects.filter(place=self.place, professional=self.prof).exists())
+
     def test_schedule_create_for_accepted_link(self):
         link = PlaceProfessionalLink.objects.create(place=self.place, professional=self.prof, invited_by=self.place_user, status=PlaceProfessionalLink.Status.ACCEPTED)
         # Create a schedule day and a slot
@@ -38,3 +89,294 @@ class PlaceProfessionalLinkModelTests(TestCase):
         LinkedTimeSlot.objects.create(schedule=sched, start_time='09:00', end_time='10:00')
         self.assertEqual(link.schedules.count(), 1)
         self.assertEqual(sched.time_slots.count(), 1)
+
+
+class PublicProfileCategoryTokenTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='cat@example.com', username='cat', password='pass', role=User.Role.PROFESSIONAL
+        )
+        self.profile = PublicProfile.objects.create(
+            user=self.user, profile_type='PROFESSIONAL', name='Ana',
+            category=['Belleza', '["bienestar"]'], sub_categories=['Uñas Acrílicas'],
+        )
+
+    def _tokens(self):
+        return set(self.profile.category_tokens.values_list('kind', 'token'))
+
+    def test_tokens_indexed_on_save(self):
+        self.assertEqual(self._tokens(), {
+            ('category', 'belleza'),
+            ('category', 'bienestar'),
+            ('subcategory', 'uñasacrílicas'),
+        })
+
+    def test_tokens_resynced_on_category_change(self):
+        self.profile.category = ['mascotas']
+        self.profile.save()
+        self.assertIn(('category', 'mascotas'), self._tokens())
+        self.assertNotIn(('category', 'belleza'), self._tokens())
+
+    def test_list_filters_by_category_token(self):
+        other_user = get_user_model().objects.create_user(
+            email='other@example.com', username='other', password='pass', role=User.Role.PLACE
+        )
+        PublicProfile.objects.create(user=other_user, profile_type='PLACE', name='Vet', category=['mascotas'])
+        response = self.client.get('/api/public-profiles/', {'category': 'BELLEZA'})
+        self.assertEqual(response.status_code, 200)
+        ids = [item['id'] for item in response.json()['results']]
+        self.assertEqual(ids, [self.profile.id])
+
+
+class DiscoveryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='disc@example.com', username='disc', password='pass', role=User.Role.PLACE
+        )
+        self.profile = PublicProfile.objects.create(user=self.user, profile_type='PLACE', name='Spa', category=['belleza'])
+
+    def test_etag_returns_not_modified(self):
+        first = self.client.get('/api/public-profiles/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+        second = self.client.get('/api/public-profiles/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+
+    def test_profile_change_invalidates_cached_page(self):
+        first = self.client.get('/api/public-profiles/')
+        self.profile.rating = 4.5
+        self.profile.save(update_fields=['rating'])
+        second = self.client.get('/api/public-profiles/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json()['results'][0]['rating'], '4.50')
+
+
+class RecommendationRankingTests(TestCase):
+    def setUp(self):
+        UserModel = get_user_model()
+        self.viewer = UserModel.objects.create_user(
+            email='viewer@example.com', username='viewer', password='pass',
+            latitude=Decimal('19.4326'), longitude=Decimal('-99.1332'),
+        )
+        self.near = self._profile('near', '19.4330', rating='2.0')
+        self.rated = self._profile('rated', '19.4600', rating='5.0')
+        self._profile('far', '20.5000', rating='5.0')
+
+    def _profile(self, name, latitude, rating):
+        user = get_user_model().objects.create_user(
+            email=f'{name}@example.com', username=name, password='pass', role=User.Role.PLACE,
+            latitude=Decimal(latitude), longitude=Decimal('-99.1332'),
+        )
+        return PublicProfile.objects.create(user=user, profile_type='PLACE', name=name, rating=Decimal(rating))
+
+    def test_features_created_with_profile(self):
+        self.assertEqual(ProfileRankingFeatures.objects.get(profile=self.near).review_count, 0)
+
+    def test_rank_profiles_respects_radius_limit_and_weights(self):
+        candidates = PublicProfile.objects.select_related('user', 'ranking_features')
+        by_distance = rank_profiles(candidates, 19.4326, -99.1332, 10, 5, weights={'distance': 1.0})
+        self.assertEqual([p.name for p in by_distance], ['near', 'rated'])
+        by_rating = rank_profiles(candidates, 19.4326, -99.1332, 10, 1, weights={'distance': 0.1, 'rating': 1.0})
+        self.assertEqual([p.name for p in by_rating], ['rated'])
+
+    def test_recommendations_endpoint(self):
+        self.client.force_login(self.viewer)
+        response = self.client.get('/api/public-profiles/recommendations/', {'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_schedule_of_a_missing_provider_is_skipped(self):
+        schedule = AvailabilitySchedule.objects.create(
+            content_type=ContentType.objects.get_for_model(PlaceProfile), object_id=999999,
+            day_of_week=AvailabilitySchedule.DayOfWeek.MONDAY, is_available=True,
+        )
+        schedule.delete()
+
+    def test_unexpected_provider_errors_propagate(self):
+        broken = mock.PropertyMock(side_effect=RuntimeError('boom'))
+        with mock.patch.object(AvailabilitySchedule, 'provider', broken), self.assertRaises(RuntimeError):
+            AvailabilitySchedule.objects.create(
+                content_type=ContentType.objects.get_for_model(PlaceProfile), object_id=999999,
+                day_of_week=AvailabilitySchedule.DayOfWeek.MONDAY, is_available=True,
+            )
+
+
+class PublicProfileEffectiveLocationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='geo@example.com', username='geo', password='pass', role=User.Role.PLACE,
+        )
+        self.profile = PublicProfile.objects.create(
+            user=self.user, profile_type='PLACE', name='Geo',
+            latitude=Decimal('19.40000000'), longitude=Decimal('-99.10000000'),
+        )
+
+    def test_falls_back_to_profile_coordinates(self):
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.geo_latitude, self.profile.geo_longitude), (19.4, -99.1))
+
+    def test_user_coordinates_take_precedence_and_sync(self):
+        self.user.latitude = Decimal('20.5')
+        self.user.longitude = Decimal('-100.25')
+        self.user.save(update_fields=['latitude', 'longitude'])
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.geo_latitude, self.profile.geo_longitude), (20.5, -100.25))
+
+        self.user.latitude = self.user.longitude = None
+        self.user.save()
+        self.profile.refresh_from_db()
+        self.assertEqual((self.profile.geo_latitude, self.profile.geo_longitude), (19.4, -99.1))
+
+    def test_bounding_box_prefilter(self):
+        from .location_utils import within_bounding_box
+        nearby = within_bounding_box(PublicProfile.objects.all(), 19.41, -99.11, 5)
+        self.assertEqual(list(nearby), [self.profile])
+        self.assertFalse(within_bounding_box(PublicProfile.objects.all(), 25.0, -99.1, 5).exists())
+
+
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        self.storage = FileSystemStorage(location=self.media_root, base_url='/media/')
+
+    def _png(self, size=(1200, 800)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def test_render_skips_widths_wider_than_the_source(self):
+        rendered = image_derivatives.render(io.BytesIO(self._png((700, 350))), widths=(320, 640, 1080))
+        self.assertEqual(sorted(rendered), [320, 640])
+        with Image.open(io.BytesIO(rendered[320])) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (320, 160)))
+
+    def test_regenerating_replaces_derivatives_in_place(self):
+        name = self.storage.save('public_profiles/1/images/photo.png', ContentFile(self._png()))
+        first = image_derivatives.generate(self.storage, name, widths=(320,))
+        second = image_derivatives.generate(self.storage, name, widths=(320,))
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.storage.listdir('public_profiles/1/images/derivatives')[1], ['photo_320w.webp'])
+
+    def test_profile_images_get_srcsets_aligned_with_images(self):
+        user = get_user_model().objects.create_user(
+            email='img@example.com', username='img', password='pass', role=User.Role.PLACE,
+        )
+        name = self.storage.save('public_profiles/1/images/photo.png', ContentFile(self._png()))
+        profile = PublicProfile.objects.create(user=user, profile_type='PLACE', name='Img')
+        profile.images = [self.storage.url(name), 'https://elsewhere.example/other.png']
+
+        self.assertTrue(image_derivatives.profile_needs_derivatives(profile, self.storage))
+        PublicProfile.objects.filter(id=profile.id).update(images=profile.images)
+        image_derivatives.build_profile_image_derivatives(profile.id, storage=self.storage)
+        profile.refresh_from_db()
+
+        self.assertFalse(image_derivatives.profile_needs_derivatives(profile, self.storage))
+        srcsets = image_derivatives.profile_images_srcset(profile, self.storage)
+        self.assertEqual(len(srcsets), 2)
+        self.assertEqual(list(srcsets[0]), ['320', '640', '1080'])
+        self.assertTrue(srcsets[0]['320'].endswith('derivatives/photo_320w.webp'))
+        self.assertEqual(srcsets[1], {})
+
+    def test_dropped_profile_images_lose_their_derivatives(self):
+        user = get_user_model().objects.create_user(
+            email='img@example.com', username='img', password='pass', role=User.Role.PLACE,
+        )
+        kept = self.storage.save('public_profiles/1/images/kept.png', ContentFile(self._png()))
+        dropped = self.storage.save('public_profiles/1/images/dropped.png', ContentFile(self._png()))
+        profile = PublicProfile.objects.create(user=user, profile_type='PLACE', name='Img')
+        PublicProfile.objects.filter(id=profile.id).update(images=[self.storage.url(kept), self.storage.url(dropped)])
+        image_derivatives.build_profile_image_derivatives(profile.id, storage=self.storage)
+        profile.refresh_from_db()
+        dropped_files = list(profile.image_derivatives[dropped]['sizes'].values())
+        self.assertTrue(all(self.storage.exists(name) for name in dropped_files))
+
+        PublicProfile.objects.filter(id=profile.id).update(images=[self.storage.url(kept)])
+        image_derivatives.build_profile_image_derivatives(profile.id, storage=self.storage)
+        profile.refresh_from_db()
+
+        self.assertEqual(list(profile.image_derivatives), [kept])
+        self.assertFalse(any(self.storage.exists(name) for name in dropped_files))
+        kept_files = profile.image_derivatives[kept]['sizes'].values()
+        self.assertTrue(all(self.storage.exists(name) for name in kept_files))
+
+
+class GoogleMapsClientTests(TestCase):
+    """Exercises the caching client against a local stub of the Google Maps API."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        cls.hits = []
+
+        class StubHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                cls.hits.append(self.path)
+                if 'slow' in self.path:
+                    time.sleep(0.3)
+                status_value = 'OVER_QUERY_LIMIT' if 'limit' in self.path else 'OK'
+                body = json.dumps({'status': status_value, 'predictions': [{'place_id': 'p1', 'description': 'Centro'}]})
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(body.encode('utf-8'))
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.hits.clear()
+        self.client_ = GoogleMapsClient(base_url=self.base_url, cache_size=2, cache_ttl=60)
+
+    def test_normalized_input_is_served_from_cache(self):
+        first = self.client_.autocomplete('Av  Reforma', 'key')
+        second = self.client_.autocomplete(' av reforma ', 'key')
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.hits), 1)
+
+    def test_reverse_geocode_rounds_coordinates(self):
+        self.client_.reverse_geocode('19.432601', '-99.133201', 'key')
+        self.client_.reverse_geocode('19.432649', '-99.133249', 'key')
+        self.assertEqual(len(self.hits), 1)
+        self.assertIn('latlng=19.4326%2C-99.1332', self.hits[0])
+
+    def test_error_statuses_are_not_cached(self):
+        self.client_.autocomplete('limit', 'key')
+        self.client_.autocomplete('limit', 'key')
+        self.assertEqual(len(self.hits), 2)
+
+    def test_lru_eviction(self):
+        for query in ('one', 'two', 'one', 'three', 'one', 'two'):
+            self.client_.autocomplete(query, 'key')
+        # 'two' was evicted by 'three' while 'one' stayed hot
+        self.assertEqual(len(self.hits), 4)
+
+    def test_concurrent_identical_requests_are_coalesced(self):
+        import threading
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.client_.autocomplete('slow query', 'key')))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(results), 5)
+        self.assertEqual(len(self.hits), 1)